@@ -2,6 +2,7 @@ import gym
 import math, os, pickle
 import numpy as np
 
+from model_format import MODEL_FILE_EXTENSION
 from thoughtforge_client import BaseThoughtForgeClientSession
 from advanced.reacher.example_reacher_client import ExampleReacherSession
 
@@ -13,7 +14,11 @@ if __name__ == "__main__":
     filename = INSERT FILE NAME HERE
     file_location = os.path.join(saved_network_directory, filename)
     model_data = None
-    with open(file_location, 'rb') as out_file:
-        model_data = pickle.load(out_file)
+    if filename.endswith(MODEL_FILE_EXTENSION):
+        # models saved with session.save_model() are memory-mapped instead of unpickled
+        model_data = BaseThoughtForgeClientSession.load_model(file_location)
+    else:
+        with open(file_location, 'rb') as out_file:
+            model_data = pickle.load(out_file)
 
     session = ExampleReacherSession('./advanced/reacher/example_reacher.params', model_data=model_data)
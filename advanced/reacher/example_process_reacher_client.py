@@ -0,0 +1,17 @@
+from process_env import ProcessEnvironmentSession
+from vector_runner import VectorizedSessionRunner
+from advanced.reacher.example_reacher_client import ExampleReacherSession
+
+
+NUM_SESSIONS = 4
+
+
+class ProcessReacherSession(ProcessEnvironmentSession, ExampleReacherSession):
+    """ steps each reacher environment in its own worker process """
+    pass
+
+
+if __name__ == "__main__": 
+    # the MuJoCo environments of the sessions are stepped in parallel, one core each
+    runner = VectorizedSessionRunner(ProcessReacherSession, NUM_SESSIONS, './advanced/reacher/example_reacher.params')
+    runner.run()
@@ -3,6 +3,7 @@ import math
 import os
 import numpy as np
 
+from rendering import GymRenderMixin
 from thoughtforge_client import BaseThoughtForgeClientSession
 
 
@@ -56,17 +57,15 @@ def angle_between(v1, v2):
 
 
 
-class ExampleReacher3Session(BaseThoughtForgeClientSession):
+class ExampleReacher3Session(GymRenderMixin, BaseThoughtForgeClientSession):
 
     def _reset_env(self):
         """ local helper function specific for openAI gym environments """
         self.last_observation = self.env.reset()
         self.score = 0
-        # for tracking first couple derivatives of motion
-        self.last_rotvel0 = 0
-        self.last_rotvel1 = 0
-        self.last_delta1_rotvel0 = 0
-        self.last_delta1_rotvel1 = 0
+        # restart the derivatives of motion, see 'sensor_features' in the .params file
+        if self.feature_pipeline is not None:
+            self.feature_pipeline.reset()
 
     def sim_started_notification(self):
         """ On sim start, initialize environment """   
@@ -84,9 +83,6 @@ class ExampleReacher3Session(BaseThoughtForgeClientSession):
         
     def update(self, motor_dict):
         """ advance the environment sim """
-        # render the environment locally
-        self.env.render()
-
         # extract action sent from server
         motor_value_0 = motor_dict['motor_value_0'][0]
         motor_value_1 = motor_dict['motor_value_1'][0]
@@ -111,59 +107,16 @@ class ExampleReacher3Session(BaseThoughtForgeClientSession):
         body0_to_fingertip = fingertip_pos - body0_pos
         angle0_sign = np.sign(np.cross(body0_to_target, body0_to_fingertip)[2])
         angle0 = angle_between(body0_to_target, body0_to_fingertip)/np.pi
-        # angle0_sensor
-        angle0_sensor_val = angle0_sign * angle0
-        
-        clamped_abs_angle0 = angle0
-        if angle0 < 0.25:
-            clamped_abs_angle0 = 0.25        
         body0_xvelr = self.env.data.get_body_xvelr("body0")[2]
-        body0_xvelr_scaled = body0_xvelr/10
-        if abs(body0_xvelr_scaled) < 0.04:
-            body0_xvelr_scaled = 0
-        # rotvel0_sensor
-        rotvel0_sensor_val = (body0_xvelr_scaled) / clamped_abs_angle0
-
-        new_delta1_rotvel0 = self.last_rotvel0 - body0_xvelr
-        # delta1_rotvel0_sensor
-        delta1_rotvel0_sensor_val = (new_delta1_rotvel0 / clamped_abs_angle0)
-        self.last_rotvel0 = body0_xvelr
-
-        new_delta2_rotvel0 = self.last_delta1_rotvel0 - new_delta1_rotvel0
-        # delta2_rotvel0_sensor
-        delta2_rotvel0_sensor_val = (new_delta2_rotvel0  / clamped_abs_angle0)
-        self.last_delta1_rotvel0 = new_delta1_rotvel0
-
-        # radius_sensor
-        radius_sensor_val = np.linalg.norm(body0_to_target) - np.linalg.norm(body0_to_fingertip)
-
         body1_xvelr = self.env.data.get_body_xvelr("body1")[2]
-        # rotvel1_sensor
-        rotvel1_sensor_val = body0_xvelr/20
-        if abs(rotvel1_sensor_val) < 0.08:
-            rotvel1_sensor_val = 0
-
-        # delta1_rotvel1_sensor
-        delta1_rotvel1_sensor_val = self.last_rotvel1 - body1_xvelr
-        self.last_rotvel1 = body1_xvelr
-
-        # delta2_rotvel1_sensor
-        delta2_rotvel1_sensor_val = self.last_delta1_rotvel1 - delta1_rotvel1_sensor_val
-        self.last_delta1_rotvel1 = delta1_rotvel1_sensor_val
-        
+
+        # observations the sensor values are computed from, see 'sensor_features' in the .params file
         sensor_values = {
-            "angle0_sensor1" : angle0_sensor_val,
-            "angle0_sensor2" : angle0_sensor_val,
-            "angle0_sensor3" : angle0_sensor_val,
-            "angle0_sensor4" : angle0_sensor_val,
-            'rotvel1_sensor': rotvel1_sensor_val,
-            'delta1_rotvel1_sensor': delta1_rotvel1_sensor_val,
-            'delta2_rotvel1_sensor': delta2_rotvel1_sensor_val,
-            'radius_sensor1': radius_sensor_val,
-            'radius_sensor2': radius_sensor_val,
-            'rotvel0_sensor': rotvel0_sensor_val,
-            'delta1_rotvel0_sensor': delta1_rotvel0_sensor_val,
-            'delta2_rotvel0_sensor': delta2_rotvel0_sensor_val
+            'angle0': angle0_sign * angle0,
+            'angle0_magnitude': angle0,
+            'radius': np.linalg.norm(body0_to_target) - np.linalg.norm(body0_to_fingertip),
+            'rotvel0': body0_xvelr,
+            'rotvel1': body1_xvelr
         }
         return sensor_values
 
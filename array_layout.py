@@ -0,0 +1,97 @@
+import numpy as np
+
+from utils import safe_dict_get
+
+
+class ArrayLayout():
+    """ ArrayLayout
+
+    Fixed positions of named values (e.g. sensors or motors) in a flat float64 array, ordered by the
+    ids of the name map. A scalar name takes one element, at the integer position `index(name)`. A
+    name whose values are lists (MULTI motors) takes one element per list entry, at the slice
+    `index(name)`.
+
+    Positions are computed once, so that sessions implementing `update_array()` can look up the
+    indices of the values they use when the sim starts and then work on arrays without building
+    dictionaries every tick.
+
+    :param name_id_map: A dictionary of names to ids, e.g. the session's `sensor_name_map`
+    :type name_id_map: dict
+    :param widths: Optional dictionary of list valued names to their list lengths. Names that aren't
+        in it are scalar.
+    :type widths: dict
+    """
+    def __init__(self, name_id_map, widths=None):
+        self.names = sorted(name_id_map.keys(), key=lambda name: name_id_map[name])
+        self.widths = dict(widths) if widths is not None else {}
+        self.positions = {}
+        offset = 0
+        for name in self.names:
+            width = safe_dict_get(self.widths, name, None)
+            if width is None:
+                self.positions[name] = offset
+                offset += 1
+            else:
+                self.positions[name] = slice(offset, offset + width)
+                offset += width
+        self.size = offset
+        self._ordered_positions = [self.positions[name] for name in self.names]
+        self._all_scalar = len(self.widths) == 0
+
+    @classmethod
+    def from_values(cls, name_id_map, values):
+        """ Creates the layout of values ordered by id, e.g. the first motor values received from the server.
+        List values set the widths of their names.
+
+        :param values: One value or list of values per name, ordered by ascending id
+        :type values: list
+        :rtype: ArrayLayout
+        """
+        names = sorted(name_id_map.keys(), key=lambda name: name_id_map[name])
+        widths = {name: len(value) for name, value in zip(names, values) if isinstance(value, (list, tuple, np.ndarray))}
+        return cls(name_id_map, widths)
+
+    def index(self, name):
+        """ Returns the position of a name: an integer index for scalar names, a slice for list valued names """
+        return self.positions[name]
+
+    def empty(self):
+        """ Returns a new zeroed array of this layout
+
+        :rtype: np.ndarray
+        """
+        return np.zeros(self.size)
+
+    def template(self):
+        """ Returns a dictionary of zero values in this layout, with lists for list valued names, in id order """
+        return {name: ([0.0] * self.widths[name] if name in self.widths else 0.0) for name in self.names}
+
+    def fill(self, out, values):
+        """ Writes values ordered by id (scalars, or lists for list valued names) into an array of this layout """
+        if self._all_scalar:
+            out[:] = values
+            return
+        for position, value in zip(self._ordered_positions, values):
+            out[position] = value
+
+    def to_array(self, named_values, out=None):
+        """ Lays out a dictionary of names to values as an array. Missing names are 0.
+
+        :param out: Optional array to write into, otherwise a new array is returned
+        :type out: np.ndarray
+        :rtype: np.ndarray
+        """
+        if out is None:
+            out = self.empty()
+        self.fill(out, [safe_dict_get(named_values, name, 0.0) for name in self.names])
+        return out
+
+    def to_dict(self, values):
+        """ Returns a dictionary of names to values (floats, or lists for list valued names) from an array of this layout
+
+        :rtype: dict
+        """
+        values = np.asarray(values, dtype=np.float64)
+        return {
+            name: (values[position].tolist() if isinstance(position, slice) else float(values[position]))
+            for name, position in self.positions.items()}
@@ -0,0 +1,76 @@
+""" Size and CPU cost of compressing the bodies a session exchanges with the server.
+
+For each installed codec of compression.py at its 'speed' and 'ratio' levels, reports the compressed size and the
+compression and decompression time of:
+
+- a json /updateSim response without debug data (the per-tick message most sessions exchange)
+- a json /updateSim response with debug data for `--blocks` blocks
+- a binary /updateSim request of an action chunk of `--chunk-size` ticks of the reacher sensors
+- a model upload of `--model-values` values, in the binary and json formats
+
+Bodies smaller than a policy's 'threshold' are sent uncompressed, the first rows show why small messages skip it.
+
+Usage::
+
+    python -m benchmarks.bench_compression --blocks 64 256 --model-values 1000000
+"""
+import argparse, json, time
+import numpy as np
+
+from compression import get_codec, CODECS, PREFER_RATIO, PREFER_SPEED
+from model_format import encode_model_json, iter_model_chunks
+from wire_format import encode_sensor_frame
+
+
+def _debug_response(num_blocks, rng):
+    debugging_data = {
+        'global_stability_rate': float(rng.random_sample()),
+        'global_energy_estimate': float(rng.random_sample()),
+        'block_stability_rates': {str(block_id): float(rng.random_sample()) for block_id in range(num_blocks)},
+        'block_energy_estimates': {str(block_id): float(rng.random_sample()) for block_id in range(num_blocks)},
+        'block_stable_times': {str(block_id): int(rng.randint(0, 100000)) for block_id in range(num_blocks)},
+    }
+    return json.dumps({'motor_dict': {'0': float(rng.random_sample()), '1': float(rng.random_sample())}, 'session_log': '[]',
+        'debugging_data': json.dumps(debugging_data)}).encode()
+
+
+def _payloads(cli_args):
+    rng = np.random.RandomState(0)
+    payloads = [('updateSim response', json.dumps({'motor_dict': {'0': 0.25, '1': -0.5}, 'session_log': '[]',
+        'debugging_data': '{}'}).encode())]
+    for num_blocks in cli_args.blocks:
+        payloads.append(('debug response, ' + str(num_blocks) + ' blocks', _debug_response(num_blocks, rng)))
+    sensor_values = np.cumsum(rng.normal(scale=0.01, size=(cli_args.chunk_size, 8)), axis=0)
+    payloads.append(('binary chunk request, ' + str(cli_args.chunk_size) + ' ticks', encode_sensor_frame(sensor_values.ravel())))
+    # a trained model's weights take few distinct values, random normal weights would be the worst case
+    weights = np.round(rng.normal(size=cli_args.model_values), 2)
+    model_data = {'weights': [weights.reshape(-1, 100)], 'values': np.zeros(100)}
+    payloads.append(('binary model, ' + str(cli_args.model_values) + ' values', b''.join(bytes(chunk) for chunk in iter_model_chunks(model_data))))
+    payloads.append(('json model, ' + str(cli_args.model_values) + ' values', encode_model_json(model_data)))
+    return payloads
+
+
+def _time_us(function, data, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        result = function(data)
+    return (time.perf_counter() - start) / repeats * 1e6, result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--blocks', type=int, nargs='+', default=[16, 256])
+    parser.add_argument('--chunk-size', type=int, default=64)
+    parser.add_argument('--model-values', type=int, default=1000000)
+    cli_args = parser.parse_args()
+    for label, payload in _payloads(cli_args):
+        repeats = max(1, min(1000, 10000000 // max(len(payload), 1)))
+        print(label + ":", len(payload), "bytes")
+        for codec_name in CODECS.keys():
+            for prefer in [PREFER_SPEED, PREFER_RATIO]:
+                codec = get_codec(codec_name, prefer=prefer)
+                compress_us, compressed = _time_us(codec.compress, payload, repeats)
+                decompress_us, _ = _time_us(codec.decompress, compressed, repeats)
+                print("  " + (codec_name + " " + str(codec.level)).ljust(11), str(len(compressed)).rjust(10), "bytes",
+                    ("(" + str(round(100.0 * len(compressed) / len(payload), 1)) + "%)").rjust(8),
+                    "\tcompress:", round(compress_us, 1), "us\tdecompress:", round(decompress_us, 1), "us")
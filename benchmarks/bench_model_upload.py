@@ -0,0 +1,74 @@
+""" Startup time and peak client memory of uploading model_data at session initialization.
+
+Starts a session from a synthetic model against a stand-in server running in a separate process
+(so that only client allocations are traced) for the json upload, the streamed binary upload, and
+the streamed binary upload with deflate compression. The last two runs send the model digest first:
+the first start uploads the model, the repeated start finds it on the server and skips the upload
+(the digest itself is computed once per process).
+
+Usage::
+
+    python -m benchmarks.bench_model_upload --values 4000000
+"""
+import argparse, json, os, shutil, tempfile, time, tracemalloc
+import numpy as np
+
+from benchmarks.local_server import LocalServerProcess
+from thoughtforge_client import BaseThoughtForgeClientSession
+from utils import load_client_params
+
+
+class _UploadSession(BaseThoughtForgeClientSession):
+    """ initializes the session and stops at the first update """
+    def update(self, motor_action_dict):
+        self.stop_sim()
+        return {sensor_name: 0.0 for sensor_name in self.sensor_name_map.keys()}
+
+
+def _build_model(num_values, num_weight_arrays=4):
+    rng = np.random.RandomState(0)
+    rows = max(num_values // (num_weight_arrays * 256), 1)
+    # trained weights are mostly noise with many exact zeros (pruned/unused connections)
+    weights = [np.where(rng.uniform(size=(rows, 256)) < 0.5, 0.0, rng.normal(size=(rows, 256))) for _ in range(num_weight_arrays)]
+    return {'weights': weights, 'values': rng.normal(size=rows)}
+
+
+def run_benchmark(params_file, num_values):
+    model_data = _build_model(num_values)
+    model_bytes = sum(weight_array.nbytes for weight_array in model_data['weights']) + model_data['values'].nbytes
+    print("Model:", round(model_bytes / 2**20, 1), "MiB")
+    server = LocalServerProcess().start()
+    temp_directory = tempfile.mkdtemp()
+    temp_params_file = os.path.join(temp_directory, 'bench_model_upload.params')
+    try:
+        client_params = load_client_params(params_file)
+        for label, model_upload in [
+                ('json', {'format': 'json'}),
+                ('binary', {'format': 'binary', 'digest_first': False}),
+                ('binary+deflate', {'format': 'binary', 'compression': 'deflate', 'digest_first': False}),
+                ('digest, first', {'format': 'binary', 'compression': 'deflate'}),
+                ('digest, repeat', {'format': 'binary', 'compression': 'deflate'})]:
+            client_params['model_upload'] = model_upload
+            client_params['render'] = {'mode': 'off'}
+            with open(temp_params_file, 'w') as temp_file:
+                json.dump(client_params, temp_file)
+            tracemalloc.start()
+            start = time.perf_counter()
+            _UploadSession(temp_params_file, host=server.host, port=server.port, protocol='http', api_key='benchmark-key',
+                model_data=model_data)
+            elapsed = time.perf_counter() - start
+            _, peak_memory = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(label.ljust(16), "startup:", round(elapsed, 3), "s",
+                "\tpeak client memory above model:", round(peak_memory / 2**20, 1), "MiB")
+    finally:
+        server.stop()
+        shutil.rmtree(temp_directory)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--params', default='./examples/cartpole/example_cartpole.params')
+    parser.add_argument('--values', type=int, default=4000000, help='number of float64 model values')
+    cli_args = parser.parse_args()
+    run_benchmark(cli_args.params, cli_args.values)
@@ -0,0 +1,70 @@
+""" Throughput of sessions with CPU-heavy environments, stepped in-process or in worker processes.
+
+Runs N sessions in lockstep with the vectorized runner against the stand-in server. Each environment
+burns a fixed amount of pure-python CPU per `update()` (standing in for physics and sensor feature
+math), either on the session process (sharing the GIL) or in one worker process per environment
+(`process_env.ProcessEnvironmentSession`, stepped in parallel through shared memory).
+
+Session startup, including starting the workers, is part of the measured time.
+
+Usage::
+
+    python -m benchmarks.bench_process_env --sessions 4 --work 20000
+"""
+import argparse, contextlib, io, json, math, os, shutil, tempfile
+
+from benchmarks.local_server import LocalServerProcess
+from process_env import ProcessEnvironmentSession
+from thoughtforge_client import BaseThoughtForgeClientSession
+from utils import load_client_params
+from vector_runner import VectorizedSessionRunner
+
+
+class _CpuBoundSession(BaseThoughtForgeClientSession):
+    """ an environment whose step costs `work` iterations of python math """
+    def sim_started_notification(self):
+        self.work = self.client_params['benchmark_work']
+        self.state = 0.0
+        return {sensor_name: 0.0 for sensor_name in self.sensor_name_map.keys()}
+
+    def update(self, motor_dict):
+        checksum = 0.0
+        for step in range(self.work):
+            checksum += math.sin(step * 0.001)
+        self.state += sum(value[0] if isinstance(value, list) else value for value in motor_dict.values())
+        return {sensor_name: math.sin(self.state + index) for index, sensor_name in enumerate(self.sensor_name_map.keys())}
+
+
+class _ProcessCpuBoundSession(ProcessEnvironmentSession, _CpuBoundSession):
+    pass
+
+
+def run_benchmark(params_file, num_sessions, work, num_ticks):
+    temp_directory = tempfile.mkdtemp()
+    temp_params_file = os.path.join(temp_directory, 'bench_process_env.params')
+    try:
+        client_params = load_client_params(params_file)
+        client_params['benchmark_work'] = work
+        with open(temp_params_file, 'w') as temp_file:
+            json.dump(client_params, temp_file)
+        print(num_sessions, "sessions,", num_ticks, "ticks,", work, "iterations of environment work per step")
+        with LocalServerProcess() as server:
+            for label, session_class in [('in-process', _CpuBoundSession), ('worker processes', _ProcessCpuBoundSession)]:
+                runner = VectorizedSessionRunner(session_class, num_sessions, temp_params_file,
+                    host=server.host, port=server.port, protocol='http', api_key='benchmark-key')
+                with contextlib.redirect_stdout(io.StringIO()):
+                    runner.run(max_ticks=num_ticks)
+                statistics = runner.get_statistics()
+                print(label.ljust(18), "aggregate:", round(statistics['ticks_per_sec'], 1), "ticks/s")
+    finally:
+        shutil.rmtree(temp_directory)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--params', default='./advanced/reacher/example_reacher.params')
+    parser.add_argument('--sessions', type=int, default=4)
+    parser.add_argument('--work', type=int, default=20000, help='python math iterations per environment step')
+    parser.add_argument('--ticks', type=int, default=200)
+    cli_args = parser.parse_args()
+    run_benchmark(cli_args.params, cli_args.sessions, cli_args.work, cli_args.ticks)
@@ -0,0 +1,91 @@
+""" Tick latency of the session loop against a stand-in server that injects faults, with and without request policies.
+
+Runs the cartpole layout against the stand-in (in another process) with stalled replies, 503 errors and dropped
+connections at the given rates, and reports ticks/sec, p50/p99/max tick latency and the request policy's counters
+for:
+
+- no policy: stalled replies are waited for, and the first error or dropped connection ends the session
+- retries: every attempt times out after `--attempt-timeout` seconds and is retried
+- hedging: a second request is sent after `--hedge-after` seconds without a reply
+
+Usage::
+
+    python -m benchmarks.bench_request_policy --ticks 2000 --stall-rate 0.01 --stall-time 0.2
+    python -m benchmarks.bench_request_policy --error-rate 0.01 --drop-rate 0.01 --hedge-after 0.005
+"""
+import argparse, contextlib, io, math, time
+import numpy as np
+
+from benchmarks.local_server import LocalServerProcess
+from request_policy import RequestPolicy
+from thoughtforge_client import BaseThoughtForgeClientSession
+
+
+class _TimedSession(BaseThoughtForgeClientSession):
+    """ a session without an environment that times the loop between its update() calls """
+    def __init__(self, file_name, num_ticks, **session_kwargs):
+        self.num_ticks = num_ticks
+        self.tick_times = []
+        super().__init__(file_name, **session_kwargs)
+
+    def sim_started_notification(self):
+        self._last_update_time = time.perf_counter()
+
+    def update(self, motor_action_dict):
+        now = time.perf_counter()
+        self.tick_times.append(now - self._last_update_time)
+        if len(self.tick_times) >= self.num_ticks:
+            self.stop_sim()
+        self._last_update_time = now
+        return {name: math.sin(0.01 * self.sim_t + index) for index, name in enumerate(self.sensor_name_map)}
+
+
+def run_policy(label, policy, params_file, num_ticks, port):
+    output = io.StringIO()
+    session = None
+    error = None
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(output):
+            session = _TimedSession(params_file, num_ticks, host='127.0.0.1', port=port, protocol='http', api_key='bench',
+                request_policy=policy)
+    except Exception as e:
+        error = type(e).__name__
+    elapsed = time.perf_counter() - start
+    tick_times = np.asarray(session.tick_times if session is not None else [0.0])
+    line = [label.ljust(10), "ticks:", len(tick_times), "\tticks/sec:", round(len(tick_times) / elapsed, 1),
+        "\tp50:", round(np.percentile(tick_times, 50) * 1e3, 3), "ms\tp99:", round(np.percentile(tick_times, 99) * 1e3, 3),
+        "ms\tmax:", round(tick_times.max() * 1e3, 3), "ms"]
+    if policy is not None:
+        line += ["\t" + ", ".join(name + ": " + str(count) for name, count in policy.counters.items())]
+    if error is not None:
+        line += ["\tfailed:", error]
+    print(*line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--params', default='./examples/cartpole/example_cartpole.params')
+    parser.add_argument('--ticks', type=int, default=2000)
+    parser.add_argument('--latency', type=float, default=0.001)
+    parser.add_argument('--stall-rate', type=float, default=0.01)
+    parser.add_argument('--stall-time', type=float, default=0.2)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--drop-rate', type=float, default=0.0)
+    parser.add_argument('--deadline', type=float, default=2.0)
+    parser.add_argument('--attempt-timeout', type=float, default=0.02)
+    parser.add_argument('--hedge-after', type=float, default=0.01)
+    cli_args = parser.parse_args()
+    policies = [
+        ('no policy', lambda: None),
+        ('retries', lambda: RequestPolicy(deadline=cli_args.deadline, max_retries=5, retry_backoff=0.001,
+            attempt_timeout=cli_args.attempt_timeout)),
+        ('hedging', lambda: RequestPolicy(deadline=cli_args.deadline, max_retries=5, retry_backoff=0.001,
+            hedge_after=cli_args.hedge_after)),
+    ]
+    print(cli_args.ticks, "ticks,", cli_args.latency * 1e3, "ms latency, stall rate:", cli_args.stall_rate, "(" + str(cli_args.stall_time),
+        "s), error rate:", cli_args.error_rate, "drop rate:", cli_args.drop_rate)
+    for label, create_policy in policies:
+        with LocalServerProcess(cli_args.latency, error_rate=cli_args.error_rate, stall_rate=cli_args.stall_rate,
+                stall_time=cli_args.stall_time, drop_rate=cli_args.drop_rate) as server:
+            run_policy(label, create_policy(), cli_args.params, cli_args.ticks, server.port)
@@ -0,0 +1,87 @@
+""" Cost of decoding one `/updateSim` json response into named motor values.
+
+Compares the original decode path (`response.json()`, nested `json.loads` calls, `int()` on every
+motor key and a `safe_dict_get` remap through the motor name map) with the single-pass
+`JsonWireCodec` decoder for every installed json backend, with and without debug data. Responses
+are pre-built `requests.Response` objects in the shape the server sends, no network is involved.
+
+Usage::
+
+    python -m benchmarks.bench_response_decode --params ./advanced/reacher/example_reacher.params --blocks 64
+"""
+import argparse, json, time
+import requests
+
+from benchmarks.local_server import _expand_names
+from utils import load_client_params, safe_dict_get
+from wire_format import JSON_BACKENDS, JsonWireCodec
+
+
+def _build_response(motor_name_map, num_blocks, with_debug_data):
+    motor_dict = {str(motor_id): ([0.25] if is_multi else 0.25) for motor_id, is_multi in motor_name_map.values()}
+    debugging_data = {}
+    if with_debug_data:
+        block_values = {str(block_id): 0.5 for block_id in range(num_blocks)}
+        debugging_data = {
+            'global_stability_rate': 0.5,
+            'global_energy_estimate': 1.0,
+            'block_stability_rates': block_values,
+            'block_energy_estimates': block_values,
+            'block_stable_times': block_values}
+    response = requests.Response()
+    response.status_code = 200
+    response.encoding = 'utf-8'
+    response._content = json.dumps({
+        'motor_dict': motor_dict,
+        'session_log': json.dumps([]),
+        'debugging_data': json.dumps(debugging_data)}).encode()
+    return response
+
+
+def _decode_original(response, motor_name_map):
+    response_dict = response.json()
+    motor_dict = {int(key):val for key, val in response_dict['motor_dict'].items()}
+    session_log = json.loads(safe_dict_get(response_dict, 'session_log', '[]'))
+    debugging_data = json.loads(response_dict['debugging_data'])
+    next_motor_dict = {motor_name: safe_dict_get(motor_dict, motor_id, 0.0) for motor_name, motor_id in motor_name_map.items()}
+    return next_motor_dict, session_log, debugging_data
+
+
+def _time_per_call(function, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        function()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def run_benchmark(params_file, num_blocks, iterations):
+    client_params = load_client_params(params_file)
+    motors = _expand_names(client_params['motors'])
+    motor_name_map = {name: motor_id for motor_id, (name, _) in enumerate(motors)}
+    motor_layout = {name: (motor_id, entry.get('type') == 'MULTI') for motor_id, (name, entry) in enumerate(motors)}
+    motor_names_by_id = sorted(motor_name_map.keys(), key=lambda name: motor_name_map[name])
+    print("Layout:", len(motors), "motors,", num_blocks, "blocks,", iterations, "iterations")
+    for debug_data_requested in [False, True]:
+        response = _build_response(motor_layout, num_blocks, debug_data_requested)
+        print("debug data" if debug_data_requested else "no debug data", "(" + str(len(response.content)) + " bytes)")
+        original_time = _time_per_call(lambda: _decode_original(response, motor_name_map), iterations)
+        print("  original".ljust(18), round(original_time, 2), "us/tick")
+        for json_backend in JSON_BACKENDS:
+            codec = JsonWireCodec(motor_name_map.values(), json_backend)
+
+            def _decode():
+                motor_values, session_log, debugging_data = codec.decode_update_response(response, debug_data_requested)
+                return dict(zip(motor_names_by_id, motor_values)), session_log, debugging_data
+
+            decode_time = _time_per_call(_decode, iterations)
+            print(("  " + json_backend).ljust(18), round(decode_time, 2), "us/tick",
+                "\t(" + str(round(original_time / decode_time, 1)) + "x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--params', default='./advanced/reacher/example_reacher.params')
+    parser.add_argument('--blocks', type=int, default=64)
+    parser.add_argument('--iterations', type=int, default=20000)
+    cli_args = parser.parse_args()
+    run_benchmark(cli_args.params, cli_args.blocks, cli_args.iterations)
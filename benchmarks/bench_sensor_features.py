@@ -0,0 +1,115 @@
+""" Cost of computing sensor values from raw observations, per tick.
+
+Compares, on the sensor features of the reacher example:
+
+- the hand-coded scalar Python math the reacher client used before 'sensor_features'
+- :meth:`sensor_features.FeaturePipeline.transform_dict`, for sessions returning dictionaries from update(). Pipelines
+  of up to `SCALAR_MAX_SENSORS` sensors take its scalar path, larger ones the vectorized one.
+- :meth:`sensor_features.FeaturePipeline.transform`, for sessions returning arrays from update_array()
+
+`--copies N` declares the reacher features N times over, for sessions with many more sensors.
+
+Usage::
+
+    python -m benchmarks.bench_sensor_features --ticks 5000 --copies 1 10 100
+"""
+import argparse, time
+import numpy as np
+
+from sensor_features import create_feature_pipeline
+from session_spec import load_session_spec
+
+
+class _HandCodedFeatures():
+    """ the reacher sensor math as it was written in update(), for the sensors of the reacher .params file """
+    def __init__(self):
+        self.last_rotvel0 = 0
+        self.last_rotvel1 = 0
+        self.last_delta1_rotvel0 = 0
+        self.last_delta1_rotvel1 = 0
+
+    def compute(self, angle0, angle0_magnitude, radius, rotvel0, rotvel1):
+        body0_xvelr, body1_xvelr = rotvel0, rotvel1
+        clamped_abs_angle0 = angle0_magnitude
+        if angle0_magnitude < 0.25:
+            clamped_abs_angle0 = 0.25
+        body0_xvelr_scaled = body0_xvelr/10
+        if abs(body0_xvelr_scaled) < 0.04:
+            body0_xvelr_scaled = 0
+        new_delta1_rotvel0 = self.last_rotvel0 - body0_xvelr
+        self.last_rotvel0 = body0_xvelr
+        new_delta2_rotvel0 = self.last_delta1_rotvel0 - new_delta1_rotvel0
+        self.last_delta1_rotvel0 = new_delta1_rotvel0
+        rotvel1_sensor_val = body0_xvelr/20
+        if abs(rotvel1_sensor_val) < 0.08:
+            rotvel1_sensor_val = 0
+        delta1_rotvel1_sensor_val = self.last_rotvel1 - body1_xvelr
+        self.last_rotvel1 = body1_xvelr
+        delta2_rotvel1_sensor_val = self.last_delta1_rotvel1 - delta1_rotvel1_sensor_val
+        self.last_delta1_rotvel1 = delta1_rotvel1_sensor_val
+        return {
+            "angle0": angle0,
+            'rotvel1_sensor': rotvel1_sensor_val,
+            'delta1_rotvel1_sensor': delta1_rotvel1_sensor_val,
+            'delta2_rotvel1_sensor': delta2_rotvel1_sensor_val,
+            'radius': radius,
+            'rotvel0_sensor': body0_xvelr_scaled / clamped_abs_angle0,
+            'delta1_rotvel0_sensor': new_delta1_rotvel0 / clamped_abs_angle0,
+            'delta2_rotvel0_sensor': new_delta2_rotvel0 / clamped_abs_angle0
+        }
+
+
+def _per_tick_us(function, inputs):
+    start = time.perf_counter()
+    for tick_inputs in inputs:
+        function(tick_inputs)
+    return (time.perf_counter() - start) / len(inputs) * 1e6
+
+
+def _copied_features(spec, num_copies):
+    """ the sensor features of the .params file declared `num_copies` times, with the copy index appended to every name """
+    feature_params = {}
+    for copy in range(num_copies):
+        for sensor_name in spec.logical_sensor_names:
+            feature = dict(spec.get('sensor_features').get(sensor_name, {}))
+            feature.setdefault('input', sensor_name)
+            for key in ['input', 'divide_by']:
+                if key in feature:
+                    feature[key] = feature[key] + '_' + str(copy)
+            feature_params[sensor_name + '_' + str(copy)] = feature
+    return feature_params
+
+
+def run_benchmark(params_file, num_ticks, num_copies):
+    spec = load_session_spec(params_file)
+    feature_params = _copied_features(spec, num_copies)
+    pipeline = create_feature_pipeline(feature_params, {name: index for index, name in enumerate(feature_params.keys())})
+    rng = np.random.RandomState(0)
+    observation_names = ['angle0', 'angle0_magnitude', 'radius', 'rotvel0', 'rotvel1']
+    observations = rng.normal(size=(num_ticks, num_copies, len(observation_names)))
+    observations[:, :, 1] = np.abs(observations[:, :, 0])
+    named_inputs = [[dict(zip(observation_names, row)) for row in tick_observations.tolist()] for tick_observations in observations]
+    flat_named_inputs = [{name + '_' + str(copy): value for copy, named in enumerate(tick_inputs) for name, value in named.items()}
+        for tick_inputs in named_inputs]
+    array_inputs = [pipeline.input_layout.to_array(named) for named in flat_named_inputs]
+    out = pipeline.sensor_layout.empty()
+
+    hand_coded = [_HandCodedFeatures() for _ in range(num_copies)]
+    def compute_hand_coded(tick_inputs):
+        return [features.compute(**named) for features, named in zip(hand_coded, tick_inputs)]
+    print(len(feature_params), "sensors from", len(pipeline.input_names), "observations, per tick:")
+    print("  hand-coded python:", round(_per_tick_us(compute_hand_coded, named_inputs), 2), "us")
+    pipeline.reset()
+    print("  transform_dict():", round(_per_tick_us(pipeline.transform_dict, flat_named_inputs), 2), "us")
+    pipeline.reset()
+    print("  transform():", round(_per_tick_us(lambda values: pipeline.transform(values, out), array_inputs), 2), "us")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--params', default='./advanced/reacher/example_reacher.params')
+    parser.add_argument('--ticks', type=int, default=5000)
+    parser.add_argument('--copies', type=int, nargs='+', default=[1, 10, 100])
+    cli_args = parser.parse_args()
+    for num_copies in cli_args.copies:
+        run_benchmark(cli_args.params, cli_args.ticks, num_copies)
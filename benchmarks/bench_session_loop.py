@@ -0,0 +1,259 @@
+""" Throughput, tick latency and memory of the full client session loop.
+
+Runs the real `BaseThoughtForgeClientSession` loop (`_start_sim`: history, statistics, request
+encoding, the pooled transport and response decoding) against the stand-in server, for the
+sensor/motor layouts of the shipped .params files. The session has no environment, its `update()`
+returns cheap deterministic sensor values, so the numbers are the cost of the client loop plus the
+(configurable) server latency.
+
+Each layout runs in a fresh process, with the stand-in in another, and reports:
+
+- ticks/sec, and p50/p99 tick latency (time spent outside `update()` per tick)
+- bytes allocated per tick (peak traced memory within a tick) and bytes retained per tick, from a
+  second, shorter pass under tracemalloc (Python 3.9 or later, reported as `null` on older versions)
+- peak RSS of the client process after the timed pass
+
+Results are written as json (`--output`) and can be compared against an earlier run (`--baseline`).
+`--action-chunk-size` runs the layouts with action chunks of up to N motor steps per request, and
+`--array-api` runs them with a session implementing `update_array()` instead of `update()`.
+
+Usage::
+
+    python -m benchmarks.bench_session_loop --latency 0.001 --output results.json
+    python -m benchmarks.bench_session_loop --layouts cartpole reacher --baseline results.json
+    python -m benchmarks.bench_session_loop --latency 0.005 --action-chunk-size 8 --baseline results.json
+    python -m benchmarks.bench_session_loop --array-api --baseline results.json
+"""
+import argparse, contextlib, io, json, math, multiprocessing, os, platform, shutil, subprocess, sys, tempfile, time, tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from benchmarks.local_server import LocalServerProcess
+from thoughtforge_client import BaseThoughtForgeClientSession
+from utils import load_client_params
+
+
+LAYOUTS = {
+    'cartpole': './examples/cartpole/example_cartpole.params',
+    'mountaincar': './examples/mountaincar/example_mountaincar.params',
+    'acrobot': './examples/acrobot/example_acrobot.params',
+    'reacher': './advanced/reacher/example_reacher.params',
+    'reacher_3joint': './advanced/reacher_3joint/example_reacher3.params',
+}
+RESULTS_VERSION = 2
+WARMUP_TICKS = 50
+
+
+class _LoopSession(BaseThoughtForgeClientSession):
+    """ a session without an environment that times the loop between its update() calls """
+    def __init__(self, file_name, num_ticks, trace_allocations=False, **session_kwargs):
+        self.num_ticks = num_ticks
+        self.trace_allocations = trace_allocations
+        self.tick_times = []
+        self.allocated_bytes = []
+        self.retained_bytes = []
+        super().__init__(file_name, **session_kwargs)
+
+    def _sensor_values(self, tick):
+        return {name: math.sin(0.01 * tick + index) for index, name in enumerate(self._sensor_names)}
+
+    def sim_started_notification(self):
+        # the sensor values are generated directly, without the layout's 'sensor_features', so that runs stay
+        # comparable with results of the layouts from before they declared any
+        self.feature_pipeline = None
+        self.sensor_input_layout = self.sensor_layout
+        self._sensor_names = list(self.sensor_name_map.keys())
+        self._update_returned = None
+        self._tick_start_memory = None
+        return self._sensor_values(0)
+
+    def _tick_boundary(self):
+        """ measures the loop since the previous update, returns the tick of the next sensor values """
+        now = time.perf_counter()
+        if self._update_returned is not None:
+            self.tick_times.append(now - self._update_returned)
+        if self._tick_start_memory is not None:
+            current_memory, peak_memory = tracemalloc.get_traced_memory()
+            self.allocated_bytes.append(peak_memory - self._tick_start_memory)
+            self.retained_bytes.append(current_memory - self._tick_start_memory)
+        if self.sim_t + 1 >= self.num_ticks:
+            self.stop_sim()
+        return self.sim_t + 1
+
+    def _start_tick(self):
+        if self.trace_allocations:
+            tracemalloc.reset_peak()
+            self._tick_start_memory = tracemalloc.get_traced_memory()[0]
+        self._update_returned = time.perf_counter()
+
+    def update(self, motor_dict):
+        sensor_values = self._sensor_values(self._tick_boundary())
+        self._start_tick()
+        return sensor_values
+
+
+class _ArrayLoopSession(_LoopSession):
+    """ the loop session implementing update_array(), writing its sensor values into a reused array """
+    update = BaseThoughtForgeClientSession.update
+
+    def sim_started_notification(self):
+        initial_sensor_values = super().sim_started_notification()
+        self._sensor_positions = np.array([self.sensor_layout.index(name) for name in self._sensor_names])
+        self._sensor_offsets = np.arange(len(self._sensor_names))
+        self._sensor_array = self.sensor_layout.empty()
+        return initial_sensor_values
+
+    def update_array(self, motor_values):
+        tick = self._tick_boundary()
+        self._sensor_array[self._sensor_positions] = np.sin(0.01 * tick + self._sensor_offsets)
+        self._start_tick()
+        return self._sensor_array
+
+
+def _peak_rss_bytes():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macOS
+    return peak_rss if sys.platform == 'darwin' else peak_rss * 1024
+
+
+def _run_session(params_file, host, port, num_ticks, trace_allocations, array_api):
+    session_class = _ArrayLoopSession if array_api else _LoopSession
+    # the end-of-session summary isn't part of the measurement
+    with contextlib.redirect_stdout(io.StringIO()) as session_output:
+        session = session_class(params_file, num_ticks, trace_allocations,
+            host=host, port=port, protocol='http', api_key='benchmark-key')
+    if len(session.tick_times) < num_ticks - 1:
+        raise RuntimeError("session loop failed:\n" + session_output.getvalue())
+    return session
+
+
+def _run_layout(params_file, host, port, num_ticks, allocation_ticks, param_overrides, array_api):
+    """ runs in a fresh process so that peak RSS is per layout """
+    if len(param_overrides) > 0:
+        temp_directory = tempfile.mkdtemp()
+        try:
+            client_params = load_client_params(params_file)
+            client_params.update(param_overrides)
+            temp_params_file = os.path.join(temp_directory, os.path.basename(params_file))
+            with open(temp_params_file, 'w') as temp_file:
+                json.dump(client_params, temp_file)
+            result = _run_layout(temp_params_file, host, port, num_ticks, allocation_ticks, {}, array_api)
+        finally:
+            shutil.rmtree(temp_directory)
+        result['params'] = params_file
+        return result
+    start = time.perf_counter()
+    session = _run_session(params_file, host, port, num_ticks, False, array_api)
+    elapsed = time.perf_counter() - start
+    peak_rss = _peak_rss_bytes()
+    tick_times_ms = np.array(session.tick_times[WARMUP_TICKS:]) * 1000.0
+    result = {
+        'params': params_file,
+        'num_sensors': len(session.sensor_name_map),
+        'num_motors': len(session.motor_name_map),
+        'ticks': num_ticks,
+        'ticks_per_sec': num_ticks / elapsed,
+        'tick_latency_p50_ms': float(np.percentile(tick_times_ms, 50)),
+        'tick_latency_p99_ms': float(np.percentile(tick_times_ms, 99)),
+        'tick_latency_mean_ms': float(np.mean(tick_times_ms)),
+        'action_chunk_size': session.action_chunk_size,
+        'array_api': array_api,
+        'peak_rss_bytes': peak_rss,
+    }
+    result['allocated_bytes_per_tick'] = None
+    result['retained_bytes_per_tick'] = None
+    # per-tick peaks need tracemalloc.reset_peak(), added in Python 3.9
+    if not hasattr(tracemalloc, 'reset_peak'):
+        return result
+    tracemalloc.start()
+    try:
+        session = _run_session(params_file, host, port, allocation_ticks, True, array_api)
+    finally:
+        tracemalloc.stop()
+    result['allocated_bytes_per_tick'] = float(np.mean(session.allocated_bytes[WARMUP_TICKS:]))
+    result['retained_bytes_per_tick'] = float(np.mean(session.retained_bytes[WARMUP_TICKS:]))
+    return result
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _print_results(results, baseline):
+    baseline_layouts = baseline['layouts'] if baseline is not None else {}
+    for layout, result in results['layouts'].items():
+        line = [layout.ljust(16),
+            str(round(result['ticks_per_sec'], 1)).rjust(9), "ticks/s",
+            "\tp50:", round(result['tick_latency_p50_ms'], 3), "ms",
+            "\tp99:", round(result['tick_latency_p99_ms'], 3), "ms"]
+        if result['allocated_bytes_per_tick'] is not None:
+            line += ["\talloc/tick:", round(result['allocated_bytes_per_tick'] / 1024, 1), "KiB",
+                "\tretained/tick:", round(result['retained_bytes_per_tick']), "B"]
+        if result['peak_rss_bytes'] is not None:
+            line += ["\tpeak RSS:", round(result['peak_rss_bytes'] / 2**20, 1), "MiB"]
+        if layout in baseline_layouts:
+            previous = baseline_layouts[layout]
+            line += ["\tvs baseline: ticks/s", "{:+.1%}".format(result['ticks_per_sec'] / previous['ticks_per_sec'] - 1),
+                "p99", "{:+.1%}".format(result['tick_latency_p99_ms'] / previous['tick_latency_p99_ms'] - 1)]
+        print(*line)
+
+
+def run_benchmark(layouts, latency, num_ticks, allocation_ticks, output_file=None, baseline_file=None, action_chunk_size=1,
+        array_api=False):
+    baseline = None
+    if baseline_file is not None:
+        with open(baseline_file) as json_file:
+            baseline = json.load(json_file)
+    results = {
+        'version': RESULTS_VERSION,
+        'revision': _git_revision(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'latency': latency,
+        'action_chunk_size': action_chunk_size,
+        'array_api': array_api,
+        'layouts': {},
+    }
+    param_overrides = {'action_chunk_size': action_chunk_size} if action_chunk_size > 1 else {}
+    print("Session loop,", num_ticks, "ticks per layout,", round(latency * 1000, 3), "ms stand-in latency,",
+        "action chunks of", action_chunk_size, ", array API" if array_api else ", dict API")
+    with LocalServerProcess(latency) as server:
+        for layout in layouts:
+            # spawn, so that each layout starts from a fresh interpreter
+            with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as pool:
+                results['layouts'][layout] = pool.submit(_run_layout, LAYOUTS[layout], server.host, server.port,
+                    num_ticks, allocation_ticks, param_overrides, array_api).result()
+    _print_results(results, baseline)
+    if output_file is not None:
+        with open(output_file, 'w') as json_file:
+            json.dump(results, json_file, indent=2)
+        print("Results written to", output_file)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--layouts', nargs='+', choices=list(LAYOUTS.keys()), default=list(LAYOUTS.keys()))
+    parser.add_argument('--latency', type=float, default=0.0, help='artificial stand-in latency per request in seconds')
+    parser.add_argument('--ticks', type=int, default=5000)
+    parser.add_argument('--allocation-ticks', type=int, default=1000, help='ticks of the tracemalloc pass, more than ' + str(WARMUP_TICKS))
+    parser.add_argument('--output', default=None, help='json file to write the results to')
+    parser.add_argument('--baseline', default=None, help='json results of an earlier run to compare against')
+    parser.add_argument('--action-chunk-size', type=int, default=1, help='motor steps per /updateSim request')
+    parser.add_argument('--array-api', action='store_true', help='run a session implementing update_array()')
+    cli_args = parser.parse_args()
+    # the first WARMUP_TICKS ticks of each pass are left out of the results
+    if cli_args.ticks <= WARMUP_TICKS:
+        parser.error("--ticks must be more than " + str(WARMUP_TICKS))
+    if cli_args.allocation_ticks <= WARMUP_TICKS:
+        parser.error("--allocation-ticks must be more than " + str(WARMUP_TICKS))
+    run_benchmark(cli_args.layouts, cli_args.latency, cli_args.ticks, cli_args.allocation_ticks, cli_args.output, cli_args.baseline,
+        cli_args.action_chunk_size, cli_args.array_api)
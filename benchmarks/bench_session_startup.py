@@ -0,0 +1,75 @@
+""" Process startup and session creation time, for workloads launching many short sessions.
+
+Measures:
+
+- the time to import the client in a fresh interpreter (median over several processes, minus the
+  time of starting an interpreter that imports nothing)
+- loading the client .params file: compiling a spec from scratch, and loading the cached spec
+- sessions per second for short sessions (initialize, one update, close) started one after another
+  against a stand-in server running in a separate process
+
+Usage::
+
+    python -m benchmarks.bench_session_startup --sessions 200
+"""
+import argparse, contextlib, io, subprocess, sys, time
+import numpy as np
+
+from benchmarks.local_server import LocalServerProcess
+from session_spec import clear_session_spec_cache, load_session_spec
+from thoughtforge_client import BaseThoughtForgeClientSession
+
+
+class _ShortSession(BaseThoughtForgeClientSession):
+    """ stops at the first update """
+    def update(self, motor_action_dict):
+        self.stop_sim()
+        return {sensor_name: 0.0 for sensor_name in self.sensor_name_map.keys()}
+
+
+def _interpreter_time(code, num_processes):
+    times = []
+    for _ in range(num_processes):
+        start = time.perf_counter()
+        subprocess.check_call([sys.executable, '-c', code])
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
+
+
+def _load_time(params_file, num_loads, cached):
+    load_session_spec(params_file)
+    start = time.perf_counter()
+    for _ in range(num_loads):
+        if not cached:
+            clear_session_spec_cache()
+        load_session_spec(params_file)
+    return (time.perf_counter() - start) / num_loads
+
+
+def run_benchmark(params_file, num_sessions, num_processes):
+    empty_time = _interpreter_time('pass', num_processes)
+    import_time = _interpreter_time('import thoughtforge_client', num_processes)
+    print("import thoughtforge_client:", round((import_time - empty_time) * 1000, 1), "ms",
+        "\t(interpreter startup:", round(empty_time * 1000, 1), "ms)")
+    print("load .params, compiled:", round(_load_time(params_file, 1000, False) * 1e6, 1), "us",
+        "\tcached:", round(_load_time(params_file, 1000, True) * 1e6, 1), "us")
+    with LocalServerProcess() as server:
+        session_times = []
+        for _ in range(num_sessions):
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                _ShortSession(params_file, host=server.host, port=server.port, protocol='http', api_key='benchmark-key')
+            session_times.append(time.perf_counter() - start)
+    session_times_ms = np.array(session_times) * 1000.0
+    print("short sessions:", round(num_sessions / np.sum(session_times), 1), "sessions/s",
+        "\tp50:", round(float(np.percentile(session_times_ms, 50)), 3), "ms",
+        "\tp99:", round(float(np.percentile(session_times_ms, 99)), 3), "ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--params', default='./advanced/reacher/example_reacher.params')
+    parser.add_argument('--sessions', type=int, default=200)
+    parser.add_argument('--processes', type=int, default=10, help='interpreters started to time the import')
+    cli_args = parser.parse_args()
+    run_benchmark(cli_args.params, cli_args.sessions, cli_args.processes)
@@ -0,0 +1,85 @@
+""" Per-tick latency of `/updateSim` requests with and without the pooled keep-alive transport.
+
+Runs against the local stand-in server, so the numbers only reflect client + loopback overhead.
+Over a real `https` deployment the savings are larger since every bare request also pays for a
+TLS handshake.
+
+Usage::
+
+    python -m benchmarks.bench_transport --ticks 2000
+"""
+import argparse, json, time
+import numpy as np
+import requests
+
+from benchmarks.local_server import LocalThoughtForgeServer
+from transport import ThoughtForgeTransport
+from utils import load_client_params
+
+
+API_KEY = 'benchmark-key'
+
+
+def _report(label, tick_times, connection_count):
+    tick_times_ms = np.array(tick_times) * 1000.0
+    print(label.ljust(24),
+        "mean:", round(float(np.mean(tick_times_ms)), 4), "ms",
+        "\tp50:", round(float(np.percentile(tick_times_ms, 50)), 4), "ms",
+        "\tp99:", round(float(np.percentile(tick_times_ms, 99)), 4), "ms",
+        "\tconnections opened:", connection_count)
+
+
+def _init_session(transport, client_params):
+    init_params = {
+        'version': client_params['version'],
+        'motors': json.dumps(client_params['motors']),
+        'sensors': json.dumps(client_params['sensors']),
+    }
+    response_dict = transport.post('/initSession', init_params).json()
+    return response_dict['session_id'], json.loads(response_dict['sensor_ids']), json.loads(response_dict['motor_ids'])
+
+
+def _update_params(session_id, sensor_ids, motor_ids):
+    return {
+        'session_id': session_id,
+        'sensor_dict': json.dumps({sensor_id: 0.0 for sensor_id in sensor_ids.values()}),
+        'motor_ids_requested': json.dumps(list(motor_ids.values())),
+        'collect_debug_data': False
+    }
+
+
+def run_benchmark(params_file, ticks):
+    client_params = load_client_params(params_file)
+    with LocalThoughtForgeServer() as server:
+        transport = ThoughtForgeTransport('http', server.host, server.port, API_KEY)
+        session_id, sensor_ids, motor_ids = _init_session(transport, client_params)
+        update_params = _update_params(session_id, sensor_ids, motor_ids)
+
+        # before: a bare requests.post per tick, as the session loop used to do
+        connections_before = server.connection_count
+        headers = {"x-thoughtforge-key": API_KEY}
+        update_url = transport.build_url('/updateSim', update_params)
+        tick_times = []
+        for _ in range(ticks):
+            start = time.perf_counter()
+            requests.post(update_url, headers=headers).json()
+            tick_times.append(time.perf_counter() - start)
+        _report("bare requests.post", tick_times, server.connection_count - connections_before)
+
+        # after: the pooled keep-alive transport owned by the session
+        connections_before = server.connection_count
+        tick_times = []
+        for _ in range(ticks):
+            start = time.perf_counter()
+            transport.post('/updateSim', update_params).json()
+            tick_times.append(time.perf_counter() - start)
+        _report("pooled transport", tick_times, server.connection_count - connections_before)
+        transport.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--params', default='./examples/cartpole/example_cartpole.params')
+    parser.add_argument('--ticks', type=int, default=2000)
+    cli_args = parser.parse_args()
+    run_benchmark(cli_args.params, cli_args.ticks)
@@ -0,0 +1,45 @@
+""" Aggregate ticks/sec of the vectorized runner as the number of sessions grows.
+
+Each session has a trivial `update()`, so the numbers reflect how well concurrent `/updateSim`
+requests hide the (artificial) server latency of the local stand-in server. The stand-in runs
+in the benchmark process and shares its GIL, so it saturates well before a real server would.
+
+Usage::
+
+    python -m benchmarks.bench_vector_runner --latency 0.005 --sessions 1 2 4 8 16
+"""
+import argparse
+
+from benchmarks.local_server import LocalThoughtForgeServer
+from thoughtforge_client import BaseThoughtForgeClientSession
+from vector_runner import VectorizedSessionRunner
+
+
+class _ConstantSensorSession(BaseThoughtForgeClientSession):
+    """ a session without an environment, returns constant sensor values """
+    def update(self, motor_dict):
+        return {sensor_name: 0.0 for sensor_name in self.sensor_name_map}
+
+
+def run_benchmark(params_file, latency, session_counts, ticks):
+    with LocalThoughtForgeServer(latency=latency) as server:
+        results = []
+        for num_sessions in session_counts:
+            runner = VectorizedSessionRunner(_ConstantSensorSession, num_sessions, params_file,
+                host=server.host, port=server.port, protocol='http', api_key='benchmark-key')
+            runner.run(max_ticks=ticks)
+            results.append((num_sessions, runner.get_statistics()['ticks_per_sec']))
+    print("Scaling with", round(latency * 1000, 3), "ms server latency:")
+    for num_sessions, ticks_per_sec in results:
+        print("-", str(num_sessions).rjust(3), "sessions\taggregate ticks/sec:", round(ticks_per_sec, 1),
+            "\tper session:", round(ticks_per_sec / num_sessions, 1))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--params', default='./examples/cartpole/example_cartpole.params')
+    parser.add_argument('--latency', type=float, default=0.005)
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    parser.add_argument('--ticks', type=int, default=200)
+    cli_args = parser.parse_args()
+    run_benchmark(cli_args.params, cli_args.latency, cli_args.sessions, cli_args.ticks)
@@ -0,0 +1,105 @@
+""" Codec cost and payload size of the json and binary `/updateSim` wire formats.
+
+Only the client side encode of the request and decode of the response are timed, no network is
+involved. Responses are pre-built in the same shape the server sends.
+
+For layouts with 'fan_out' sensor entries, each format is measured three ways: sending every registered
+name's value (as without fan-out declarations), sending each fanned out value once for the server to
+replicate, and copying it to every name in the codec (for servers without fan-out support).
+
+Usage::
+
+    python -m benchmarks.bench_wire_format --params ./advanced/reacher/example_reacher.params
+"""
+import argparse, json, time
+import numpy as np
+
+from benchmarks.local_server import _expand_names
+from session_spec import load_session_spec
+from transport import ThoughtForgeTransport
+from utils import load_client_params
+from wire_format import BINARY_CONTENT_TYPE, JsonWireCodec, create_wire_codec, encode_motor_frame
+
+
+class _PrebuiltResponse():
+    """ the parts of requests.Response used by the wire codecs """
+    def __init__(self, content, content_type):
+        self.content = content
+        self.headers = {'Content-Type': content_type}
+
+    def json(self):
+        return json.loads(self.content)
+
+
+def _build_layout(client_params):
+    sensors = _expand_names(client_params['sensors'])
+    motors = _expand_names(client_params['motors'])
+    sensor_ids = list(range(len(sensors)))
+    motor_ids = list(range(len(motors)))
+    motor_values = [[0.25] if entry.get('type') == 'MULTI' else 0.25 for _, entry in motors]
+    return sensor_ids, motor_ids, motor_values
+
+
+def _build_response(wire_format, motor_ids, motor_values):
+    if wire_format == 'json':
+        content = json.dumps({
+            'motor_dict': {str(motor_id): value for motor_id, value in zip(motor_ids, motor_values)},
+            'session_log': json.dumps([]),
+            'debugging_data': json.dumps({})}).encode()
+        return _PrebuiltResponse(content, 'application/json')
+    dtype = '<f4' if wire_format == 'binary32' else '<f8'
+    return _PrebuiltResponse(encode_motor_frame(motor_values, [], {}, dtype), BINARY_CONTENT_TYPE)
+
+
+def _fan_out_layouts(params_file, sensor_ids):
+    """ (label, sensor ids the session's values are keyed by, sensor copies for the codec) of each way to send the layout """
+    spec = load_session_spec(params_file)
+    layouts = [('', sensor_ids, None)]
+    if len(spec.sensor_fan_out) == 0:
+        return layouts
+    registered_ids = dict(zip(spec.sensor_names, sensor_ids))
+    sensor_copies = {registered_ids[names[0]]: [registered_ids[name] for name in names[1:]] for names in spec.sensor_fan_out.values()}
+    copied_ids = set(copy_id for copy_ids in sensor_copies.values() for copy_id in copy_ids)
+    logical_ids = [sensor_id for sensor_id in sensor_ids if sensor_id not in copied_ids]
+    return [('every name', sensor_ids, None), ('fan-out server', logical_ids, None), ('fan-out client', logical_ids, sensor_copies)]
+
+
+def run_benchmark(params_file, ticks):
+    client_params = load_client_params(params_file)
+    all_sensor_ids, motor_ids, motor_values = _build_layout(client_params)
+    transport = ThoughtForgeTransport('https', 'thoughtforge.example', 4343, 'benchmark-key')
+    print("Layout:", len(all_sensor_ids), "sensors,", len(motor_ids), "motors,", ticks, "ticks")
+    for wire_format, (label, sensor_ids, sensor_copies) in [(wire_format, layout) for wire_format in ['json', 'binary', 'binary32']
+            for layout in _fan_out_layouts(params_file, all_sensor_ids)]:
+        rng = np.random.RandomState(0)
+        sensor_dicts = [{sensor_id: float(value) for sensor_id, value in zip(sensor_ids, rng.uniform(-1, 1, len(sensor_ids)))}
+            for _ in range(ticks)]
+        codec = create_wire_codec(wire_format, sensor_ids, motor_ids, sensor_copies=sensor_copies)
+        response = _build_response(wire_format, motor_ids, motor_values)
+
+        start = time.perf_counter()
+        for sensor_dict in sensor_dicts:
+            update_params, body, _ = codec.encode_update_request(0, sensor_dict, motor_ids, False)
+            url = transport.build_url('/updateSim', update_params)
+        encode_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(ticks):
+            codec.decode_update_response(response)
+        decode_time = time.perf_counter() - start
+
+        request_bytes = len(url) + (len(body) if body is not None else 0)
+        print((wire_format + (" " + label if label else "")).ljust(25),
+            "encode:", round(encode_time / ticks * 1e6, 2), "us/tick",
+            "\tdecode:", round(decode_time / ticks * 1e6, 2), "us/tick",
+            "\trequest url+body:", request_bytes, "bytes",
+            "\tresponse body:", len(response.content), "bytes")
+    transport.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--params', default='./advanced/reacher/example_reacher.params')
+    parser.add_argument('--ticks', type=int, default=20000)
+    cli_args = parser.parse_args()
+    run_benchmark(cli_args.params, cli_args.ticks)
@@ -0,0 +1,555 @@
+""" A minimal local stand-in for the ThoughtForge server.
+
+The stand-in implements enough of the server protocol (`/`, `/initSession`, `/updateSim`,
+`/getModel` and `/shutdownSession`) to drive the real client session loop without network access
+or an API key. Motor values are a cheap deterministic function of the tick count, so the stand-in
+is only useful for measuring and testing the client and transport, not for learning.
+
+The stand-in can inject faults into `/updateSim` requests, to test sessions' request policies (see
+request_policy.py): 503 errors, stalled responses and dropped connections, at given rates.
+
+Usage as a standalone server::
+
+    python -m benchmarks.local_server --port 4343 --latency 0.002
+    python -m benchmarks.local_server --port 4343 --error-rate 0.01 --stall-rate 0.01 --stall-time 0.5 --drop-rate 0.01
+"""
+import argparse, json, random, socket, subprocess, sys, threading, time
+import math
+import numpy as np
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+from compression import get_codec, CODECS, COMPRESSION_HEADER, COMPRESSION_THRESHOLD_HEADER, RESPONSE_ENCODING_HEADER
+from model_cache import MODEL_DIGEST_HEADER, MODEL_REQUIRED_STATUS
+from model_format import MODEL_CONTENT_TYPE, MODEL_UPLOAD_BINARY, iter_model_chunks, read_model
+from request_policy import IDEMPOTENT_UPDATES_HEADER, REQUEST_SEQUENCE_ARG
+from wire_format import (ACTION_CHUNK_HEADER, BINARY_CONTENT_TYPE, SENSOR_FAN_OUT_HEADER, WIRE_FORMAT_BINARY, WIRE_FORMAT_BINARY32,
+    WIRE_FORMAT_HEADER, WIRE_FORMAT_JSON, decode_sensor_frame, encode_motor_frame)
+
+
+NUM_STANDIN_BLOCKS = 4
+MAX_STANDIN_ACTION_CHUNK_SIZE = 64
+
+
+def _expand_names(entries):
+    """ expands the (possibly multi-name) sensor/motor entries of a .params file into a list of
+    (name, entry) tuples """
+    expanded = []
+    for entry in entries:
+        names = entry['name'] if isinstance(entry['name'], list) else [entry['name']]
+        for name in names:
+            expanded.append((name, entry))
+    return expanded
+
+
+class _StandInSession():
+    """ server-side state for a single stand-in session """
+    def __init__(self, session_id, params, wire_format=WIRE_FORMAT_JSON, action_chunk_size=1, sensor_fan_out=None, idempotent_updates=False):
+        self.session_id = session_id
+        self.sim_t = 0
+        self.wire_format = wire_format
+        self.action_chunk_size = action_chunk_size
+        # with idempotent updates, a repeated /updateSim sequence number is answered with the reply already sent
+        self.idempotent_updates = idempotent_updates
+        self.last_request_seq = None
+        self.last_reply = None
+        self.update_lock = threading.Lock()
+        # with response compression, /updateSim replies of at least the threshold size are compressed
+        self.response_codec = None
+        self.response_threshold = 0
+        motors = _expand_names(json.loads(params['motors']))
+        sensor_entries = json.loads(params['sensors'])
+        sensors = _expand_names(sensor_entries)
+        self.motor_ids = {name: motor_id for motor_id, (name, _) in enumerate(motors)}
+        self.motor_is_multi = {
+            self.motor_ids[name]: entry.get('type') == 'MULTI'
+            for name, entry in motors}
+        self.sensor_ids = {name: sensor_id for sensor_id, (name, _) in enumerate(sensors)}
+        # with sensor fan-out (the name lists of the fan-out header), the value of each list's first name is replicated
+        # to its other names
+        self.sensor_copies = {}
+        if sensor_fan_out is not None:
+            for names in sensor_fan_out:
+                self.sensor_copies[self.sensor_ids[names[0]]] = [self.sensor_ids[name] for name in names[1:]]
+        copied_ids = set(copy_id for copy_ids in self.sensor_copies.values() for copy_id in copy_ids)
+        # the ids of the sensor values the client sends each tick
+        self.received_sensor_ids = sorted(sensor_id for sensor_id in self.sensor_ids.values() if sensor_id not in copied_ids)
+        self.sensor_values = {}
+        self.block_ids = {'block_' + str(block_id): block_id for block_id in range(NUM_STANDIN_BLOCKS)}
+        self.model_num_values = 0
+        # a model of the session's shape until one is uploaded
+        self.model_data = {
+            'weights': [np.zeros((len(self.sensor_ids), len(self.motor_ids)))],
+            'values': np.zeros(len(self.motor_ids))}
+
+    def motor_value(self, motor_id, tick=None):
+        """ deterministic motor output for a tick, the current tick by default """
+        value = math.sin(0.1 * (self.sim_t if tick is None else tick) + motor_id)
+        return [value] if self.motor_is_multi[motor_id] else value
+
+    def receive_sensor_values(self, sensor_values):
+        """ stores the sensor values of a tick, a dictionary of sensor ids to values, replicating fanned out sensors """
+        for sensor_id, copy_ids in self.sensor_copies.items():
+            if sensor_id in sensor_values:
+                for copy_id in copy_ids:
+                    sensor_values[copy_id] = sensor_values[sensor_id]
+        self.sensor_values = sensor_values
+
+    def debugging_data(self):
+        """ fake per-block debug statistics """
+        return {
+            'global_stability_rate': 0.5,
+            'global_energy_estimate': 1.0,
+            'block_stability_rates': {str(block_id): 0.5 for block_id in self.block_ids.values()},
+            'block_energy_estimates': {str(block_id): 1.0 for block_id in self.block_ids.values()},
+            'block_stable_times': {str(block_id): self.sim_t for block_id in self.block_ids.values()},
+        }
+
+
+class LocalThoughtForgeServer():
+    """ LocalThoughtForgeServer
+
+    Runs the stand-in server on a background thread. Can be used as a context manager.
+
+    :param host: Address to bind. Defaults to '127.0.0.1'
+    :type host: str
+    :param port: Port to bind. Defaults to 0, which picks a free port (see `self.port`)
+    :type port: int
+    :param latency: Artificial delay in seconds added to every request. Defaults to 0.
+    :type latency: float
+    :param sensor_fan_out: Whether the stand-in replicates fanned out sensor values (see 'fan_out' sensor entries)
+        when asked to. Defaults to `True`.
+    :type sensor_fan_out: bool
+    :param idempotent_updates: Whether the stand-in deduplicates numbered /updateSim requests when asked to.
+        Defaults to `True`.
+    :type idempotent_updates: bool
+    :param error_rate: Fraction of /updateSim requests answered with a 503 error, without updating the session.
+        Defaults to 0.
+    :type error_rate: float
+    :param stall_rate: Fraction of /updateSim requests whose reply is held back for `stall_time` seconds. Defaults to 0.
+    :type stall_rate: float
+    :param stall_time: Seconds a stalled reply is held back. Defaults to 1.
+    :type stall_time: float
+    :param drop_rate: Fraction of /updateSim requests whose connection is closed without a reply, after updating the
+        session. Defaults to 0.
+    :type drop_rate: float
+    :param seed: Seed of the fault injection. Defaults to 0.
+    :type seed: int
+    :param compression: Whether the stand-in accepts compressed request bodies and compresses /updateSim responses
+        when asked to, with the installed codecs of compression.py. Defaults to `True`.
+    :type compression: bool
+    """
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, sensor_fan_out=True, idempotent_updates=True,
+                 error_rate=0.0, stall_rate=0.0, stall_time=1.0, drop_rate=0.0, seed=0, compression=True):
+        self.latency = latency
+        self.compression = compression
+        self.sensor_fan_out = sensor_fan_out
+        self.idempotent_updates = idempotent_updates
+        self.error_rate = error_rate
+        self.stall_rate = stall_rate
+        self.stall_time = stall_time
+        self.drop_rate = drop_rate
+        self.sessions = {}
+        self.request_counts = {}
+        # injected faults by kind ('error', 'stall', 'drop'), and /updateSim requests answered from the replay cache
+        self.fault_counts = {'error': 0, 'stall': 0, 'drop': 0}
+        self.replayed_updates = 0
+        self.connection_count = 0
+        # request body bytes as received, i.e. compressed if the client compressed them, and response body bytes sent
+        self.bytes_received = 0
+        self.bytes_sent = 0
+        self._fault_rng = random.Random(seed)
+        # uploaded models by digest
+        self.models = {}
+        self._next_session_id = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+        server = self
+        class _Handler(_StandInRequestHandler):
+            standin = server
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self.host, self.port = self._httpd.server_address[:2]
+
+    def start(self):
+        """ starts serving on a background thread """
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """ stops the server and waits for the serving thread to exit """
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _count_request(self, path):
+        with self._lock:
+            self.request_counts[path] = self.request_counts.get(path, 0) + 1
+
+    def _draw_faults(self):
+        """ decides which faults to inject into an /updateSim request, returns (error, stall, drop) """
+        with self._lock:
+            faults = (self._fault_rng.random() < self.error_rate, self._fault_rng.random() < self.stall_rate,
+                self._fault_rng.random() < self.drop_rate)
+            for kind, injected in zip(['error', 'stall', 'drop'], faults):
+                if injected:
+                    self.fault_counts[kind] += 1
+        return faults
+
+    def _create_session(self, params, wire_format, action_chunk_size=1, sensor_fan_out=None, idempotent_updates=False):
+        with self._lock:
+            session_id = self._next_session_id
+            self._next_session_id += 1
+            session = _StandInSession(session_id, params, wire_format, action_chunk_size, sensor_fan_out, idempotent_updates)
+            self.sessions[session_id] = session
+        return session
+
+
+class LocalServerProcess():
+    """ LocalServerProcess
+
+    Runs the stand-in server in a separate process, so that it neither shares the GIL with nor shows
+    up in the memory measurements of the client being benchmarked. Can be used as a context manager.
+
+    :param latency: Artificial delay in seconds added to every request. Defaults to 0.
+    :type latency: float
+    :param sensor_fan_out: Whether the stand-in replicates fanned out sensor values. Defaults to `True`.
+    :type sensor_fan_out: bool
+    :param compression: Whether the stand-in supports compression. Defaults to `True`.
+    :type compression: bool
+    :param fault_args: Optional fault injection settings (error_rate, stall_rate, stall_time, drop_rate, seed), see
+        :class:`LocalThoughtForgeServer`
+    """
+    def __init__(self, latency=0.0, sensor_fan_out=True, compression=True, **fault_args):
+        self.latency = latency
+        self.sensor_fan_out = sensor_fan_out
+        self.compression = compression
+        self.fault_args = fault_args
+        self.host = '127.0.0.1'
+        self.port = None
+        self._process = None
+
+    def start(self, timeout=10.0):
+        """ starts the server process and waits until it accepts connections """
+        with socket.socket() as probe:
+            probe.bind((self.host, 0))
+            self.port = probe.getsockname()[1]
+        self._process = subprocess.Popen([sys.executable, '-m', 'benchmarks.local_server', '--host', self.host,
+            '--port', str(self.port), '--latency', str(self.latency)] + ([] if self.sensor_fan_out else ['--no-sensor-fan-out']) +
+            ([] if self.compression else ['--no-compression']) +
+            [argument for name, value in self.fault_args.items() for argument in ['--' + name.replace('_', '-'), str(value)]],
+            stdout=subprocess.DEVNULL)
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            try:
+                socket.create_connection((self.host, self.port), timeout=0.1).close()
+                return self
+            except OSError:
+                time.sleep(0.05)
+        self.stop()
+        raise RuntimeError("stand-in server did not start")
+
+    def stop(self):
+        """ terminates the server process """
+        if self._process is not None:
+            self._process.terminate()
+            self._process.wait()
+            self._process = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class _StandInRequestHandler(BaseHTTPRequestHandler):
+    """ HTTP/1.1 handler so that clients can keep connections alive between requests """
+    protocol_version = 'HTTP/1.1'
+    standin = None
+
+    def setup(self):
+        super().setup()
+        # headers and body are written separately, avoid delayed-ack stalls on kept-alive connections
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self.standin._lock:
+            self.standin.connection_count += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _parse_request(self):
+        # the client encodes arguments into the ';params' section of the url path
+        parsed_url = urlparse(self.path)
+        args = dict(parse_qsl(parsed_url.params))
+        args.update(parse_qsl(parsed_url.query))
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            body = self._read_chunked_body()
+        else:
+            content_length = int(self.headers.get('Content-Length', 0))
+            body = self.rfile.read(content_length) if content_length > 0 else b''
+        with self.standin._lock:
+            self.standin.bytes_received += len(body)
+        content_encoding = self.headers.get('Content-Encoding')
+        if content_encoding is not None and content_encoding in CODECS:
+            body = get_codec(content_encoding).decompress(body)
+        return parsed_url.path, args, body
+
+    def _read_chunked_body(self):
+        chunks = []
+        while True:
+            chunk_size = int(self.rfile.readline().split(b';')[0], 16)
+            if chunk_size == 0:
+                # skip trailers up to the final empty line
+                while self.rfile.readline() not in (b'\r\n', b'\n', b''):
+                    pass
+                return b''.join(chunks)
+            chunks.append(self.rfile.read(chunk_size))
+            self.rfile.readline()
+
+    def _send(self, status, body, content_type='application/json', headers=None):
+        if isinstance(body, str):
+            body = body.encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        with self.standin._lock:
+            self.standin.bytes_sent += len(body)
+
+    def _send_json(self, response_dict, status=200):
+        self._send(status, json.dumps(response_dict))
+
+    def do_GET(self):
+        path, args, _ = self._parse_request()
+        self.standin._count_request(path)
+        if self.standin.latency > 0:
+            time.sleep(self.standin.latency)
+        if path == '/getModel':
+            self._get_model(args)
+        else:
+            # accepts compressed request bodies in the client's codec, if it is installed
+            codec_name = self.headers.get(COMPRESSION_HEADER)
+            headers = {COMPRESSION_HEADER: codec_name} if self.standin.compression and codec_name in CODECS else None
+            self._send(200, 'ThoughtForge local stand-in server', content_type='text/plain', headers=headers)
+
+    def _get_model(self, args):
+        session = self._get_session(args)
+        if session is None:
+            self._send(404, 'unknown session', content_type='text/plain')
+            return
+        self._send(200, b''.join(iter_model_chunks(session.model_data)), content_type=MODEL_CONTENT_TYPE)
+
+    def do_POST(self):
+        path, args, body = self._parse_request()
+        self.standin._count_request(path)
+        if self.standin.latency > 0:
+            time.sleep(self.standin.latency)
+        if self.headers.get('x-thoughtforge-key') is None:
+            self._send(401, 'missing api key', content_type='text/plain')
+        elif path == '/initSession':
+            self._init_session(args, body)
+        elif path == '/updateSim':
+            self._update_sim(args, body)
+        elif path == '/shutdownSession':
+            self._shutdown_session(args)
+        else:
+            self._send(404, 'not found', content_type='text/plain')
+
+    def _get_session(self, args):
+        session_id = int(args.get('session_id', -1))
+        return self.standin.sessions.get(session_id)
+
+    def _init_session(self, args, body):
+        wire_format = self.headers.get(WIRE_FORMAT_HEADER, WIRE_FORMAT_JSON)
+        if wire_format not in [WIRE_FORMAT_BINARY, WIRE_FORMAT_BINARY32]:
+            wire_format = WIRE_FORMAT_JSON
+        model_digest = self.headers.get(MODEL_DIGEST_HEADER)
+        if model_digest is not None and len(body) == 0 and model_digest not in self.standin.models:
+            self._send_json({'model_required': True}, status=MODEL_REQUIRED_STATUS)
+            return
+        requested_action_chunk_size = self.headers.get(ACTION_CHUNK_HEADER)
+        action_chunk_size = 1
+        if requested_action_chunk_size is not None:
+            action_chunk_size = max(1, min(int(requested_action_chunk_size), MAX_STANDIN_ACTION_CHUNK_SIZE))
+        fan_out_header = self.headers.get(SENSOR_FAN_OUT_HEADER)
+        sensor_fan_out = json.loads(fan_out_header) if self.standin.sensor_fan_out and fan_out_header is not None else None
+        idempotent_updates = self.standin.idempotent_updates and self.headers.get(IDEMPOTENT_UPDATES_HEADER) is not None
+        session = self.standin._create_session(args, wire_format, action_chunk_size, sensor_fan_out, idempotent_updates)
+        codec_name = self.headers.get(COMPRESSION_HEADER)
+        if self.standin.compression and codec_name in CODECS and self.headers.get(COMPRESSION_THRESHOLD_HEADER) is not None:
+            session.response_codec = get_codec(codec_name)
+            session.response_threshold = int(self.headers.get(COMPRESSION_THRESHOLD_HEADER))
+        session_log = ['stand-in session ' + str(session.session_id) + ' created']
+        model_format = None
+        if model_digest is not None and len(body) == 0:
+            session.model_data = self.standin.models[model_digest]
+            session_log.append('stand-in session ' + str(session.session_id) + ' started from cached model ' + model_digest)
+        elif len(body) > 0:
+            if self.headers.get('Content-Type', '').startswith(MODEL_CONTENT_TYPE):
+                model_format = MODEL_UPLOAD_BINARY
+                session.model_data = read_model(body)
+            else:
+                model_data = json.loads(body)
+                session.model_data = {
+                    'weights': [np.asarray(weight_list) for weight_list in model_data['weights']],
+                    'values': np.asarray(model_data['values'])}
+            session.model_num_values = sum(weight_array.size for weight_array in session.model_data['weights']) + session.model_data['values'].size
+            session_log.append('stand-in session ' + str(session.session_id) + ' loaded model data with ' + str(session.model_num_values) + ' values')
+            if model_digest is not None:
+                with self.standin._lock:
+                    self.standin.models[model_digest] = session.model_data
+        response_dict = {
+            'session_id': session.session_id,
+            'motor_ids': json.dumps(session.motor_ids),
+            'sensor_ids': json.dumps(session.sensor_ids),
+            'block_ids': json.dumps(session.block_ids),
+            'session_log': json.dumps(session_log),
+            'wire_format': wire_format,
+        }
+        if model_format is not None:
+            # acknowledges a binary model upload, clients fall back to json without it
+            response_dict['model_format'] = model_format
+        if model_digest is not None:
+            response_dict['model_digest'] = model_digest
+        if requested_action_chunk_size is not None:
+            response_dict['action_chunk_size'] = action_chunk_size
+        if sensor_fan_out is not None:
+            response_dict['sensor_fan_out'] = True
+        if idempotent_updates:
+            response_dict['idempotent_updates'] = True
+        if session.response_codec is not None:
+            response_dict['compression'] = session.response_codec.name
+        self._send_json(response_dict)
+
+    def _update_sim(self, args, body):
+        session = self._get_session(args)
+        if session is None:
+            self._send(404, 'unknown session', content_type='text/plain')
+            return
+        error, stall, drop = self.standin._draw_faults()
+        if error:
+            self._send(503, 'injected fault', content_type='text/plain')
+            return
+        request_seq = args.get(REQUEST_SEQUENCE_ARG) if session.idempotent_updates else None
+        with session.update_lock:
+            if request_seq is not None and request_seq == session.last_request_seq:
+                reply = session.last_reply
+                with self.standin._lock:
+                    self.standin.replayed_updates += 1
+            else:
+                reply = self._compute_update(session, args, body)
+                if request_seq is not None:
+                    session.last_request_seq, session.last_reply = request_seq, reply
+        if drop:
+            self.close_connection = True
+            return
+        if stall:
+            time.sleep(self.standin.stall_time)
+        status, reply_body, content_type = reply
+        headers = None
+        if session.response_codec is not None and status == 200 and len(reply_body) >= session.response_threshold:
+            reply_body = session.response_codec.compress(reply_body.encode() if isinstance(reply_body, str) else reply_body)
+            headers = {RESPONSE_ENCODING_HEADER: session.response_codec.name}
+        try:
+            self._send(status, reply_body, content_type, headers)
+        except (BrokenPipeError, ConnectionResetError):
+            # the client gave up on the request, e.g. after a timeout
+            self.close_connection = True
+
+    def _compute_update(self, session, args, body):
+        """ updates the session with a request's sensor values, returns the reply as (status, body, content type) """
+        collect_debug_data = args.get('collect_debug_data') == 'True'
+        debugging_data = session.debugging_data() if collect_debug_data else {}
+        if 'action_chunk_size' in args:
+            return self._update_sim_action_chunk(session, args, body, debugging_data)
+        if self.headers.get('Content-Type', '').startswith(BINARY_CONTENT_TYPE):
+            sensor_values = decode_sensor_frame(body)
+            if len(sensor_values) != len(session.received_sensor_ids):
+                return 400, 'sensor frame size mismatch', 'text/plain'
+            session.receive_sensor_values(dict(zip(session.received_sensor_ids, sensor_values.tolist())))
+            dtype = '<f4' if session.wire_format == WIRE_FORMAT_BINARY32 else '<f8'
+            motor_values = [session.motor_value(motor_id) for motor_id in sorted(session.motor_ids.values())]
+            session.sim_t += 1
+            return 200, encode_motor_frame(motor_values, [], debugging_data, dtype), BINARY_CONTENT_TYPE
+        session.receive_sensor_values({int(sensor_id): value for sensor_id, value in json.loads(args.get('sensor_dict', '{}')).items()})
+        motor_ids_requested = json.loads(args.get('motor_ids_requested', '[]'))
+        motor_dict = {str(motor_id): session.motor_value(motor_id) for motor_id in motor_ids_requested}
+        session.sim_t += 1
+        return 200, json.dumps({
+            'motor_dict': motor_dict,
+            'session_log': json.dumps([]),
+            'debugging_data': json.dumps(debugging_data),
+        }), 'application/json'
+
+    def _update_sim_action_chunk(self, session, args, body, debugging_data):
+        """ takes the sensor values of every tick since the last request and returns the motor values of
+        the next ticks, as many as requested up to the session's negotiated chunk size """
+        num_steps = max(1, min(int(args['action_chunk_size']), session.action_chunk_size))
+        motor_ids = sorted(session.motor_ids.values())
+        motor_steps = [[session.motor_value(motor_id, session.sim_t + step) for motor_id in motor_ids] for step in range(num_steps)]
+        session.sim_t += num_steps
+        if self.headers.get('Content-Type', '').startswith(BINARY_CONTENT_TYPE):
+            sensor_values = decode_sensor_frame(body)
+            num_sensors = len(session.received_sensor_ids)
+            if num_sensors > 0 and len(sensor_values) % num_sensors != 0:
+                return 400, 'sensor frame size mismatch', 'text/plain'
+            if num_sensors > 0 and len(sensor_values) > 0:
+                session.receive_sensor_values(dict(zip(session.received_sensor_ids, sensor_values[-num_sensors:].tolist())))
+            dtype = '<f4' if session.wire_format == WIRE_FORMAT_BINARY32 else '<f8'
+            flat_motor_values = [value for motor_values in motor_steps for value in motor_values]
+            return 200, encode_motor_frame(flat_motor_values, [], debugging_data, dtype), BINARY_CONTENT_TYPE
+        sensor_dicts = json.loads(args.get('sensor_dicts', '[]'))
+        if len(sensor_dicts) > 0:
+            session.receive_sensor_values({int(sensor_id): value for sensor_id, value in sensor_dicts[-1].items()})
+        return 200, json.dumps({
+            'motor_dicts': [{str(motor_id): value for motor_id, value in zip(motor_ids, motor_values)} for motor_values in motor_steps],
+            'session_log': json.dumps([]),
+            'debugging_data': json.dumps(debugging_data),
+        }), 'application/json'
+
+    def _shutdown_session(self, args):
+        session = self._get_session(args)
+        if session is None:
+            self._send(404, 'unknown session', content_type='text/plain')
+            return
+        with self.standin._lock:
+            del self.standin.sessions[session.session_id]
+        self._send_json({'session_log': json.dumps(['stand-in session ' + str(session.session_id) + ' shut down'])})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Local stand-in ThoughtForge server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=4343)
+    parser.add_argument('--latency', type=float, default=0.0, help='artificial per-request latency in seconds')
+    parser.add_argument('--no-sensor-fan-out', action='store_true', help="don't replicate fanned out sensor values")
+    parser.add_argument('--no-idempotent-updates', action='store_true', help="don't deduplicate numbered /updateSim requests")
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of /updateSim requests answered with a 503 error')
+    parser.add_argument('--stall-rate', type=float, default=0.0, help='fraction of /updateSim replies held back for --stall-time')
+    parser.add_argument('--stall-time', type=float, default=1.0, help='seconds a stalled reply is held back')
+    parser.add_argument('--drop-rate', type=float, default=0.0, help='fraction of /updateSim connections closed without a reply')
+    parser.add_argument('--seed', type=int, default=0, help='fault injection seed')
+    parser.add_argument('--no-compression', action='store_true', help="don't accept or send compressed bodies")
+    cli_args = parser.parse_args()
+    server = LocalThoughtForgeServer(cli_args.host, cli_args.port, cli_args.latency, not cli_args.no_sensor_fan_out,
+        not cli_args.no_idempotent_updates, cli_args.error_rate, cli_args.stall_rate, cli_args.stall_time, cli_args.drop_rate, cli_args.seed,
+        not cli_args.no_compression)
+    print("Serving ThoughtForge stand-in on", cli_args.host + ':' + str(server.port))
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,248 @@
+import time, zlib
+
+from utils import safe_dict_get
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+CODEC_DEFLATE = 'deflate'
+CODEC_ZSTD = 'zstd'
+CODEC_AUTO = 'auto'
+PREFER_SPEED = 'speed'
+PREFER_RATIO = 'ratio'
+DEFAULT_THRESHOLD = 1024
+
+# header sent with the ping naming the codec the client compresses request bodies with, servers that accept request
+# bodies in that codec (sent with a standard Content-Encoding header) answer with the same header and codec. Sent again
+# to /initSession with COMPRESSION_THRESHOLD_HEADER to ask for /updateSim responses of at least that many bytes to be
+# compressed, which the server reports as 'compression' in the response.
+COMPRESSION_HEADER = 'x-thoughtforge-compression'
+COMPRESSION_THRESHOLD_HEADER = 'x-thoughtforge-compression-threshold'
+# marks a compressed response body. A header of its own rather than Content-Encoding, so that responses are
+# decompressed (and timed) by the session instead of the HTTP library.
+RESPONSE_ENCODING_HEADER = 'x-thoughtforge-content-encoding'
+
+
+class DeflateCodec():
+    """ DeflateCodec
+
+    zlib compression, always available. Level 1 is the fastest, 9 compresses the most (6 is zlib's default).
+
+    :param level: zlib compression level. Defaults to 1.
+    :type level: int
+    """
+    name = CODEC_DEFLATE
+    levels = {PREFER_SPEED: 1, PREFER_RATIO: 6}
+
+    def __init__(self, level=1):
+        self.level = level
+
+    def compress(self, data):
+        return zlib.compress(data, self.level)
+
+    def decompress(self, data):
+        return zlib.decompress(data)
+
+    def compress_chunks(self, chunks):
+        """ Compresses a stream of chunks incrementally
+
+        :return: a generator of compressed chunks
+        """
+        compressor = zlib.compressobj(self.level)
+        for chunk in chunks:
+            compressed = compressor.compress(chunk)
+            if compressed:
+                yield compressed
+        yield compressor.flush()
+
+
+class ZstdCodec():
+    """ ZstdCodec
+
+    Zstandard compression, available when the zstandard package is installed (pip install zstandard). Faster than
+    deflate at a similar ratio at level 1-3, and compresses more at higher levels (up to 22).
+
+    :param level: zstd compression level. Defaults to 3.
+    :type level: int
+    """
+    name = CODEC_ZSTD
+    levels = {PREFER_SPEED: 1, PREFER_RATIO: 15}
+
+    def __init__(self, level=3):
+        self.level = level
+        self._compressor = zstandard.ZstdCompressor(level=level)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def decompress(self, data):
+        # streamed frames don't record their size, a decompression object reads both kinds
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+
+    def compress_chunks(self, chunks):
+        """ Compresses a stream of chunks incrementally
+
+        :return: a generator of compressed chunks
+        """
+        compressor = self._compressor.compressobj()
+        for chunk in chunks:
+            compressed = compressor.compress(chunk)
+            if compressed:
+                yield compressed
+        yield compressor.flush()
+
+
+CODECS = {CODEC_DEFLATE: DeflateCodec}
+if zstandard is not None:
+    CODECS[CODEC_ZSTD] = ZstdCodec
+
+
+def get_codec(name=CODEC_AUTO, level=None, prefer=PREFER_SPEED):
+    """ Returns a compression codec. 'auto' picks the best installed codec (zstd if available, else deflate).
+
+    :param name: 'auto', 'deflate' or 'zstd'
+    :type name: str
+    :param level: Compression level. Defaults to the codec's level for `prefer`.
+    :type level: int
+    :param prefer: 'speed' or 'ratio', picks the level if `level` isn't given. Defaults to 'speed'.
+    :type prefer: str
+    :rtype: DeflateCodec
+    """
+    if name == CODEC_AUTO:
+        name = CODEC_ZSTD if CODEC_ZSTD in CODECS else CODEC_DEFLATE
+    if name not in CODECS:
+        raise ValueError("Compression codec " + str(name) + " is not installed")
+    codec_class = CODECS[name]
+    if level is None:
+        if prefer not in codec_class.levels:
+            raise ValueError("Unsupported compression preference " + str(prefer))
+        level = codec_class.levels[prefer]
+    return codec_class(level)
+
+
+class CompressionPolicy():
+    """ CompressionPolicy
+
+    Compresses a session's large request bodies and asks the server to compress large responses, configured from the
+    optional 'compression' entry of the client .params file, e.g. `{"codec": "auto", "prefer": "speed", "threshold": 1024}`.
+
+    Only bodies of at least `threshold` bytes are compressed, so the small per-tick messages of most sessions are sent
+    as they are, while model uploads to /initSession, large binary /updateSim requests (e.g. action chunks of many
+    sensors) and /updateSim responses carrying debug data are compressed. Request compression is negotiated with the
+    server's ping and response compression when the session is initialized (see :data:`COMPRESSION_HEADER`), servers
+    without support exchange uncompressed bodies.
+
+    `counters` holds the number of compressed request and response bodies, their sizes before ('*_bytes') and after
+    ('*_wire_bytes') compression, and the seconds spent compressing and decompressing.
+
+    :param codec: 'auto', 'deflate' or 'zstd'. Defaults to 'auto'.
+    :type codec: str
+    :param level: Compression level. Defaults to the codec's level for `prefer`.
+    :type level: int
+    :param prefer: 'speed' or 'ratio'. Defaults to 'speed'.
+    :type prefer: str
+    :param threshold: Smallest body in bytes that is compressed. Defaults to 1024.
+    :type threshold: int
+    """
+    def __init__(self, codec=CODEC_AUTO, level=None, prefer=PREFER_SPEED, threshold=DEFAULT_THRESHOLD):
+        assert(threshold >= 0)
+        self.codec = get_codec(codec, level, prefer)
+        self.threshold = threshold
+        # set from the server's replies: whether it accepts compressed requests, and compresses its responses
+        self.requests_accepted = False
+        self.responses_accepted = False
+        self.counters = {
+            'requests_compressed': 0, 'request_bytes': 0, 'request_wire_bytes': 0, 'compress_time': 0.0,
+            'responses_compressed': 0, 'response_bytes': 0, 'response_wire_bytes': 0, 'decompress_time': 0.0}
+
+    def compresses(self, size):
+        """ whether a request body of `size` bytes is compressed """
+        return self.requests_accepted and size >= self.threshold
+
+    def compress_body(self, body, headers):
+        """ Compresses a request body if the server accepts compressed requests and the body is large enough
+
+        :param body: The request body, or `None`
+        :type body: bytes
+        :param headers: The request headers, or `None`. Not modified.
+        :type headers: dict
+        :return: (request body, request headers)
+        :rtype: tuple
+        """
+        if body is None or not self.compresses(len(body)):
+            return body, headers
+        if isinstance(body, str):
+            body = body.encode()
+        start = time.perf_counter()
+        compressed = self.codec.compress(body)
+        counters = self.counters
+        counters['compress_time'] += time.perf_counter() - start
+        counters['requests_compressed'] += 1
+        counters['request_bytes'] += len(body)
+        counters['request_wire_bytes'] += len(compressed)
+        headers = dict(headers) if headers is not None else {}
+        headers['Content-Encoding'] = self.codec.name
+        return compressed, headers
+
+    def count_chunks(self, chunks, size):
+        """ Counts the bytes and time of a streamed request body of `size` bytes compressed with the policy's codec
+
+        :return: a generator of the chunks
+        """
+        counters = self.counters
+        counters['requests_compressed'] += 1
+        counters['request_bytes'] += size
+        chunks = iter(chunks)
+        while True:
+            start = time.perf_counter()
+            chunk = next(chunks, None)
+            counters['compress_time'] += time.perf_counter() - start
+            if chunk is None:
+                return
+            counters['request_wire_bytes'] += len(chunk)
+            yield chunk
+
+    def decompress_response(self, response):
+        """ Decompresses the body of a response that the server compressed, in place """
+        if response.headers.get(RESPONSE_ENCODING_HEADER) != self.codec.name:
+            return
+        compressed = response.content
+        start = time.perf_counter()
+        # requests reads the body into `_content` once, replacing it is how its content is rewritten
+        response._content = self.codec.decompress(compressed)
+        counters = self.counters
+        counters['decompress_time'] += time.perf_counter() - start
+        counters['responses_compressed'] += 1
+        counters['response_bytes'] += len(response._content)
+        counters['response_wire_bytes'] += len(compressed)
+
+    def print_summary(self):
+        """ Prints the bytes saved by compression and the time it took """
+        counters = self.counters
+        def _savings(num_bodies, raw_bytes, wire_bytes):
+            saved = 100.0 * (1.0 - wire_bytes / raw_bytes) if raw_bytes > 0 else 0.0
+            return [num_bodies, "bodies,", raw_bytes, "->", wire_bytes, "bytes (" + str(round(saved, 1)) + "% saved)"]
+        print("Compression (" + self.codec.name + ", level " + str(self.codec.level) + ", threshold " + str(self.threshold) + " bytes):")
+        print("- requests:", *_savings(counters['requests_compressed'], counters['request_bytes'], counters['request_wire_bytes']),
+            "\tcompress time:", round(counters['compress_time'] * 1e3, 3), "ms" + ("" if self.requests_accepted else "\t(not accepted by the server)"))
+        print("- responses:", *_savings(counters['responses_compressed'], counters['response_bytes'], counters['response_wire_bytes']),
+            "\tdecompress time:", round(counters['decompress_time'] * 1e3, 3), "ms" + ("" if self.responses_accepted else "\t(not accepted by the server)"))
+
+
+def create_compression_policy(compression_params):
+    """ Creates the compression policy from the optional 'compression' entry of a client .params file, e.g.
+    `{"codec": "zstd", "level": 3, "threshold": 1024}` or `{"codec": "auto", "prefer": "ratio"}`
+
+    :return: A compression policy, or `None` if the session doesn't compress
+    :rtype: CompressionPolicy
+    """
+    if compression_params is None:
+        return None
+    return CompressionPolicy(
+        codec=safe_dict_get(compression_params, 'codec', CODEC_AUTO),
+        level=safe_dict_get(compression_params, 'level', None),
+        prefer=safe_dict_get(compression_params, 'prefer', PREFER_SPEED),
+        threshold=safe_dict_get(compression_params, 'threshold', DEFAULT_THRESHOLD))
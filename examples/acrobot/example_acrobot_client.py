@@ -1,10 +1,11 @@
 import os, gym
 import numpy as np
 
+from rendering import GymRenderMixin
 from thoughtforge_client import BaseThoughtForgeClientSession
 
 
-class ExampleAcrobotSession(BaseThoughtForgeClientSession):
+class ExampleAcrobotSession(GymRenderMixin, BaseThoughtForgeClientSession):
 
     def _reset_env(self):
         """ local helper function specific for openAI gym environments """
@@ -27,9 +28,6 @@ class ExampleAcrobotSession(BaseThoughtForgeClientSession):
         
     def update(self, motor_dict):
         """ advance the environment sim """
-        # render the environment locally
-        self.env.render()
-
         # extract actions sent from server
         motor1_value = motor_dict['motor1']
         motor2_value = motor_dict['motor2']
@@ -0,0 +1,21 @@
+import asyncio
+
+from thoughtforge_async import AsyncThoughtForgeClientSession
+from examples.cartpole.example_cartpole_client import ExampleCartpoleSession
+
+
+NUM_SESSIONS = 4
+
+
+class AsyncCartpoleSession(AsyncThoughtForgeClientSession, ExampleCartpoleSession):
+    """ runs the unmodified cartpole session on an asyncio event loop """
+    pass
+
+
+async def run_sessions():
+    sessions = [AsyncCartpoleSession('./examples/cartpole/advanced_cartpole.params') for _ in range(NUM_SESSIONS)]
+    await asyncio.gather(*[session.run() for session in sessions])
+
+
+if __name__ == "__main__": 
+    asyncio.run(run_sessions())
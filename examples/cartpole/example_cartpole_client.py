@@ -1,5 +1,6 @@
 import gym, os
 
+from rendering import GymRenderMixin
 from thoughtforge_client import BaseThoughtForgeClientSession
 
 
@@ -11,7 +12,7 @@ gym.register(
     reward_threshold=195.0,
 )
 
-class ExampleCartpoleSession(BaseThoughtForgeClientSession):
+class ExampleCartpoleSession(GymRenderMixin, BaseThoughtForgeClientSession):
 
     def _reset_env(self):
         """ local helper function specific for openAI gym environments """
@@ -22,6 +23,7 @@ class ExampleCartpoleSession(BaseThoughtForgeClientSession):
         """ On sim start, initialize environment """   
         print("Initializing Cartpole...", end='')
         self.env = gym.make('long-CartPole-v0')
+        self.episode_scores = []
         if self.env is not None:
             self._reset_env()
         print("Complete.")
@@ -34,9 +36,6 @@ class ExampleCartpoleSession(BaseThoughtForgeClientSession):
         
     def update(self, motor_dict):
         """ advance the environment sim """
-        # render the environment locally
-        self.env.render()
-
         # extract action sent from server
         motor_value = motor_dict['motor']
         cartpole_action = 1 if motor_value >= 0.0 else 0
@@ -47,19 +46,24 @@ class ExampleCartpoleSession(BaseThoughtForgeClientSession):
         self.score += reward
         if terminal:
             print("End of episode. Score =", self.score)
+            self.episode_scores.append(self.score)
             self._reset_env()
  
         # send updated environment data to server
         sensor_values = {
             'pos_sensor': self.last_observation[0],
             'vel_sensor': self.last_observation[1],
-            'angle_sensor1': self.last_observation[2],
-            'angle_sensor2': self.last_observation[2],
-            'angle_vel_sensor1': self.last_observation[3],
-            'angle_vel_sensor2': self.last_observation[3],
+            'angle_sensor': self.last_observation[2],
+            'angle_vel_sensor': self.last_observation[3],
         }
         return sensor_values
 
+    def get_score(self):
+        """ mean score of the completed episodes, or the score of the current one """
+        if len(self.episode_scores) == 0:
+            return self.score
+        return sum(self.episode_scores) / len(self.episode_scores)
+
 
 if __name__ == "__main__": 
     # the basic example doesn't have the best performance, but is simple to follow:
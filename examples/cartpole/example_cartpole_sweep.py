@@ -0,0 +1,14 @@
+from parameter_sweep import ParameterSweep
+from examples.cartpole.example_cartpole_client import ExampleCartpoleSession
+
+
+if __name__ == "__main__":
+    # runs every combination as a 5000 tick session, one per core, and ranks them by mean episode score
+    sweep = ParameterSweep(ExampleCartpoleSession, './examples/cartpole/example_cartpole.params', {
+            'internal_timescale': [50, 100, 200],
+            'ticks_per_sensor_sample': [10, 30],
+            'center_block_size_extra': [0, 3],
+            'sensors.pos_sensor.sensor_range': [[-1.0, 1.0], [-2.4, 2.4]],
+        }, max_ticks=5000, overrides={'render': {'mode': 'off'}})
+    sweep.run()
+    sweep.save_results('./cartpole_sweep.json')
@@ -0,0 +1,10 @@
+from vector_runner import VectorizedSessionRunner
+from examples.cartpole.example_cartpole_client import ExampleCartpoleSession
+
+
+NUM_SESSIONS = 8
+
+
+if __name__ == "__main__": 
+    runner = VectorizedSessionRunner(ExampleCartpoleSession, NUM_SESSIONS, './examples/cartpole/advanced_cartpole.params')
+    runner.run()
@@ -1,12 +1,13 @@
 import gym, math , os
 
+from rendering import GymRenderMixin
 from thoughtforge_client import BaseThoughtForgeClientSession
 
 
 EPSILON = 0.000001
 
 
-class ExampleMountainCarSession(BaseThoughtForgeClientSession):
+class ExampleMountainCarSession(GymRenderMixin, BaseThoughtForgeClientSession):
 
     def _reset_env(self):
         """ local helper function specific for openAI gym environments """
@@ -29,9 +30,6 @@ class ExampleMountainCarSession(BaseThoughtForgeClientSession):
         
     def update(self, motor_dict):
         """ advance the environment sim """
-        # render the environment locally
-        self.env.render()
-
         # extract action sent from server
         motor_value = motor_dict['force_motor']        
         
@@ -48,11 +46,8 @@ class ExampleMountainCarSession(BaseThoughtForgeClientSession):
         height = math.sin(3 * self.last_observation[0]) - 1
         height_vel = height / (self.last_observation[1] + EPSILON)
         sensor_values = {
-            'pos_sensor1': x_position,
-            'pos_sensor2': x_position,
-            'height_vel_sensor1': height_vel,
-            'height_vel_sensor2': height_vel,
-            'height_vel_sensor3': height_vel,
+            'pos_sensor': x_position,
+            'height_vel_sensor': height_vel,
         }
         return sensor_values
 
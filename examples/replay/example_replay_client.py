@@ -0,0 +1,12 @@
+import sys
+
+from replay import ReplaySession
+
+
+if __name__ == "__main__": 
+    # record a session first by adding "trace": {"directory": "./traces"} to its client .params file, then replay it with
+    # python -m examples.replay.example_replay_client ./examples/cartpole/example_cartpole.params ./traces/session_0 [fast|recorded]
+    params_file = sys.argv[1]
+    recording_directory = sys.argv[2]
+    timing = sys.argv[3] if len(sys.argv) > 3 else 'fast'
+    session = ReplaySession(params_file, recording=recording_directory, timing=timing)
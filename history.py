@@ -0,0 +1,332 @@
+import numpy as np
+
+from utils import safe_dict_get
+
+
+DEFAULT_INITIAL_CAPACITY = 1024
+
+
+class _RowBuffer():
+    """ column-major rows of floats that either grow as needed or keep the last `max_length` rows """
+    def __init__(self, max_length=None, initial_capacity=DEFAULT_INITIAL_CAPACITY):
+        assert(max_length is None or max_length > 0)
+        self.max_length = max_length
+        self._initial_capacity = initial_capacity
+        self._data = None
+        self.row = None
+        self._length = 0
+        self._write_position = 0
+
+    def allocate(self, num_columns):
+        # a ring buffer writes every row twice, max_length apart, so the last max_length rows are
+        # always a contiguous slice
+        capacity = 2 * self.max_length if self.max_length is not None else self._initial_capacity
+        self._data = np.full((capacity, num_columns), np.nan, order='F')
+        self.row = np.full(num_columns, np.nan)
+
+    def commit(self):
+        """ stores the contents of `row` as the next row """
+        if self.max_length is None:
+            if self._length == self._data.shape[0]:
+                grown = np.full((2 * self._data.shape[0], self._data.shape[1]), np.nan, order='F')
+                grown[:self._length] = self._data
+                self._data = grown
+            self._data[self._length] = self.row
+            self._length += 1
+        else:
+            self._data[self._write_position] = self.row
+            self._data[self._write_position + self.max_length] = self.row
+            self._write_position = (self._write_position + 1) % self.max_length
+            self._length = min(self._length + 1, self.max_length)
+
+    def rows(self):
+        """ the stored rows in chronological order, as a view """
+        if self._data is None:
+            return np.empty((0, 1))
+        if self.max_length is not None and self._length == self.max_length:
+            return self._data[self._write_position:self._write_position + self.max_length]
+        return self._data[:self._length]
+
+    def __len__(self):
+        return self._length
+
+
+class HistoryStore():
+    """ HistoryStore
+
+    Columnar per-tick history of named values (e.g. sensor or motor values). Values are kept in a
+    column-major NumPy array with one column per name, ordered by the ids of the name map passed in,
+    so the history of a single name is a contiguous array that can be viewed without copying.
+
+    Retention is configurable: with `max_length` unset the store grows as needed and keeps everything,
+    otherwise it is a ring buffer holding the last `max_length` recorded ticks. With `interval` K only
+    every Kth tick is recorded. Both can be combined.
+
+    Names whose first recorded value is a list (MULTI motors) get one column per list element and
+    their history is 2D (ticks x elements).
+
+    For compatibility with the former list-of-dicts history, `len(store)`, `store[i]` and iteration
+    return per-tick dictionaries of name to value, built on demand.
+
+    :param name_id_map: A dictionary of names to ids, e.g. the session's `sensor_name_map`
+    :type name_id_map: dict
+    :param max_length: Number of recorded ticks to keep. Defaults to `None` (keep everything).
+    :type max_length: int
+    :param interval: Record every `interval`-th tick. Defaults to 1.
+    :type interval: int
+    :param initial_capacity: Initial number of rows allocated when growing. Defaults to 1024.
+    :type initial_capacity: int
+    """
+    def __init__(self, name_id_map, max_length=None, interval=1, initial_capacity=DEFAULT_INITIAL_CAPACITY):
+        assert(max_length is None or max_length > 0)
+        assert(interval >= 1)
+        self.names = sorted(name_id_map.keys(), key=lambda name: name_id_map[name])
+        self.max_length = max_length
+        self.interval = interval
+        self._columns = None
+        self._is_list = None
+        self._buffer = _RowBuffer(max_length, initial_capacity)
+        self._ticks_seen = 0
+
+    def _allocate(self, named_values):
+        """ lays out the columns from the first recorded values """
+        # column 0 holds the tick at which each row was recorded
+        self._columns = {}
+        self._is_list = {}
+        next_column = 1
+        for name in self.names:
+            value = safe_dict_get(named_values, name, 0.0)
+            is_list = isinstance(value, (list, tuple, np.ndarray))
+            width = len(value) if is_list else 1
+            self._columns[name] = slice(next_column, next_column + width)
+            self._is_list[name] = is_list
+            next_column += width
+        self._buffer.allocate(next_column)
+
+    def append(self, named_values):
+        """ Records the values of one tick
+
+        :param named_values: A dictionary of names to values
+        :type named_values: dict
+        """
+        tick = self._ticks_seen
+        self._ticks_seen += 1
+        if tick % self.interval != 0:
+            return
+        if self._columns is None:
+            self._allocate(named_values)
+        row = self._buffer.row
+        row.fill(np.nan)
+        row[0] = tick
+        for name, value in named_values.items():
+            column = self._columns.get(name)
+            if column is not None:
+                row[column] = value
+        self._buffer.commit()
+
+    def append_array(self, values, layout):
+        """ Records the values of one tick from an array
+
+        :param values: The values laid out by `layout`
+        :type values: np.ndarray
+        :param layout: The layout of the store's names, see :class:`array_layout.ArrayLayout`
+        :type layout: array_layout.ArrayLayout
+        """
+        tick = self._ticks_seen
+        self._ticks_seen += 1
+        if tick % self.interval != 0:
+            return
+        if self._columns is None:
+            self._allocate(layout.template())
+        row = self._buffer.row
+        row[0] = tick
+        row[1:] = values
+        self._buffer.commit()
+
+    def _rows(self):
+        """ the recorded rows in chronological order, as a view """
+        return self._buffer.rows()
+
+    def get_history(self, name):
+        """ Returns the recorded values of a name as a read-only view, without copying
+
+        :param name: A sensor or motor name
+        :type name: str
+        :return: A 1D array of values, 2D (ticks x elements) for list values, or `None` for unknown names
+        :rtype: np.ndarray
+        """
+        if self._columns is None or name not in self._columns:
+            return None
+        column = self._columns[name]
+        rows = self._rows()
+        view = rows[:, column] if self._is_list[name] else rows[:, column.start]
+        view.flags.writeable = False
+        return view
+
+    def get_ticks(self):
+        """ Returns the sim ticks at which the stored rows were recorded
+
+        :rtype: np.ndarray
+        """
+        return self._rows()[:, 0].astype(np.int64)
+
+    def _row_to_dict(self, row):
+        return {
+            name: (row[column].tolist() if self._is_list[name] else float(row[column.start]))
+            for name, column in self._columns.items()}
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def __getitem__(self, index):
+        return self._row_to_dict(self._rows()[index])
+
+    def __iter__(self):
+        for row in self._rows():
+            yield self._row_to_dict(row)
+
+
+DEBUG_GLOBAL_KEYS = ['global_stability_rate', 'global_energy_estimate']
+DEBUG_BLOCK_KEYS = ['block_stability_rates', 'block_energy_estimates', 'block_stable_times']
+
+
+class DebugDataStore():
+    """ DebugDataStore
+
+    Columnar history of the debug data received from the server. Each sample is stored as one row
+    holding the tick, the global stability rate and energy estimate, and the per-block stability
+    rates, energy estimates and stable times as arrays indexed by block id. Samples are written
+    straight from the server's id-keyed dictionaries, so no name-keyed dictionaries are built while
+    the sim runs.
+
+    Use `get_global_history(key)` and `get_block_history(key)` for zero-copy views. For compatibility,
+    `len(store)`, `store[i]` and iteration return the named debug data dictionaries passed to
+    `debug_data_received_notification()`, built on demand.
+
+    :param block_name_map: A dictionary of block names to block ids, i.e. the session's `block_name_map`
+    :type block_name_map: dict
+    :param max_length: Number of samples to keep. Defaults to `None` (keep everything).
+    :type max_length: int
+    :param initial_capacity: Initial number of rows allocated when growing. Defaults to 1024.
+    :type initial_capacity: int
+    """
+    def __init__(self, block_name_map, max_length=None, initial_capacity=DEFAULT_INITIAL_CAPACITY):
+        self.block_name_map = dict(block_name_map)
+        self.num_blocks = max(self.block_name_map.values()) + 1 if len(self.block_name_map) > 0 else 0
+        self.max_length = max_length
+        # row layout: tick, global values, then one run of num_blocks columns per block key
+        self._global_columns = {key: 1 + index for index, key in enumerate(DEBUG_GLOBAL_KEYS)}
+        first_block_column = 1 + len(DEBUG_GLOBAL_KEYS)
+        self._block_columns = {
+            key: slice(first_block_column + index * self.num_blocks, first_block_column + (index + 1) * self.num_blocks)
+            for index, key in enumerate(DEBUG_BLOCK_KEYS)}
+        self._buffer = _RowBuffer(max_length, initial_capacity)
+        self._buffer.allocate(first_block_column + len(DEBUG_BLOCK_KEYS) * self.num_blocks)
+        self._cached_keys = None
+        self._cached_block_ids = None
+
+    def get_column_names(self):
+        """ Returns a flat name for every column after the tick, e.g. 'global_stability_rate' or
+        'block_stability_rates/<block name>'. Block ids without a name are named by their id.
+
+        :rtype: list
+        """
+        block_names = [str(block_id) for block_id in range(self.num_blocks)]
+        for name, block_id in self.block_name_map.items():
+            block_names[block_id] = name
+        return list(DEBUG_GLOBAL_KEYS) + [key + '/' + block_name for key in DEBUG_BLOCK_KEYS for block_name in block_names]
+
+    def _block_ids(self, values_by_id):
+        """ the block ids of an id-keyed dictionary, cached since the server sends the same keys every sample """
+        keys = list(values_by_id)
+        if keys != self._cached_keys:
+            self._cached_keys = keys
+            self._cached_block_ids = np.array([int(key) for key in keys], dtype=np.intp)
+        return self._cached_block_ids
+
+    def append(self, tick, debugging_data):
+        """ Records one sample of debug data as received from the server
+
+        :param tick: The sim tick the sample belongs to
+        :type tick: int
+        :param debugging_data: The server's debugging data, with per-block values keyed by block id
+        :type debugging_data: dict
+        :return: The recorded row (tick followed by the columns named by `get_column_names()`). Only
+            valid until the next call.
+        :rtype: np.ndarray
+        """
+        row = self._buffer.row
+        row.fill(np.nan)
+        row[0] = tick
+        for key, column in self._global_columns.items():
+            row[column] = debugging_data[key]
+        for key, columns in self._block_columns.items():
+            values_by_id = debugging_data[key]
+            block_ids = self._block_ids(values_by_id)
+            row[columns][block_ids] = np.fromiter(values_by_id.values(), dtype=np.float64, count=len(block_ids))
+        self._buffer.commit()
+        return row
+
+    def get_ticks(self):
+        """ Returns the sim ticks at which the stored samples were received
+
+        :rtype: np.ndarray
+        """
+        return self._buffer.rows()[:, 0].astype(np.int64)
+
+    def get_global_history(self, key):
+        """ Returns the history of a global debug value as a read-only view, without copying
+
+        :param key: 'global_stability_rate' or 'global_energy_estimate'
+        :type key: str
+        :rtype: np.ndarray
+        """
+        view = self._buffer.rows()[:, self._global_columns[key]]
+        view.flags.writeable = False
+        return view
+
+    def get_block_history(self, key):
+        """ Returns the history of a per-block debug value as a read-only (samples x block ids) view, without copying
+
+        :param key: 'block_stability_rates', 'block_energy_estimates' or 'block_stable_times'
+        :type key: str
+        :rtype: np.ndarray
+        """
+        view = self._buffer.rows()[:, self._block_columns[key]]
+        view.flags.writeable = False
+        return view
+
+    def _row_to_dict(self, row):
+        debug_data_dict = {key: float(row[column]) for key, column in self._global_columns.items()}
+        for key, columns in self._block_columns.items():
+            block_values = row[columns]
+            debug_data_dict[key] = {name: float(block_values[block_id]) for name, block_id in self.block_name_map.items()}
+        return debug_data_dict
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def __getitem__(self, index):
+        return self._row_to_dict(self._buffer.rows()[index])
+
+    def __iter__(self):
+        for row in self._buffer.rows():
+            yield self._row_to_dict(row)
+
+
+def create_history_stores(history_params, sensor_name_map, motor_name_map, block_name_map=None):
+    """ Creates the sensor, motor and debug data histories from the optional 'history' entry of a
+    client .params file, e.g. `{"max_length": 100000, "interval": 10}`. Sessions without a 'history'
+    entry keep the full history. The interval applies to sensor and motor values only, since debug
+    data is sampled separately (see 'debug_sample_interval').
+
+    :return: (sensor history, motor history, debug data history)
+    :rtype: tuple
+    """
+    history_params = history_params if history_params is not None else {}
+    max_length = safe_dict_get(history_params, 'max_length', None)
+    interval = safe_dict_get(history_params, 'interval', 1)
+    return (
+        HistoryStore(sensor_name_map, max_length, interval),
+        HistoryStore(motor_name_map, max_length, interval),
+        DebugDataStore(block_name_map if block_name_map is not None else {}, max_length))
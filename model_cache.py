@@ -0,0 +1,134 @@
+import hashlib, os, threading, weakref
+
+from model_format import compress_chunks, get_model_arrays, iter_model_chunks, COMPRESSION_NONE, DEFAULT_CHUNK_SIZE
+from utils import safe_dict_get
+
+
+# header carrying the model digest on /initSession. A server that has a model with this digest starts
+# the session from it and echoes the digest back as 'model_digest', otherwise it answers 412 and the
+# client uploads the model body along with the digest.
+MODEL_DIGEST_HEADER = 'x-thoughtforge-model-digest'
+# key of the transport's server capabilities, `False` once a server has ignored a digest
+MODEL_DIGEST_CAPABILITY = 'model_digest'
+MODEL_REQUIRED_STATUS = 412
+DIGEST_ALGORITHM = 'sha256'
+
+# digests of model data seen in this process, keyed by the ids of the model arrays
+_model_digests = {}
+_model_digests_lock = threading.Lock()
+
+
+def get_model_digest(model_data):
+    """ Returns the content digest of model data: the sha256 of its binary model format encoding, so
+    identical weights and values have the same digest however they were loaded. The digest is computed
+    once per set of arrays in this process, assuming model arrays aren't modified in place.
+
+    :param model_data: A dictionary with a list of 'weights' arrays and a 'values' array
+    :type model_data: dict
+    :return: The digest, e.g. 'sha256:<hex>'
+    :rtype: str
+    """
+    arrays = [array for _, array in get_model_arrays(model_data)]
+    digest_key = tuple(id(array) for array in arrays)
+    with _model_digests_lock:
+        cached = _model_digests.get(digest_key)
+    # the weak references make sure the ids still belong to the same arrays
+    if cached is not None and all(array_ref() is array for array_ref, array in zip(cached[0], arrays)):
+        return cached[1]
+    hasher = hashlib.new(DIGEST_ALGORITHM)
+    for chunk in iter_model_chunks(model_data):
+        hasher.update(chunk)
+    digest = DIGEST_ALGORITHM + ':' + hasher.hexdigest()
+    try:
+        array_refs = [weakref.ref(array) for array in arrays]
+    except TypeError:
+        # plain lists can't be tracked, their digest is recomputed next time
+        return digest
+    with _model_digests_lock:
+        for stale_key in [key for key, (refs, _) in _model_digests.items() if any(array_ref() is None for array_ref in refs)]:
+            del _model_digests[stale_key]
+        _model_digests[digest_key] = (array_refs, digest)
+    return digest
+
+
+class ModelPayloadCache():
+    """ ModelPayloadCache
+
+    A local content-addressed cache of encoded model upload payloads. Payloads are stored by model
+    digest and compression, so uploading a model again (e.g. to a server that was restarted) streams
+    the stored payload from disk instead of re-encoding and re-compressing the model. A payload is
+    written to the cache while it is first uploaded.
+
+    :param directory: Cache directory. Created if needed.
+    :type directory: str
+    :param max_size: Optional limit on the total size of cached payloads in bytes. The least recently
+        used payloads are removed once it is exceeded. Defaults to `None` (no limit).
+    :type max_size: int
+    """
+    def __init__(self, directory, max_size=None):
+        self.directory = os.path.expanduser(directory)
+        self.max_size = max_size
+        os.makedirs(self.directory, exist_ok=True)
+
+    def get_path(self, digest, compression=COMPRESSION_NONE):
+        """ Returns the cache file path of a payload
+
+        :rtype: str
+        """
+        file_name = digest.replace(':', '_') + '.tfmodel'
+        if compression != COMPRESSION_NONE:
+            file_name += '.' + compression
+        return os.path.join(self.directory, file_name)
+
+    def iter_payload(self, digest, model_data, compression=COMPRESSION_NONE, compression_level=1, chunk_size=DEFAULT_CHUNK_SIZE):
+        """ Yields the encoded upload payload of a model, from the cache if present. Otherwise the model
+        is encoded and the payload is stored in the cache as it is yielded.
+
+        :return: a generator of bytes-like chunks
+        """
+        path = self.get_path(digest, compression)
+        if os.path.exists(path):
+            # mark as recently used
+            os.utime(path)
+            with open(path, 'rb') as payload_file:
+                while True:
+                    chunk = payload_file.read(chunk_size)
+                    if not chunk:
+                        return
+                    yield chunk
+        temp_path = path + '.' + str(os.getpid()) + '.' + str(threading.get_ident()) + '.tmp'
+        try:
+            with open(temp_path, 'wb') as payload_file:
+                for chunk in compress_chunks(iter_model_chunks(model_data, chunk_size), compression, compression_level):
+                    payload_file.write(chunk)
+                    yield chunk
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        self._evict()
+
+    def _evict(self):
+        """ removes the least recently used payloads beyond `max_size` """
+        if self.max_size is None:
+            return
+        payload_paths = [os.path.join(self.directory, file_name) for file_name in os.listdir(self.directory)
+            if not file_name.endswith('.tmp')]
+        payload_paths.sort(key=os.path.getmtime, reverse=True)
+        total_size = 0
+        for path in payload_paths:
+            total_size += os.path.getsize(path)
+            if total_size > self.max_size:
+                os.remove(path)
+
+
+def create_model_payload_cache(cache_params):
+    """ Creates the payload cache from the optional 'model_cache' entry of a client .params file, e.g.
+    `{"directory": "~/.cache/thoughtforge/models", "max_size": 4000000000}`.
+
+    :return: A payload cache, or `None` if caching isn't enabled
+    :rtype: ModelPayloadCache
+    """
+    if cache_params is None:
+        return None
+    return ModelPayloadCache(cache_params['directory'], safe_dict_get(cache_params, 'max_size', None))
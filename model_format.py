@@ -0,0 +1,229 @@
+import json, mmap, os, struct
+import numpy as np
+
+from compression import get_codec, CODECS, CODEC_DEFLATE
+from utils import safe_dict_get
+
+
+MODEL_FORMAT_VERSION = 1
+MODEL_MAGIC = b'TFMD'
+MODEL_CONTENT_TYPE = 'application/x-thoughtforge-model'
+# array data is aligned so that a model stored on disk can be memory-mapped with aligned views
+MODEL_ALIGNMENT = 64
+DEFAULT_CHUNK_SIZE = 1 << 20
+MODEL_FILE_EXTENSION = '.tfmodel'
+
+MODEL_UPLOAD_JSON = 'json'
+MODEL_UPLOAD_BINARY = 'binary'
+SUPPORTED_MODEL_UPLOAD_FORMATS = [MODEL_UPLOAD_JSON, MODEL_UPLOAD_BINARY]
+COMPRESSION_NONE = 'none'
+COMPRESSION_DEFLATE = CODEC_DEFLATE
+# 'none' and the installed codecs of compression.py
+SUPPORTED_COMPRESSIONS = [COMPRESSION_NONE] + list(CODECS.keys())
+
+# magic, format version, number of arrays
+MODEL_HEADER = struct.Struct('<4sB3xI')
+# name length, dtype length, number of dimensions, data size in bytes
+ARRAY_HEADER = struct.Struct('<IBB2xQ')
+
+WEIGHTS_KEY = 'weights'
+VALUES_KEY = 'values'
+
+
+def get_model_arrays(model_data):
+    """ the (name, array) pairs of a model: 'weights/<index>' for each weight array, then 'values' """
+    arrays = [(WEIGHTS_KEY + '/' + str(index), weight_array) for index, weight_array in enumerate(model_data[WEIGHTS_KEY])]
+    arrays.append((VALUES_KEY, model_data[VALUES_KEY]))
+    return arrays
+
+
+def get_model_size(model_data):
+    """ the size of a model's array data in bytes, about the size of its binary encoding """
+    return sum(np.asarray(array).nbytes for _, array in get_model_arrays(model_data))
+
+
+def _padding(offset):
+    return (-offset) % MODEL_ALIGNMENT
+
+
+def iter_model_chunks(model_data, chunk_size=DEFAULT_CHUNK_SIZE):
+    """ Serializes model data into the binary model format as a stream of chunks. Array data is
+    yielded as views of the arrays themselves (only arrays that aren't contiguous little-endian are
+    copied, one at a time), so streaming a model needs little memory beyond the model.
+
+    Format: a model header, then for each array a header with its name, dtype and shape, followed by
+    the raw little-endian array data starting at a multiple of 64 bytes from the start of the stream.
+
+    :param model_data: A dictionary with a list of 'weights' arrays and a 'values' array
+    :type model_data: dict
+    :param chunk_size: Maximum size of the yielded data chunks in bytes. Defaults to 1 MiB.
+    :type chunk_size: int
+    :return: a generator of bytes-like chunks
+    """
+    arrays = get_model_arrays(model_data)
+    header = MODEL_HEADER.pack(MODEL_MAGIC, MODEL_FORMAT_VERSION, len(arrays))
+    offset = len(header)
+    yield header
+    for name, array in arrays:
+        array = np.asarray(array)
+        array = np.ascontiguousarray(array, dtype=array.dtype.newbyteorder('<'))
+        encoded_name = name.encode()
+        encoded_dtype = array.dtype.str.encode()
+        array_header = b''.join([
+            ARRAY_HEADER.pack(len(encoded_name), len(encoded_dtype), array.ndim, array.nbytes),
+            encoded_name,
+            encoded_dtype,
+            struct.pack('<' + str(array.ndim) + 'Q', *array.shape)])
+        offset += len(array_header)
+        array_header += b'\0' * _padding(offset)
+        offset += _padding(offset)
+        yield array_header
+        data = memoryview(array.reshape(-1)).cast('B')
+        for start in range(0, len(data), chunk_size):
+            yield data[start:start + chunk_size]
+        offset += array.nbytes
+
+
+def compress_chunks(chunks, compression=COMPRESSION_DEFLATE, level=1):
+    """ Compresses a stream of chunks incrementally
+
+    :param compression: 'deflate' (zlib), 'zstd' (if installed, see compression.py) or 'none'
+    :type compression: str
+    :param level: Compression level. Defaults to 1 (fastest).
+    :type level: int
+    :return: a generator of compressed chunks
+    """
+    if compression == COMPRESSION_NONE:
+        return iter(chunks)
+    if compression not in CODECS:
+        raise ValueError("Unsupported compression " + str(compression))
+    return get_codec(compression, level).compress_chunks(chunks)
+
+
+def read_model(buffer):
+    """ Reads model data in the binary model format. Arrays are read-only views of the buffer, so
+    reading a memory-mapped model does not copy the array data.
+
+    :param buffer: The serialized model (bytes, memoryview or mmap)
+    :return: A dictionary with a list of 'weights' arrays and a 'values' array
+    :rtype: dict
+    """
+    magic, version, num_arrays = MODEL_HEADER.unpack_from(buffer)
+    if magic != MODEL_MAGIC:
+        raise ValueError("Not a ThoughtForge model")
+    if version != MODEL_FORMAT_VERSION:
+        raise ValueError("Unsupported model format version " + str(version))
+    offset = MODEL_HEADER.size
+    model_data = {WEIGHTS_KEY: [], VALUES_KEY: None}
+    for _ in range(num_arrays):
+        name_length, dtype_length, ndim, nbytes = ARRAY_HEADER.unpack_from(buffer, offset)
+        offset += ARRAY_HEADER.size
+        name = bytes(buffer[offset:offset + name_length]).decode()
+        offset += name_length
+        dtype = np.dtype(bytes(buffer[offset:offset + dtype_length]).decode())
+        offset += dtype_length
+        shape = struct.unpack_from('<' + str(ndim) + 'Q', buffer, offset)
+        offset += 8 * ndim
+        offset += _padding(offset)
+        array = np.frombuffer(buffer, dtype=dtype, count=nbytes // dtype.itemsize, offset=offset).reshape(shape)
+        offset += nbytes
+        if name == VALUES_KEY:
+            model_data[VALUES_KEY] = array
+        else:
+            model_data[WEIGHTS_KEY].append(array)
+    return model_data
+
+
+def write_model_file(chunks, path):
+    """ Writes a serialized model stream to disk. The file is written next to `path` and moved into
+    place once complete, so a partially written model is never left at `path`.
+
+    :param chunks: Chunks of a model in the binary model format, e.g. from :func:`iter_model_chunks`
+    :param path: Destination file path
+    :type path: str
+    """
+    temp_path = path + '.tmp'
+    try:
+        with open(temp_path, 'wb') as model_file:
+            for chunk in chunks:
+                model_file.write(chunk)
+        with open(temp_path, 'rb') as model_file:
+            magic, version, _ = MODEL_HEADER.unpack(model_file.read(MODEL_HEADER.size))
+        if magic != MODEL_MAGIC or version != MODEL_FORMAT_VERSION:
+            raise ValueError("Not a ThoughtForge model (version " + str(MODEL_FORMAT_VERSION) + ")")
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def save_model_data(model_data, path):
+    """ Saves model data (e.g. a model loaded from an older pickle) in the binary model format
+
+    :param model_data: A dictionary with a list of 'weights' arrays and a 'values' array
+    :type model_data: dict
+    :param path: Destination file path, conventionally ending in '.tfmodel'
+    :type path: str
+    """
+    write_model_file(iter_model_chunks(model_data), path)
+
+
+def load_model_data(path):
+    """ Memory-maps a model saved in the binary model format. Only the headers are read, array data
+    is paged in from disk as it is accessed, so loading is near-instant regardless of model size.
+    The returned model data can be passed directly as a session's `model_data`.
+
+    :param path: Model file path
+    :type path: str
+    :return: A dictionary with a list of read-only 'weights' arrays and a read-only 'values' array
+    :rtype: dict
+    """
+    with open(path, 'rb') as model_file:
+        # the arrays keep the mapping alive after the file is closed
+        model_map = mmap.mmap(model_file.fileno(), 0, access=mmap.ACCESS_READ)
+    return read_model(model_map)
+
+
+def encode_model_json(model_data):
+    """ Encodes model data in the original json upload format
+
+    :rtype: bytes
+    """
+    converted_model_data = {
+        WEIGHTS_KEY: [np.asarray(weight_array).tolist() for weight_array in model_data[WEIGHTS_KEY]],
+        VALUES_KEY: np.asarray(model_data[VALUES_KEY]).tolist()}
+    return json.dumps(converted_model_data).encode()
+
+
+def create_model_upload(model_data, upload_params=None, payload_cache=None, digest=None):
+    """ Builds the body and headers for uploading model data to /initSession from the optional
+    'model_upload' entry of a client .params file, e.g. `{"format": "binary", "compression": "deflate",
+    "chunk_size": 1048576}`. Binary uploads are streamed with chunked transfer encoding.
+
+    :param model_data: A dictionary with a list of 'weights' arrays and a 'values' array
+    :type model_data: dict
+    :param upload_params: The 'model_upload' settings, or `None`
+    :type upload_params: dict
+    :param payload_cache: Optional cache of encoded binary payloads, see :class:`model_cache.ModelPayloadCache`.
+        Requires `digest`.
+    :type payload_cache: model_cache.ModelPayloadCache
+    :param digest: The model digest, see :func:`model_cache.get_model_digest`
+    :type digest: str
+    :return: (request body, request headers)
+    :rtype: tuple
+    """
+    upload_params = upload_params if upload_params is not None else {}
+    upload_format = safe_dict_get(upload_params, 'format', MODEL_UPLOAD_BINARY)
+    if upload_format == MODEL_UPLOAD_JSON:
+        return encode_model_json(model_data), None
+    elif upload_format != MODEL_UPLOAD_BINARY:
+        raise ValueError("Unsupported model upload format " + str(upload_format))
+    compression = safe_dict_get(upload_params, 'compression', COMPRESSION_NONE)
+    compression_level = safe_dict_get(upload_params, 'compression_level', 1)
+    chunk_size = safe_dict_get(upload_params, 'chunk_size', DEFAULT_CHUNK_SIZE)
+    headers = {'Content-Type': MODEL_CONTENT_TYPE}
+    if compression != COMPRESSION_NONE:
+        headers['Content-Encoding'] = compression
+    if payload_cache is not None and digest is not None:
+        return payload_cache.iter_payload(digest, model_data, compression, compression_level, chunk_size), headers
+    return compress_chunks(iter_model_chunks(model_data, chunk_size), compression, compression_level), headers
@@ -0,0 +1,185 @@
+import numpy as np
+
+from utils import safe_dict_get
+
+
+DEFAULT_QUANTILES = (0.5, 0.95)
+DEFAULT_BLOCK_SIZE = 256
+DEFAULT_SKETCH_SIZE = 256
+
+
+class OnlineStatistics():
+    """ OnlineStatistics
+
+    Streaming per-channel summary statistics of named values (e.g. sensor or motor values) in bounded
+    memory: count, min, max, mean, variance and approximate quantiles (median and p95 by default).
+    Statistics can be queried at any time with `get_statistics()`.
+
+    Values are buffered for `block_size` ticks and folded in per block with vectorized NumPy operations,
+    so the per-tick cost is a single row copy. Mean and variance are merged with Chan's parallel
+    variant of Welford's method. Quantiles come from a compactor sketch (in the style of KLL): each
+    level holds up to `sketch_size` values per channel, and a full level is sorted and every other
+    value is promoted to the next level with twice the weight. Quantiles are exact until more than
+    `sketch_size` values have been seen, and the rank error stays within a few percent after that.
+
+    Channels are ordered by the ids of the name map. Names whose first value is a list with more than
+    one element (MULTI motors) get one channel per element, named 'name[i]'. Missing (NaN) values are
+    skipped.
+
+    :param name_id_map: A dictionary of names to ids, e.g. the session's `sensor_name_map`
+    :type name_id_map: dict
+    :param quantiles: Quantiles to estimate. Defaults to (0.5, 0.95).
+    :type quantiles: tuple
+    :param block_size: Number of ticks buffered between updates. Defaults to 256.
+    :type block_size: int
+    :param sketch_size: Values per channel kept on each sketch level. Defaults to 256.
+    :type sketch_size: int
+    """
+    def __init__(self, name_id_map, quantiles=DEFAULT_QUANTILES, block_size=DEFAULT_BLOCK_SIZE, sketch_size=DEFAULT_SKETCH_SIZE):
+        assert(block_size > 0 and sketch_size > 1)
+        self.names = sorted(name_id_map.keys(), key=lambda name: name_id_map[name])
+        self.quantiles = np.asarray(quantiles, dtype=np.float64)
+        self.block_size = block_size
+        self.sketch_size = sketch_size
+        self.channel_names = None
+        self._channel_slices = None
+        self._random = np.random.RandomState(0)
+
+    def _allocate(self, named_values):
+        """ lays out the channels from the first values """
+        self.channel_names = []
+        self._channel_slices = {}
+        for name in self.names:
+            value = safe_dict_get(named_values, name, 0.0)
+            width = len(value) if isinstance(value, (list, tuple, np.ndarray)) else 1
+            self._channel_slices[name] = slice(len(self.channel_names), len(self.channel_names) + width)
+            if width == 1:
+                self.channel_names.append(name)
+            else:
+                self.channel_names.extend([name + '[' + str(index) + ']' for index in range(width)])
+        num_channels = len(self.channel_names)
+        self._block = np.empty((self.block_size, num_channels))
+        self._block_length = 0
+        self._count = np.zeros(num_channels, dtype=np.int64)
+        self._min = np.full(num_channels, np.inf)
+        self._max = np.full(num_channels, -np.inf)
+        self._mean = np.zeros(num_channels)
+        self._m2 = np.zeros(num_channels)
+        # sketch level h holds (channels x values) with weight 2**h
+        self._levels = [np.empty((num_channels, 0))]
+
+    def update(self, named_values):
+        """ Adds the values of one tick
+
+        :param named_values: A dictionary of names to values
+        :type named_values: dict
+        """
+        if self.channel_names is None:
+            self._allocate(named_values)
+        row = self._block[self._block_length]
+        row.fill(np.nan)
+        for name, value in named_values.items():
+            channel_slice = self._channel_slices.get(name)
+            if channel_slice is not None:
+                row[channel_slice] = value
+        self._block_length += 1
+        if self._block_length == self.block_size:
+            self._fold_block()
+
+    def update_array(self, row, layout=None):
+        """ Adds one tick of values already laid out in channel order
+
+        :param row: One value per channel
+        :type row: np.ndarray
+        :param layout: Optional :class:`array_layout.ArrayLayout` of the row, which sets the channels of list
+            valued names. Without it every name has one channel.
+        :type layout: array_layout.ArrayLayout
+        """
+        if self.channel_names is None:
+            self._allocate(layout.template() if layout is not None else {})
+        self._block[self._block_length] = row
+        self._block_length += 1
+        if self._block_length == self.block_size:
+            self._fold_block()
+
+    def _fold_block(self):
+        """ merges the buffered block into the running statistics and the quantile sketch """
+        if self._block_length == 0:
+            return
+        block = self._block[:self._block_length]
+        self._block_length = 0
+        valid = ~np.isnan(block)
+        block_count = np.sum(valid, axis=0)
+        has_values = block_count > 0
+        with np.errstate(invalid='ignore', divide='ignore'):
+            block_sum = np.where(valid, block, 0.0).sum(axis=0)
+            block_mean = np.where(has_values, block_sum / np.maximum(block_count, 1), 0.0)
+            block_m2 = np.where(valid, (block - block_mean) ** 2, 0.0).sum(axis=0)
+            total = self._count + block_count
+            delta = block_mean - self._mean
+            self._mean = np.where(has_values, self._mean + delta * block_count / np.maximum(total, 1), self._mean)
+            self._m2 = np.where(has_values, self._m2 + block_m2 + delta ** 2 * self._count * block_count / np.maximum(total, 1), self._m2)
+        self._count = total
+        self._min = np.fmin(self._min, np.nanmin(np.where(valid, block, np.inf), axis=0))
+        self._max = np.fmax(self._max, np.nanmax(np.where(valid, block, -np.inf), axis=0))
+        self._levels[0] = np.concatenate([self._levels[0], block.T], axis=1)
+        self._compact()
+
+    def _compact(self):
+        """ promotes every other sorted value of each full level to the next level """
+        level = 0
+        while level < len(self._levels) and self._levels[level].shape[1] >= self.sketch_size:
+            values = np.sort(self._levels[level], axis=1)
+            num_compacted = values.shape[1] - values.shape[1] % 2
+            offset = self._random.randint(2)
+            promoted = values[:, offset:num_compacted:2]
+            self._levels[level] = values[:, num_compacted:]
+            if level + 1 == len(self._levels):
+                self._levels.append(np.empty((values.shape[0], 0)))
+            self._levels[level + 1] = np.concatenate([self._levels[level + 1], promoted], axis=1)
+            level += 1
+
+    def _quantile_estimates(self):
+        """ current quantile estimates from the sketch, shape (quantiles, channels) """
+        values = np.concatenate(self._levels, axis=1)
+        weights = np.concatenate([np.full(level.shape[1], 2.0 ** level_index) for level_index, level in enumerate(self._levels)])
+        order = np.argsort(values, axis=1)
+        sorted_values = np.take_along_axis(values, order, axis=1)
+        sorted_weights = np.where(np.isnan(sorted_values), 0.0, weights[order])
+        cumulative_weights = np.cumsum(sorted_weights, axis=1)
+        total_weights = cumulative_weights[:, -1:] if values.shape[1] > 0 else np.zeros((values.shape[0], 1))
+        estimates = np.full((len(self.quantiles), values.shape[0]), np.nan)
+        for quantile_index, quantile in enumerate(self.quantiles):
+            reached = cumulative_weights >= quantile * total_weights
+            reached[:, -1:] = True
+            rank = np.argmax(reached & (sorted_weights > 0), axis=1) if values.shape[1] > 0 else None
+            if rank is not None:
+                estimates[quantile_index] = np.where(total_weights[:, 0] > 0, sorted_values[np.arange(values.shape[0]), rank], np.nan)
+        return estimates
+
+    def get_statistics(self):
+        """ Returns the current statistics of every channel
+
+        :return: A dictionary of channel names to dictionaries with 'count', 'min', 'max', 'mean',
+            'variance' and one entry per quantile, e.g. 'p50' and 'p95'
+        :rtype: dict
+        """
+        if self.channel_names is None:
+            return {}
+        self._fold_block()
+        quantile_estimates = self._quantile_estimates()
+        quantile_keys = ['p' + ('%g' % (100 * quantile)) for quantile in self.quantiles]
+        variance = self._m2 / np.maximum(self._count - 1, 1)
+        statistics = {}
+        for channel, channel_name in enumerate(self.channel_names):
+            empty = self._count[channel] == 0
+            channel_statistics = {
+                'count': int(self._count[channel]),
+                'min': np.nan if empty else float(self._min[channel]),
+                'max': np.nan if empty else float(self._max[channel]),
+                'mean': np.nan if empty else float(self._mean[channel]),
+                'variance': np.nan if empty else float(variance[channel])}
+            for quantile_index, quantile_key in enumerate(quantile_keys):
+                channel_statistics[quantile_key] = float(quantile_estimates[quantile_index, channel])
+            statistics[channel_name] = channel_statistics
+        return statistics
@@ -0,0 +1,262 @@
+import contextlib, io, itertools, json, multiprocessing, os, random, shutil, tempfile, time, traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from utils import load_client_params, safe_dict_get
+
+
+OUTPUT_TAIL_LENGTH = 2000
+
+
+class Uniform():
+    """ Uniform
+
+    A range of values for random search, sampled uniformly (or log-uniformly) between `low` and `high`.
+
+    :param low: Lower bound
+    :type low: float
+    :param high: Upper bound
+    :type high: float
+    :param integer: Sample integers from `low` to `high` inclusive. Defaults to `False`.
+    :type integer: bool
+    :param log: Sample uniformly in log space, e.g. for values spanning several orders of magnitude. Defaults to `False`.
+    :type log: bool
+    """
+    def __init__(self, low, high, integer=False, log=False):
+        assert(low <= high and (not log or low > 0))
+        self.low = low
+        self.high = high
+        self.integer = integer
+        self.log = log
+
+    def sample(self, rng):
+        if self.log:
+            value = self.low * (self.high / self.low) ** rng.random()
+            return int(round(value)) if self.integer else value
+        if self.integer:
+            return rng.randint(self.low, self.high)
+        return rng.uniform(self.low, self.high)
+
+    def __repr__(self):
+        return "Uniform(" + str(self.low) + ", " + str(self.high) + (", integer=True" if self.integer else "") + \
+            (", log=True" if self.log else "") + ")"
+
+
+def apply_override(client_params, path, value):
+    """ Sets a setting of parsed client params in place. `path` is a top-level setting, e.g. 'internal_timescale', a
+    dotted path into a settings object, e.g. 'transport.pool_maxsize', or a setting of a sensor or motor entry by
+    name, e.g. 'sensors.pos_sensor.sensor_range' (for entries with several names, any of them or the entry's 'fan_out'
+    name selects the entry).
+
+    :raises KeyError: If a sensor or motor name in the path isn't declared
+    """
+    keys = path.split('.')
+    target = client_params
+    for key in keys[:-1]:
+        if isinstance(target, list):
+            entries = [entry for entry in target if key == entry['name'] or key == entry.get('fan_out')
+                or (isinstance(entry['name'], list) and key in entry['name'])]
+            if len(entries) == 0:
+                raise KeyError("No entry named '" + key + "' for " + path)
+            target = entries[0]
+        else:
+            target = target.setdefault(key, {})
+    target[keys[-1]] = value
+
+
+class ParameterSweep():
+    """ ParameterSweep
+
+    Runs a session for each configuration of a search space over the settings of a base client .params file, in a
+    pool of worker processes, and ranks the configurations by score and throughput.
+
+    The search space maps setting paths (see :func:`apply_override`) to the values to try, e.g.::
+
+        {'internal_timescale': [50, 100, 200],
+         'ticks_per_sensor_sample': [10, 30],
+         'sensors.pos_sensor.sensor_range': [[-1.0, 1.0], [-2.4, 2.4]]}
+
+    Without `num_samples`, every combination of the listed values is run (grid search). With `num_samples`,
+    that many configurations are drawn at random, choosing among listed values or sampling :class:`Uniform` ranges.
+
+    Each configuration runs as one session in a worker process, until it stops itself or reaches `max_ticks`. The
+    session's score is its :meth:`thoughtforge_client.BaseThoughtForgeClientSession.get_score`, and its throughput
+    the ticks per second between the start and the end of the sim. Session output is captured, and kept for
+    failed configurations.
+
+    :param session_class: A :class:`thoughtforge_client.BaseThoughtForgeClientSession` subclass that can be imported
+        by the worker processes, e.g. `ExampleCartpoleSession`
+    :type session_class: type
+    :param file_name: The base parameter file
+    :type file_name: str
+    :param search_space: Dictionary of setting paths to lists of values or :class:`Uniform` ranges
+    :type search_space: dict
+    :param num_workers: Number of sessions run at the same time. Defaults to the number of cores.
+    :type num_workers: int
+    :param num_samples: Number of random configurations. Defaults to `None` (grid search).
+    :type num_samples: int
+    :param max_ticks: Maximum number of ticks per session. Defaults to `None` (run until the session stops).
+    :type max_ticks: int
+    :param seed: Random search seed. Defaults to 0.
+    :type seed: int
+    :param overrides: Optional settings applied to every configuration, as setting paths to values, e.g.
+        `{'render': {'mode': 'off'}}` to run the sessions headless
+    :type overrides: dict
+    :param session_kwargs: Additional keyword arguments for the session constructor (host, port, api_key, ...)
+    """
+    def __init__(self, session_class, file_name, search_space, num_workers=None, num_samples=None, max_ticks=None, seed=0, overrides=None, **session_kwargs):
+        self.session_class = session_class
+        self.file_name = file_name
+        self.search_space = dict(search_space)
+        self.num_workers = num_workers if num_workers is not None else (os.cpu_count() or 1)
+        self.num_samples = num_samples
+        self.max_ticks = max_ticks
+        self.seed = seed
+        self.overrides = dict(overrides) if overrides is not None else {}
+        self.session_kwargs = session_kwargs
+        self.results = []
+        self.elapsed_time = 0.0
+
+    def get_configurations(self):
+        """ Returns the configurations of the search space, as dictionaries of setting paths to values
+
+        :rtype: list
+        """
+        paths = list(self.search_space.keys())
+        if self.num_samples is None:
+            for path in paths:
+                if not isinstance(self.search_space[path], (list, tuple)):
+                    raise ValueError("Grid search needs a list of values for '" + path + "', set num_samples for random search")
+            return [dict(zip(paths, values)) for values in itertools.product(*[self.search_space[path] for path in paths])]
+        rng = random.Random(self.seed)
+        configurations = []
+        for _ in range(self.num_samples):
+            configuration = {}
+            for path in paths:
+                values = self.search_space[path]
+                configuration[path] = values.sample(rng) if isinstance(values, Uniform) else rng.choice(values)
+            configurations.append(configuration)
+        return configurations
+
+    def _write_params_files(self, configurations, directory):
+        """ writes the base client params with each configuration's overrides to a .params file """
+        params_files = []
+        for index, configuration in enumerate(configurations):
+            client_params = load_client_params(self.file_name)
+            for path, value in list(self.overrides.items()) + list(configuration.items()):
+                apply_override(client_params, path, value)
+            params_file = os.path.join(directory, 'sweep_' + str(index) + '.params')
+            with open(params_file, 'w') as json_file:
+                json.dump(client_params, json_file)
+            params_files.append(params_file)
+        return params_files
+
+    def run(self):
+        """ Runs every configuration and prints the ranked results
+
+        :return: The ranked results, see :meth:`get_results`
+        :rtype: list
+        """
+        configurations = self.get_configurations()
+        num_workers = max(1, min(self.num_workers, len(configurations)))
+        print("Sweeping", len(configurations), "configurations of", self.file_name, "with", num_workers, "workers")
+        self.results = []
+        temp_directory = tempfile.mkdtemp(prefix='thoughtforge_sweep_')
+        start = time.perf_counter()
+        try:
+            params_files = self._write_params_files(configurations, temp_directory)
+            # spawn, so that workers don't inherit the parent's transport connections and threads
+            with ProcessPoolExecutor(num_workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+                futures = {
+                    pool.submit(_run_configuration, self.session_class, params_file, self.max_ticks, self.session_kwargs): index
+                    for index, params_file in enumerate(params_files)}
+                for future in as_completed(futures):
+                    index = futures[future]
+                    result = dict(index=index, configuration=configurations[index], **future.result())
+                    self.results.append(result)
+                    print("[" + str(len(self.results)) + "/" + str(len(configurations)) + "]", _format_configuration(result['configuration']),
+                        "\tscore:", result['score'], "\tticks/sec:", round(result['ticks_per_sec'], 2),
+                        "\tfailed" if result['error'] is not None else "")
+        finally:
+            shutil.rmtree(temp_directory)
+            self.elapsed_time = time.perf_counter() - start
+        self.print_results()
+        return self.get_results()
+
+    def get_results(self):
+        """ Returns the results of the last run, ranked by score (highest first, unscored and failed
+        configurations last) and then by throughput
+
+        :return: A list of dictionaries with the 'index' and 'configuration' (setting paths to values) of each
+            configuration, its 'score', 'ticks', 'elapsed_time' of the sim in seconds, 'ticks_per_sec', and
+            'error' and 'output' (the end of the session output) if the session failed, otherwise `None`
+        :rtype: list
+        """
+        def rank(result):
+            scored = result['error'] is None and result['score'] is not None
+            return (0 if scored else 1, -result['score'] if scored else 0.0, -result['ticks_per_sec'])
+        return sorted(self.results, key=rank)
+
+    def print_results(self, top=None):
+        """ Prints the ranked results of the last run
+
+        :param top: Number of configurations to print. Defaults to all.
+        :type top: int
+        """
+        results = self.get_results()
+        print("-----------------------------------------------------------------------")
+        print("Sweep results:", len(results), "configurations in", round(self.elapsed_time, 3), "s")
+        for rank, result in enumerate(results[:top] if top is not None else results):
+            line = [str(rank + 1).rjust(4) + ".", "score:", result['score'], "\tticks/sec:", round(result['ticks_per_sec'], 2),
+                "\tticks:", result['ticks'], "\t" + _format_configuration(result['configuration'])]
+            if result['error'] is not None:
+                line += ["\tfailed:", result['error']]
+            print(*line)
+        print("-----------------------------------------------------------------------")
+
+    def save_results(self, file_name):
+        """ Writes the ranked results of the last run to a json file """
+        with open(file_name, 'w') as json_file:
+            json.dump({'base_params': self.file_name, 'elapsed_time': self.elapsed_time, 'results': self.get_results()}, json_file, indent=2)
+
+
+def _format_configuration(configuration):
+    return ", ".join(path + "=" + json.dumps(value) for path, value in configuration.items())
+
+
+def _run_configuration(session_class, params_file, max_ticks, session_kwargs):
+    """ runs one configuration in a worker process """
+    outcome = {'ticks': 0, 'elapsed_time': 0.0}
+
+    class _SweepSession(session_class):
+        """ records the score, ticks and sim time of the session, and stops it after max_ticks """
+        def _begin_sim(self):
+            self._sweep_start_time = time.perf_counter()
+            return super()._begin_sim()
+
+        def _complete_tick(self, session_log, debugging_data):
+            super()._complete_tick(session_log, debugging_data)
+            if max_ticks is not None and self.sim_t >= max_ticks:
+                self.stop_sim()
+
+        def _end_sim(self):
+            if self.sim_t > 0 and 'score' not in outcome:
+                outcome['elapsed_time'] = time.perf_counter() - self._sweep_start_time
+                outcome['ticks'] = self.sim_t
+                outcome['score'] = self.get_score()
+            super()._end_sim()
+
+    _SweepSession.__name__ = session_class.__name__
+    output = io.StringIO()
+    error = None
+    try:
+        with contextlib.redirect_stdout(output):
+            _SweepSession(params_file, **session_kwargs)
+    except Exception as e:
+        error = str(e) or type(e).__name__
+        output.write(traceback.format_exc())
+    outcome['score'] = safe_dict_get(outcome, 'score', None)
+    elapsed_time = outcome['elapsed_time']
+    outcome['ticks_per_sec'] = outcome['ticks'] / elapsed_time if elapsed_time > 0 else 0.0
+    outcome['error'] = error if error is not None or outcome['ticks'] > 0 else "session didn't run"
+    outcome['output'] = output.getvalue()[-OUTPUT_TAIL_LENGTH:] if outcome['error'] is not None else None
+    return outcome
@@ -0,0 +1,152 @@
+import math, time
+from bisect import bisect_right
+
+from utils import safe_dict_get
+
+
+PHASE_ENCODE = 'encode'
+PHASE_ROUND_TRIP = 'round_trip'
+PHASE_DECODE = 'decode'
+PHASE_UPDATE = 'update'
+PHASE_RENDER = 'render'
+PHASE_LOGS_AND_DEBUG = 'logs_and_debug'
+PHASES = [PHASE_ENCODE, PHASE_ROUND_TRIP, PHASE_DECODE, PHASE_UPDATE, PHASE_RENDER, PHASE_LOGS_AND_DEBUG]
+
+DEFAULT_MIN_TIME = 1e-6
+DEFAULT_MAX_TIME = 10.0
+DEFAULT_BUCKETS_PER_DECADE = 10
+DEFAULT_QUANTILES = (0.5, 0.9, 0.99)
+
+
+class PhaseTimer():
+    """ PhaseTimer
+
+    Fixed-bucket latency histograms of the phases of a session tick:
+
+    - 'encode': recording the sensor values (history, statistics, trace), mapping sensor names to ids
+      and encoding the /updateSim request
+    - 'round_trip': sending the request and receiving the response
+    - 'decode': decoding the response, mapping motor ids to names and recording the motor values
+    - 'update': the session's `update()` (e.g. stepping the environment)
+    - 'render': the render policy
+    - 'logs_and_debug': processing session logs and debug data
+
+    Buckets are spaced logarithmically, `buckets_per_decade` per factor of 10 between `min_time` and
+    `max_time`, with one more bucket on either side for shorter and longer durations. Recording a
+    duration is a binary search over the bucket edges and an increment, so the histograms use
+    constant memory and can be read at any time with `get_histograms()`.
+
+    :param phases: Names of the timed phases. Defaults to the session loop phases.
+    :type phases: list
+    :param min_time: Upper edge of the first bucket in seconds. Defaults to 1 microsecond.
+    :type min_time: float
+    :param max_time: Lower edge of the last bucket in seconds. Defaults to 10 seconds.
+    :type max_time: float
+    :param buckets_per_decade: Defaults to 10.
+    :type buckets_per_decade: int
+    """
+    def __init__(self, phases=PHASES, min_time=DEFAULT_MIN_TIME, max_time=DEFAULT_MAX_TIME, buckets_per_decade=DEFAULT_BUCKETS_PER_DECADE):
+        assert(0 < min_time < max_time and buckets_per_decade > 0)
+        self.phases = list(phases)
+        self.min_time = min_time
+        self.max_time = max_time
+        self.buckets_per_decade = buckets_per_decade
+        num_edges = int(round(math.log10(max_time / min_time) * buckets_per_decade)) + 1
+        self.bucket_edges = [min_time * 10 ** (edge / buckets_per_decade) for edge in range(num_edges)]
+        self._counts = {phase: [0] * (num_edges + 1) for phase in self.phases}
+        self._totals = {phase: 0.0 for phase in self.phases}
+        self._maxima = {phase: 0.0 for phase in self.phases}
+
+    def record(self, phase, duration):
+        """ Adds the duration of one phase in seconds """
+        self._counts[phase][bisect_right(self.bucket_edges, duration)] += 1
+        self._totals[phase] += duration
+        if duration > self._maxima[phase]:
+            self._maxima[phase] = duration
+
+    def stop(self, phase, start):
+        """ Records a phase that started at `start` (a `time.perf_counter()` value)
+
+        :return: The current `time.perf_counter()` value, i.e. the start of the next phase
+        :rtype: float
+        """
+        now = time.perf_counter()
+        self.record(phase, now - start)
+        return now
+
+    def merge(self, other):
+        """ Adds the histograms of another timer with the same buckets, e.g. of another session """
+        assert(other.bucket_edges == self.bucket_edges)
+        for phase in other.phases:
+            if phase not in self._counts:
+                self.phases.append(phase)
+                self._counts[phase] = [0] * (len(self.bucket_edges) + 1)
+                self._totals[phase] = 0.0
+                self._maxima[phase] = 0.0
+            self._counts[phase] = [count + other_count for count, other_count in zip(self._counts[phase], other._counts[phase])]
+            self._totals[phase] += other._totals[phase]
+            self._maxima[phase] = max(self._maxima[phase], other._maxima[phase])
+
+    def _quantile(self, phase, counts, quantile):
+        """ the upper edge of the bucket holding the quantile, capped at the longest duration seen """
+        rank = quantile * sum(counts)
+        cumulative_count = 0
+        for bucket, count in enumerate(counts):
+            cumulative_count += count
+            if count > 0 and cumulative_count >= rank:
+                return min(self.bucket_edges[bucket], self._maxima[phase]) if bucket < len(self.bucket_edges) else self._maxima[phase]
+        return float('nan')
+
+    def get_histograms(self, quantiles=DEFAULT_QUANTILES):
+        """ Returns the histograms and summary statistics of every phase
+
+        :param quantiles: Quantiles to estimate from the buckets. Defaults to (0.5, 0.9, 0.99).
+        :type quantiles: tuple
+        :return: A dictionary of phase names to dictionaries with 'count', 'total', 'mean' and 'max' in
+            seconds, one entry per quantile (e.g. 'p50', 'p99', upper bucket bounds) and the bucket 'counts'.
+            Bucket i counts durations below `bucket_edges[i]` (and at least `bucket_edges[i - 1]`).
+        :rtype: dict
+        """
+        histograms = {}
+        for phase in self.phases:
+            counts = list(self._counts[phase])
+            count = sum(counts)
+            histogram = {
+                'count': count,
+                'total': self._totals[phase],
+                'mean': self._totals[phase] / count if count > 0 else float('nan'),
+                'max': self._maxima[phase] if count > 0 else float('nan')}
+            for quantile in quantiles:
+                histogram['p' + ('%g' % (100 * quantile))] = self._quantile(phase, counts, quantile)
+            histogram['counts'] = counts
+            histograms[phase] = histogram
+        return histograms
+
+    def print_summary(self):
+        """ Prints the mean, p50, p99 and max of every phase in milliseconds, and its share of the total time """
+        histograms = self.get_histograms()
+        total_time = sum(histogram['total'] for histogram in histograms.values())
+        print("Phase timing (ms per tick):")
+        for phase, histogram in histograms.items():
+            if histogram['count'] == 0:
+                continue
+            print("- " + phase.ljust(16), "mean:", round(histogram['mean'] * 1000, 4), "\tp50:", round(histogram['p50'] * 1000, 4),
+                "\tp99:", round(histogram['p99'] * 1000, 4), "\tmax:", round(histogram['max'] * 1000, 4),
+                "\tshare:", str(round(100 * histogram['total'] / total_time, 1)) + "%")
+
+
+def create_phase_timer(timing_params):
+    """ Creates the phase timer from the optional 'phase_timing' entry of a client .params file: `true`, or
+    e.g. `{"min_time": 1e-6, "max_time": 10.0, "buckets_per_decade": 10}`.
+
+    :return: A phase timer, or `None` if phase timing isn't enabled
+    :rtype: PhaseTimer
+    """
+    if timing_params is None or timing_params is False:
+        return None
+    if timing_params is True:
+        return PhaseTimer()
+    return PhaseTimer(
+        min_time=safe_dict_get(timing_params, 'min_time', DEFAULT_MIN_TIME),
+        max_time=safe_dict_get(timing_params, 'max_time', DEFAULT_MAX_TIME),
+        buckets_per_decade=safe_dict_get(timing_params, 'buckets_per_decade', DEFAULT_BUCKETS_PER_DECADE))
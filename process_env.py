@@ -0,0 +1,259 @@
+import multiprocessing, traceback
+import numpy as np
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    # fail when the module is imported, before any session is created on the server
+    raise ImportError("process_env requires Python 3.8 or later (multiprocessing.shared_memory)")
+
+from array_layout import ArrayLayout
+from rendering import BackgroundRenderPolicy, RenderPolicy
+from sensor_features import create_feature_pipeline
+from session_spec import load_session_spec
+from thoughtforge_client import BaseThoughtForgeClientSession
+
+
+_WORKER_READY = 'ready'
+_WORKER_DONE = 'done'
+_WORKER_ERROR = 'error'
+
+
+def _attach_array(name, size):
+    """ attaches to a shared memory block created by the session process, returns the block and a float64 view of it """
+    block = shared_memory.SharedMemory(name=name)
+    return block, np.ndarray((size,), dtype=np.float64, buffer=block.buf)
+
+
+def _create_shared_array(size):
+    block = shared_memory.SharedMemory(create=True, size=max(size, 1) * np.dtype(np.float64).itemsize)
+    array = np.ndarray((size,), dtype=np.float64, buffer=block.buf)
+    array[:] = 0.0
+    return block, array
+
+
+class _DetachedEnvironment():
+    """ an instance of the environment session class in the worker process, without a server session: only the
+    state its hooks use (client params, name maps, layouts, feature pipeline and sim time) is set up """
+    def __init__(self, environment_class, params_file, session_id, sensor_name_map, motor_name_map, block_name_map):
+        session = environment_class.__new__(environment_class)
+        session.session_spec = load_session_spec(params_file)
+        session.client_params = session.session_spec.copy_params()
+        session.session_id = session_id
+        session.sensor_name_map = sensor_name_map
+        session.motor_name_map = motor_name_map
+        session.block_name_map = block_name_map
+        session.sensor_layout = ArrayLayout(sensor_name_map)
+        session.motor_layout = None
+        # sensor features are computed next to the environment, the session process only copies sensor values
+        session.feature_pipeline = create_feature_pipeline(session.session_spec.get('sensor_features'), sensor_name_map)
+        session.sensor_input_layout = session.feature_pipeline.input_layout if session.feature_pipeline is not None else session.sensor_layout
+        session.sim_t = 0
+        session._stop_requested = False
+        self.session = session
+        self.uses_array_api = environment_class.update_array is not BaseThoughtForgeClientSession.update_array
+
+    def write_sensors(self, sensor_values, out):
+        pipeline = self.session.feature_pipeline
+        if sensor_values is None:
+            out[:] = 0.0
+        elif pipeline is not None:
+            if isinstance(sensor_values, dict):
+                sensor_values = pipeline.input_layout.to_array(sensor_values)
+            pipeline.transform(sensor_values, out)
+        elif isinstance(sensor_values, dict):
+            self.session.sensor_layout.to_array(sensor_values, out)
+        else:
+            out[:] = sensor_values
+
+    def step(self, motor_values, sensor_out):
+        if self.uses_array_api:
+            self.write_sensors(self.session.update_array(motor_values), sensor_out)
+        else:
+            self.write_sensors(self.session.update(self.session.motor_layout.to_dict(motor_values)), sensor_out)
+
+
+def _environment_worker(connection, environment_class, params_file, session_id, sensor_name_map, motor_name_map, block_name_map, sensor_memory_name):
+    """ the worker process: builds the environment and steps it on request, exchanging values through shared memory """
+    sensor_block, sensor_values = _attach_array(sensor_memory_name, len(sensor_name_map))
+    motor_block, motor_values = None, None
+    environment = None
+    try:
+        environment = _DetachedEnvironment(environment_class, params_file, session_id, sensor_name_map, motor_name_map, block_name_map)
+        environment.write_sensors(environment.session.sim_started_notification(), sensor_values)
+        connection.send((_WORKER_READY, environment.session._stop_requested))
+        while True:
+            message = connection.recv()
+            command = message[0]
+            if command == 'step':
+                environment.session.sim_t = message[1]
+                environment.step(motor_values, sensor_values)
+                connection.send((_WORKER_DONE, environment.session._stop_requested))
+            elif command == 'motor_layout':
+                _, motor_memory_name, widths = message
+                environment.session.motor_layout = ArrayLayout(motor_name_map, widths)
+                motor_block, motor_values = _attach_array(motor_memory_name, environment.session.motor_layout.size)
+                connection.send((_WORKER_DONE, environment.session._stop_requested))
+            elif command == 'render':
+                environment.session.render()
+                connection.send((_WORKER_DONE, environment.session._stop_requested))
+            elif command == 'score':
+                connection.send((_WORKER_DONE, environment.session.get_score()))
+            elif command == 'stop':
+                environment.session.sim_ended_notification()
+                connection.send((_WORKER_DONE, None))
+                break
+    except Exception:
+        connection.send((_WORKER_ERROR, traceback.format_exc()))
+    finally:
+        # release the views before closing the blocks they point into
+        sensor_values = motor_values = None
+        sensor_block.close()
+        if motor_block is not None:
+            motor_block.close()
+        connection.close()
+
+
+class ProcessEnvironmentSession(BaseThoughtForgeClientSession):
+    """ ProcessEnvironmentSession
+
+    Runs a session's environment in a worker process, so that environment stepping (e.g. MuJoCo physics and
+    sensor feature math in `update()`) doesn't compete for the GIL with the network loop and other sessions.
+    Existing sessions are run this way by mixing this class in front of them::
+
+        class ProcessReacherSession(ProcessEnvironmentSession, ExampleReacherSession):
+            pass
+
+    The worker process creates an instance of the environment class (the class following this mixin, e.g.
+    `ExampleReacherSession`) without calling its constructor or creating a server session, and calls its
+    `sim_started_notification()`, `update()` (or `update_array()`), `render()`, `get_score()` and
+    `sim_ended_notification()` hooks. Sensor and motor values are exchanged through shared memory arrays laid out by the session's `sensor_layout` and `motor_layout`, only
+    short commands go through the pipe to the worker. The environment's `stop_sim()` stops the session, and its
+    exceptions are raised in the session process. The environment class must be importable by the worker, which
+    is started with the 'spawn' method, and its hooks can use the session's client params, name maps, layouts and
+    `sim_t`, but not the server connection or histories.
+
+    One session steps one environment at a time. Several cores are kept busy by running several sessions with
+    :class:`vector_runner.VectorizedSessionRunner`: its batched `update_batch()` starts the steps of all workers
+    before collecting their sensor values.
+
+    Renders are drawn by the worker when the render policy calls `render()`, the 'background' render mode isn't
+    supported and runs headless. Requires Python 3.8 or later (multiprocessing.shared_memory).
+    """
+    # update() is the dict bridge to update_array() rather than the environment class' update()
+    update = BaseThoughtForgeClientSession.update
+
+    @classmethod
+    def _environment_class(cls):
+        mro = cls.__mro__
+        environment_class = mro[mro.index(ProcessEnvironmentSession) + 1]
+        if environment_class is BaseThoughtForgeClientSession:
+            raise TypeError(cls.__name__ + " must mix ProcessEnvironmentSession in front of an environment session class")
+        return environment_class
+
+    def _worker_request(self, message):
+        self._connection.send(message)
+        return self._worker_response()
+
+    def _worker_response(self):
+        """ waits for the worker's reply to a command, and propagates its stop requests and errors """
+        try:
+            status, value = self._connection.recv()
+        except EOFError:
+            status, value = _WORKER_ERROR, "environment worker exited"
+        if status == _WORKER_ERROR:
+            self._stop_worker(graceful=False)
+            raise RuntimeError("Environment worker failed:\n" + str(value))
+        if status != _WORKER_DONE and status != _WORKER_READY:
+            raise RuntimeError("Unexpected environment worker reply " + str(status))
+        return value
+
+    def sim_started_notification(self):
+        # the worker computes the sensor features, the shared sensor values are sent as they are
+        self.feature_pipeline = None
+        self.sensor_input_layout = self.sensor_layout
+        if isinstance(self.render_policy, BackgroundRenderPolicy):
+            print("Background rendering isn't supported for process environments, running headless.")
+            self.render_policy = RenderPolicy()
+        self._motor_block = None
+        self._motor_values = None
+        self._sensor_block, self._sensor_values = _create_shared_array(self.sensor_layout.size)
+        context = multiprocessing.get_context('spawn')
+        self._connection, worker_connection = context.Pipe()
+        self._worker = context.Process(target=_environment_worker, daemon=True, args=(worker_connection, self._environment_class(),
+            self.session_spec.file_name, self.session_id, self.sensor_name_map, self.motor_name_map, self.block_name_map, self._sensor_block.name))
+        self._worker.start()
+        worker_connection.close()
+        if self._worker_response():
+            self.stop_sim()
+        return self._sensor_values.copy()
+
+    def _create_motor_buffer(self):
+        """ shares the motor layout with the worker once it is known, i.e. from the first server response """
+        self._motor_block, self._motor_values = _create_shared_array(self.motor_layout.size)
+        self._worker_request(('motor_layout', self._motor_block.name, self.motor_layout.widths))
+
+    def _start_step(self, motor_values):
+        """ hands motor values to the worker and starts the environment step """
+        if self._motor_values is None:
+            self._create_motor_buffer()
+        self._motor_values[:] = motor_values
+        self._connection.send(('step', self.sim_t))
+
+    def _finish_step(self):
+        """ waits for the environment step, returns the sensor values (valid until the next step) """
+        if self._worker_response():
+            self.stop_sim()
+        return self._sensor_values
+
+    def update_array(self, motor_values):
+        self._start_step(motor_values)
+        return self._finish_step()
+
+    @classmethod
+    def update_batch(cls, sessions, motor_dicts):
+        """ steps the environments of several sessions in parallel, see :class:`vector_runner.VectorizedSessionRunner` """
+        for session, motor_dict in zip(sessions, motor_dicts):
+            if session.motor_layout is None:
+                session.motor_layout = ArrayLayout.from_values(session.motor_name_map,
+                    [motor_dict[name] for name in session._motor_names_by_id])
+            session._start_step(session.motor_layout.to_array(motor_dict))
+        return [session.sensor_layout.to_dict(session._finish_step()) for session in sessions]
+
+    def render(self):
+        if getattr(self, '_worker', None) is not None:
+            self._worker_request(('render',))
+
+    def get_score(self):
+        if getattr(self, '_worker', None) is None:
+            return None
+        return self._worker_request(('score',))
+
+    def _stop_worker(self, graceful=True):
+        worker = getattr(self, '_worker', None)
+        if worker is None:
+            return
+        self._worker = None
+        try:
+            if graceful and worker.is_alive():
+                self._connection.send(('stop',))
+                status, value = self._connection.recv()
+                if status == _WORKER_ERROR:
+                    print("Environment worker failed to stop:\n" + str(value))
+        except (EOFError, OSError):
+            pass
+        finally:
+            worker.join(timeout=10.0)
+            if worker.is_alive():
+                worker.terminate()
+                worker.join()
+            self._connection.close()
+            self._sensor_values = self._motor_values = None
+            for block in [self._sensor_block, self._motor_block]:
+                if block is not None:
+                    block.close()
+                    block.unlink()
+            self._sensor_block = self._motor_block = None
+
+    def sim_ended_notification(self):
+        self._stop_worker()
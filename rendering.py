@@ -0,0 +1,182 @@
+import copy, queue, threading, time, traceback
+
+from utils import safe_dict_get
+
+
+RENDER_MODE_OFF = 'off'
+RENDER_MODE_EVERY_N_TICKS = 'every_n_ticks'
+RENDER_MODE_BACKGROUND = 'background'
+
+DEFAULT_RENDER_FPS = 30.0
+
+_STOP_RENDERING = object()
+
+
+class RenderPolicy():
+    """ RenderPolicy
+
+    Decides when a session's environment is rendered. The session calls `start()` when the sim starts,
+    `on_tick()` after every call to `update()`, and `stop()` before the sim ends. This base policy
+    never renders (headless mode).
+    """
+    def start(self, session):
+        """ called once the sim has started and the environment exists """
+        pass
+
+    def on_tick(self, session):
+        """ called on the control loop after every `update()` """
+        pass
+
+    def stop(self, session):
+        """ called before `sim_ended_notification()`, while the environment still exists """
+        pass
+
+
+class EveryNTicksRenderPolicy(RenderPolicy):
+    """ EveryNTicksRenderPolicy
+
+    Calls the session's `render()` hook synchronously on the control loop every `interval` ticks.
+    An interval of 1 renders every tick, which is how the examples rendered originally.
+
+    :param interval: Number of ticks between renders. Defaults to 1.
+    :type interval: int
+    """
+    def __init__(self, interval=1):
+        assert(interval >= 1)
+        self.interval = interval
+
+    def on_tick(self, session):
+        if session.sim_t % self.interval == 0:
+            session.render()
+
+
+class BackgroundRenderPolicy(RenderPolicy):
+    """ BackgroundRenderPolicy
+
+    Renders off the control loop. At most `fps` times per second the control loop captures a cheap
+    snapshot with the session's `get_render_snapshot()` hook, and a worker thread draws it with the
+    session's `render_snapshot(snapshot)` hook. Only the latest snapshot is kept: if the worker is still
+    busy drawing, new snapshots are dropped instead of slowing down the control loop.
+
+    The worker calls the session's `close_render()` hook once rendering stops. If drawing fails (e.g. the display
+    is gone), the worker stops, no more snapshots are taken, and the error is printed when the policy is stopped.
+
+    :param fps: Maximum number of frames rendered per second. Defaults to 30.
+    :type fps: float
+    """
+    def __init__(self, fps=DEFAULT_RENDER_FPS):
+        assert(fps > 0)
+        self.fps = fps
+        self.frames_rendered = 0
+        self.frames_dropped = 0
+        self._min_interval = 1.0 / fps
+        self._last_capture_time = None
+        self._snapshots = queue.Queue(maxsize=1)
+        self._thread = None
+        # the traceback of the error that stopped the worker, if any
+        self._error = None
+
+    def start(self, session):
+        self.frames_rendered = 0
+        self.frames_dropped = 0
+        self._last_capture_time = None
+        self._error = None
+        self._thread = threading.Thread(target=self._render_loop, args=(session,), daemon=True)
+        self._thread.start()
+
+    def on_tick(self, session):
+        if self._thread is None or not self._thread.is_alive():
+            return
+        now = time.perf_counter()
+        if self._last_capture_time is not None and now - self._last_capture_time < self._min_interval:
+            return
+        if self._snapshots.full():
+            self.frames_dropped += 1
+            return
+        self._last_capture_time = now
+        self._snapshots.put_nowait(session.get_render_snapshot())
+
+    def stop(self, session):
+        if self._thread is None:
+            return
+        # only the control loop adds snapshots, once the queue is drained the stop request fits
+        try:
+            while True:
+                self._snapshots.get_nowait()
+        except queue.Empty:
+            pass
+        self._snapshots.put_nowait(_STOP_RENDERING)
+        self._thread.join()
+        self._thread = None
+        if self._error is not None:
+            print("Background rendering failed:\n" + self._error)
+
+    def _render_loop(self, session):
+        try:
+            while True:
+                snapshot = self._snapshots.get()
+                if snapshot is _STOP_RENDERING:
+                    break
+                session.render_snapshot(snapshot)
+                self.frames_rendered += 1
+        except Exception:
+            self._error = traceback.format_exc()
+        finally:
+            session.close_render()
+
+
+def create_render_policy(render_params):
+    """ Creates a render policy from the optional 'render' entry of a client .params file, e.g.
+    `{"mode": "every_n_ticks", "interval": 10}` or `{"mode": "background", "fps": 30}`.
+    Sessions without a 'render' entry render every tick.
+
+    :param render_params: The 'render' settings, or `None`
+    :type render_params: dict
+    :rtype: RenderPolicy
+    """
+    if render_params is None:
+        return EveryNTicksRenderPolicy(1)
+    mode = safe_dict_get(render_params, 'mode', RENDER_MODE_EVERY_N_TICKS)
+    if mode == RENDER_MODE_OFF:
+        return RenderPolicy()
+    elif mode == RENDER_MODE_EVERY_N_TICKS:
+        return EveryNTicksRenderPolicy(safe_dict_get(render_params, 'interval', 1))
+    elif mode == RENDER_MODE_BACKGROUND:
+        return BackgroundRenderPolicy(safe_dict_get(render_params, 'fps', DEFAULT_RENDER_FPS))
+    raise ValueError("Unsupported render mode " + str(mode))
+
+
+class GymRenderMixin():
+    """ GymRenderMixin
+
+    Implements the session render hooks for sessions that keep an openAI gym environment in `self.env`.
+    Background rendering uses a second copy of the environment, owned by the render worker, which is
+    set to the captured state (`state` for classic control envs, `qpos`/`qvel` for MuJoCo envs) before
+    each frame is drawn.
+    """
+    def render(self):
+        self.env.render()
+
+    def get_render_snapshot(self):
+        unwrapped_env = self.env.unwrapped
+        if hasattr(unwrapped_env, 'sim'):
+            return (unwrapped_env.sim.data.qpos.copy(), unwrapped_env.sim.data.qvel.copy())
+        return copy.deepcopy(unwrapped_env.state)
+
+    def render_snapshot(self, snapshot):
+        render_env = getattr(self, '_render_env', None)
+        if render_env is None:
+            import gym
+            render_env = gym.make(self.env.spec.id)
+            self._render_env = render_env
+        if hasattr(render_env.unwrapped, 'sim'):
+            render_env.unwrapped.set_state(*snapshot)
+        else:
+            render_env.unwrapped.state = snapshot
+        render_env.render()
+
+    def close_render(self):
+        render_env = getattr(self, '_render_env', None)
+        if render_env is not None:
+            render_env.close()
+            self._render_env = None
@@ -0,0 +1,182 @@
+import time
+
+from session_trace import TraceReader, MOTOR_STREAM, SENSOR_STREAM, TIME_COLUMN, TIME_STREAM
+from thoughtforge_client import BaseThoughtForgeClientSession
+from utils import safe_dict_get
+
+
+REPLAY_TIMING_FAST = 'fast'
+REPLAY_TIMING_RECORDED = 'recorded'
+SUPPORTED_REPLAY_TIMINGS = [REPLAY_TIMING_FAST, REPLAY_TIMING_RECORDED]
+
+
+def _values_match(value, recorded_value, tolerance):
+    """ compares a motor value (a float, or a list for MULTI motors) with a recorded one """
+    if isinstance(recorded_value, list):
+        return isinstance(value, (list, tuple)) and len(value) == len(recorded_value) and \
+            all(_values_match(element, recorded_element, tolerance) for element, recorded_element in zip(value, recorded_value))
+    if value == recorded_value:
+        return True
+    # nan is recorded for values that were missing
+    if value != value or recorded_value != recorded_value:
+        return value != value and recorded_value != recorded_value
+    return abs(value - recorded_value) <= tolerance * abs(recorded_value)
+
+
+class SessionRecording():
+    """ SessionRecording
+
+    The sensor values sent and motor values received on every tick of a recorded session, with the
+    times at which the sensor values were sent. Sessions are recorded by adding a 'trace' entry to the
+    client .params file, e.g. `"trace": {"directory": "./traces"}`, which writes each session to
+    './traces/session_<id>' (see :class:`session_trace.TraceRecorder`).
+
+    The recording is read into memory once, so that replaying it adds as little work per tick as possible.
+
+    :param directory: The trace directory of one session, e.g. './traces/session_0'
+    :type directory: str
+    """
+    def __init__(self, directory):
+        reader = TraceReader(directory)
+        self.directory = directory
+        self.sensor_names = reader.get_names(SENSOR_STREAM)
+        self.motor_names = reader.get_names(MOTOR_STREAM)
+        self.num_ticks = reader.get_num_ticks(SENSOR_STREAM)
+        # python lists index faster than arrays and already hold python floats (or lists for MULTI values)
+        self._sensor_columns = [reader.get_history(name, SENSOR_STREAM).tolist() for name in self.sensor_names]
+        self._motor_columns = [reader.get_history(name, MOTOR_STREAM).tolist() for name in self.motor_names]
+        self.times = reader.get_history(TIME_COLUMN, TIME_STREAM) if TIME_COLUMN in reader.get_names(TIME_STREAM) else None
+
+    def get_sensor_dict(self, tick):
+        """ Returns the sensor values sent at a recorded tick
+
+        :rtype: dict
+        """
+        return {name: column[tick] for name, column in zip(self.sensor_names, self._sensor_columns)}
+
+    def get_motor_dict(self, tick):
+        """ Returns the motor values received at a recorded tick
+
+        :rtype: dict
+        """
+        return {name: column[tick] for name, column in zip(self.motor_names, self._motor_columns)}
+
+    def motors_match(self, tick, motor_dict, tolerance=0.0):
+        """ Returns whether motor values match the values received at a recorded tick
+
+        :param tolerance: Maximum allowed relative difference. Defaults to 0 (exact match).
+        :type tolerance: float
+        :rtype: bool
+        """
+        for name, column in zip(self.motor_names, self._motor_columns):
+            if not _values_match(safe_dict_get(motor_dict, name, float('nan')), column[tick], tolerance):
+                return False
+        return True
+
+
+class ReplaySession(BaseThoughtForgeClientSession):
+    """ ReplaySession
+
+    Replays a recorded session against the server without a simulation environment: the recorded
+    sensor values are sent tick by tick, either as fast as possible or at the recorded timing, and the
+    motor values received are compared against the recording. This gives a deterministic, cheap
+    workload for measuring server and transport throughput and for regression testing the client and
+    server loop. The session stops at the end of the recording.
+
+    Ticks whose motor values differ from the recording are counted in `motor_mismatch_count`, and the
+    first one is kept in `first_motor_mismatch_tick`. Model updates make motor values diverge over time
+    unless the server is deterministic and the session starts from the same model and random seed.
+
+    Replay settings are passed to the constructor, or read from the optional 'replay' entry of the
+    client .params file, e.g. `"replay": {"recording": "./traces/session_0", "timing": "recorded"}`,
+    which also works when the session is run through :mod:`thoughtforge_async` or :mod:`vector_runner`.
+    The client .params file must declare the same sensors and motors as the recorded session. Its 'trace'
+    entry is ignored, a replay isn't recorded again.
+
+    :param file_name: The parameter file for specifying sensors, motors and model configuration
+    :type file_name: str
+    :param recording: The trace directory of a recorded session, or a loaded :class:`SessionRecording`
+    :type recording: str
+    :param timing: 'fast' to send each tick as soon as the previous response arrived, or 'recorded' to
+        send ticks at their recorded times. Defaults to 'fast'.
+    :type timing: str
+    :param speed: Playback speed factor for 'recorded' timing. Defaults to 1.
+    :type speed: float
+    :param motor_tolerance: Maximum relative difference for motor values to match the recording. Defaults to 0.
+    :type motor_tolerance: float
+    :param session_kwargs: Additional keyword arguments for :class:`thoughtforge_client.BaseThoughtForgeClientSession`
+    """
+    def __init__(self, file_name, recording=None, timing=None, speed=None, motor_tolerance=None, **session_kwargs):
+        self.recording = recording
+        self.timing = timing
+        self.speed = speed
+        self.motor_tolerance = motor_tolerance
+        super().__init__(file_name, **session_kwargs)
+
+    def _load_replay_settings(self):
+        """ fills in the replay settings that weren't passed to the constructor from the client params """
+        replay_params = safe_dict_get(self.client_params, 'replay', {})
+        recording = getattr(self, 'recording', None)
+        if recording is None:
+            recording = replay_params['recording']
+        self.recording = recording if isinstance(recording, SessionRecording) else SessionRecording(recording)
+        if getattr(self, 'timing', None) is None:
+            self.timing = safe_dict_get(replay_params, 'timing', REPLAY_TIMING_FAST)
+        if self.timing not in SUPPORTED_REPLAY_TIMINGS:
+            raise ValueError("Unsupported replay timing " + str(self.timing))
+        if getattr(self, 'speed', None) is None:
+            self.speed = safe_dict_get(replay_params, 'speed', 1.0)
+        if getattr(self, 'motor_tolerance', None) is None:
+            self.motor_tolerance = safe_dict_get(replay_params, 'motor_tolerance', 0.0)
+        if self.timing == REPLAY_TIMING_RECORDED and self.recording.times is None:
+            raise ValueError("Recording " + str(self.recording.directory) + " has no timing information")
+        if set(self.recording.sensor_names) != set(self.sensor_name_map.keys()):
+            raise ValueError("Recorded sensors don't match the sensors of " + str(self.recording.directory))
+
+    def _create_trace_recorder(self):
+        # the .params file of the recorded session usually still has its 'trace' entry, recording the replay
+        # would add traces of replays next to (and be mistaken for) the recordings
+        if safe_dict_get(self.client_params, 'trace', None) is not None:
+            print("Trace recording is disabled while replaying.")
+        return None
+
+    def _wait_for_recorded_time(self, tick):
+        """ sleeps until the recorded send time of a tick, scaled by the playback speed """
+        delay = self._replay_start_time + self.recording.times[tick] / self.speed - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+    def sim_started_notification(self):
+        self._load_replay_settings()
+        # the recorded sensor values were already computed from observations, they are sent as they are
+        self.feature_pipeline = None
+        self.sensor_input_layout = self.sensor_layout
+        self.motor_mismatch_count = 0
+        self.first_motor_mismatch_tick = None
+        self._replay_reported = False
+        if self.recording.num_ticks == 0:
+            self.stop_sim()
+            return None
+        if self.timing == REPLAY_TIMING_RECORDED:
+            self._replay_start_time = time.perf_counter() - self.recording.times[0] / self.speed
+        return self.recording.get_sensor_dict(0)
+
+    def update(self, motor_action_dict):
+        tick = self.sim_t
+        if not self.recording.motors_match(tick, motor_action_dict, self.motor_tolerance):
+            self.motor_mismatch_count += 1
+            if self.first_motor_mismatch_tick is None:
+                self.first_motor_mismatch_tick = tick
+        next_tick = tick + 1
+        if next_tick >= self.recording.num_ticks:
+            self.stop_sim()
+            return self.recording.get_sensor_dict(tick)
+        if self.timing == REPLAY_TIMING_RECORDED:
+            self._wait_for_recorded_time(next_tick)
+        return self.recording.get_sensor_dict(next_tick)
+
+    def sim_ended_notification(self):
+        if self.sim_t > 0 and not self._replay_reported:
+            self._replay_reported = True
+            print("Session", self.session_id, "replayed", self.sim_t, "of", self.recording.num_ticks, "recorded ticks,",
+                self.motor_mismatch_count, "with motor values differing from the recording")
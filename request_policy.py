@@ -0,0 +1,203 @@
+import random, time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from utils import safe_dict_get
+
+
+# asks the server to deduplicate /updateSim requests by sequence number, servers that do report 'idempotent_updates'
+IDEMPOTENT_UPDATES_HEADER = 'x-thoughtforge-idempotent-updates'
+# the /updateSim url argument carrying the request's sequence number
+REQUEST_SEQUENCE_ARG = 'request_seq'
+# server errors worth retrying: the request may succeed on another attempt
+RETRY_STATUS_CODES = (500, 502, 503, 504)
+
+DEFAULT_MAX_RETRIES = 2
+DEFAULT_RETRY_BACKOFF = 0.05
+DEFAULT_MAX_BACKOFF = 1.0
+# threads a policy sends hedged requests from. A request needs two, the others let attempts that lost a hedge finish
+# (until their timeout) without delaying the next request.
+HEDGE_MAX_WORKERS = 8
+
+
+def _close_response(future):
+    """ returns the connection of a response that lost a hedge to the pool """
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+class RequestPolicy():
+    """ RequestPolicy
+
+    Bounds the latency of a session's server requests, configured from the optional 'request_policy' entry of the
+    client .params file, e.g. `{"deadline": 2.0, "max_retries": 2, "hedge_after": 0.05}`:
+
+    - 'deadline': seconds after the start of a request in which its attempts are made, including retries. Each
+      attempt's connect and read timeouts are set to the time left (or 'attempt_timeout', if that is shorter), so a
+      stalled server fails the request instead of hanging it. These timeouts bound each wait for the server rather
+      than the whole response, a server that keeps sending a slow response can take longer.
+    - 'max_retries': attempts made after the first for idempotent requests that fail with a connection error, a
+      timeout or a 5xx status, waiting 'retry_backoff' seconds before the first retry and twice as long before
+      each next one (up to 'max_backoff', with random jitter so that sessions sharing a server don't retry in step)
+    - 'hedge_after': seconds after which an idempotent request that hasn't been answered is sent a second time;
+      whichever response arrives first is used. Defaults to `None` (no hedging).
+
+    /updateSim requests advance the server's session, so they are only retried and hedged if the server
+    deduplicates them: the session asks for that when it is initialized (see :data:`IDEMPOTENT_UPDATES_HEADER`),
+    and numbers its /updateSim requests so that the server answers a repeated request with the response it already
+    sent. Otherwise /updateSim requests only get the deadline.
+
+    `counters` counts the 'requests' made through the policy, their 'retries', 'hedges' (second requests sent),
+    'hedge_wins' (second requests answered first), 'timeouts' (attempts that timed out) and 'failures' (requests
+    that failed after all attempts). A policy is meant for one session, sessions create their own from their .params.
+    Hedged requests are sent from a thread pool of the policy's own, so that sessions don't wait on each other's.
+
+    :param deadline: Seconds in which a request's attempts are made. Defaults to `None` (the transport's timeouts apply).
+    :type deadline: float
+    :param max_retries: Retries of failed idempotent requests. Defaults to 2.
+    :type max_retries: int
+    :param retry_backoff: Seconds to wait before the first retry. Defaults to 0.05.
+    :type retry_backoff: float
+    :param max_backoff: Longest wait between retries in seconds. Defaults to 1.
+    :type max_backoff: float
+    :param hedge_after: Seconds to wait for a response before hedging. Defaults to `None` (no hedging).
+    :type hedge_after: float
+    :param attempt_timeout: Seconds each attempt may take. Defaults to `None` (the time left until the deadline).
+    :type attempt_timeout: float
+    """
+    def __init__(self, deadline=None, max_retries=DEFAULT_MAX_RETRIES, retry_backoff=DEFAULT_RETRY_BACKOFF,
+                 max_backoff=DEFAULT_MAX_BACKOFF, hedge_after=None, attempt_timeout=None):
+        assert(deadline is None or deadline > 0)
+        assert(max_retries >= 0 and retry_backoff >= 0 and max_backoff >= 0)
+        assert(hedge_after is None or hedge_after >= 0)
+        assert(attempt_timeout is None or attempt_timeout > 0)
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.max_backoff = max_backoff
+        self.hedge_after = hedge_after
+        self.attempt_timeout = attempt_timeout
+        self.counters = {'requests': 0, 'retries': 0, 'hedges': 0, 'hedge_wins': 0, 'timeouts': 0, 'failures': 0}
+        self._rng = random.Random()
+        self._hedge_executor = None
+        # requests is imported with the first transport, see transport.py
+        import requests
+        self._timeout_error = requests.exceptions.Timeout
+        self._connection_error = requests.exceptions.ConnectionError
+
+    @property
+    def repeats_requests(self):
+        """ whether requests may be sent more than once, i.e. the session needs idempotent /updateSim requests """
+        return self.max_retries > 0 or self.hedge_after is not None
+
+    def get(self, transport, path, args_dict=None, headers=None, idempotent=True):
+        """ Issues a GET request through `transport` within the policy's deadline, see :meth:`request`
+
+        :rtype: requests.Response
+        """
+        return self.request(lambda timeout: transport.get(path, args_dict, headers=headers, timeout=timeout), idempotent)
+
+    def post(self, transport, path, args_dict=None, data=None, headers=None, idempotent=False):
+        """ Issues a POST request through `transport` within the policy's deadline, see :meth:`request`
+
+        :rtype: requests.Response
+        """
+        return self.request(lambda timeout: transport.post(path, args_dict, data=data, headers=headers, timeout=timeout), idempotent)
+
+    def request(self, send, idempotent):
+        """ Sends a request, retrying and hedging it if it is idempotent
+
+        :param send: Sends the request once, called with the attempt's timeout in seconds (or `None` for the
+            transport's timeouts) and returning the response. Called from another thread when the request is hedged.
+        :type send: callable
+        :param idempotent: Whether the request may be sent more than once
+        :type idempotent: bool
+        :return: The first response without a retryable status, or the last response once the attempts are used up.
+            Non-OK responses are returned to the caller.
+        :rtype: requests.Response
+        :raises requests.exceptions.RequestException: The error of the last attempt, if it failed without a response
+        """
+        counters = self.counters
+        counters['requests'] += 1
+        start = time.perf_counter()
+        retries = 0
+        while True:
+            timeout = self._attempt_timeout(start)
+            error = None
+            try:
+                if idempotent and self.hedge_after is not None:
+                    response = self._send_hedged(send, timeout, start)
+                else:
+                    response = send(timeout)
+            except self._timeout_error as e:
+                counters['timeouts'] += 1
+                error, response = e, None
+            except self._connection_error as e:
+                error, response = e, None
+            if response is not None and response.status_code not in RETRY_STATUS_CODES:
+                return response
+            backoff = min(self.max_backoff, self.retry_backoff * 2 ** retries) * self._rng.uniform(0.5, 1.0)
+            if not idempotent or retries >= self.max_retries or not self._has_time_left(start, backoff):
+                counters['failures'] += 1
+                if response is not None:
+                    return response
+                raise error
+            if response is not None:
+                response.close()
+            time.sleep(backoff)
+            retries += 1
+            counters['retries'] += 1
+
+    def _attempt_timeout(self, start):
+        """ seconds the next attempt may take, `None` if neither a deadline nor an attempt timeout is set """
+        if self.deadline is None:
+            return self.attempt_timeout
+        time_left = max(self.deadline - (time.perf_counter() - start), 0.001)
+        return min(time_left, self.attempt_timeout) if self.attempt_timeout is not None else time_left
+
+    def _has_time_left(self, start, delay):
+        """ whether another attempt can start after waiting `delay` seconds """
+        return self.deadline is None or time.perf_counter() - start + delay < self.deadline
+
+    def _send_hedged(self, send, timeout, start):
+        """ sends a request from the policy's thread pool, and a second copy if it isn't answered after `hedge_after`
+        seconds. Returns the first usable response, the other one is closed when it arrives. """
+        if self._hedge_executor is None:
+            # threads are only started when needed, idle ones exit when the policy is collected
+            self._hedge_executor = ThreadPoolExecutor(max_workers=HEDGE_MAX_WORKERS, thread_name_prefix='thoughtforge-hedge')
+        executor = self._hedge_executor
+        first = executor.submit(send, timeout)
+        done, _ = wait([first], timeout=self.hedge_after)
+        if len(done) > 0:
+            return first.result()
+        self.counters['hedges'] += 1
+        second = executor.submit(send, self._attempt_timeout(start))
+        pending = {first, second}
+        while len(pending) > 0:
+            _, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in [first, second]:
+                if future.done() and future.exception() is None and future.result().status_code not in RETRY_STATUS_CODES:
+                    if future is second:
+                        self.counters['hedge_wins'] += 1
+                    (second if future is first else first).add_done_callback(_close_response)
+                    return future.result()
+        # both attempts failed, the hedge's outcome decides whether the request is retried
+        first.add_done_callback(_close_response)
+        return second.result()
+
+
+def create_request_policy(policy_params):
+    """ Creates the request policy from the optional 'request_policy' entry of a client .params file, e.g.
+    `{"deadline": 2.0, "max_retries": 2, "retry_backoff": 0.05, "max_backoff": 1.0, "hedge_after": 0.05}`
+
+    :return: A request policy, or `None` if the session doesn't configure one
+    :rtype: RequestPolicy
+    """
+    if policy_params is None:
+        return None
+    return RequestPolicy(
+        deadline=safe_dict_get(policy_params, 'deadline', None),
+        max_retries=safe_dict_get(policy_params, 'max_retries', DEFAULT_MAX_RETRIES),
+        retry_backoff=safe_dict_get(policy_params, 'retry_backoff', DEFAULT_RETRY_BACKOFF),
+        max_backoff=safe_dict_get(policy_params, 'max_backoff', DEFAULT_MAX_BACKOFF),
+        hedge_after=safe_dict_get(policy_params, 'hedge_after', None),
+        attempt_timeout=safe_dict_get(policy_params, 'attempt_timeout', None))
@@ -0,0 +1,187 @@
+import numpy as np
+
+from array_layout import ArrayLayout
+from utils import safe_dict_get
+
+
+FEATURE_SETTINGS = ['input', 'difference', 'scale', 'deadband', 'divide_by', 'divisor_min']
+# transform_dict() computes pipelines of up to this many sensors with scalar Python math, NumPy's per-call overhead
+# outweighs its vectorized math below it (see benchmarks/bench_sensor_features.py)
+SCALAR_MAX_SENSORS = 96
+
+
+class FeaturePipeline():
+    """ FeaturePipeline
+
+    Computes sensor values from the raw observations returned by a session's `update()`, with transforms
+    declared per sensor in the optional 'sensor_features' entry of the client .params file, e.g.::
+
+        "sensor_features": {
+            "rotvel0_sensor": {"input": "rotvel0", "scale": 0.1, "deadband": 0.04, "divide_by": "angle0", "divisor_min": 0.25},
+            "delta1_rotvel0_sensor": {"input": "rotvel0", "difference": 1, "scale": -1, "divide_by": "angle0", "divisor_min": 0.25},
+            "delta2_rotvel0_sensor": {"input": "rotvel0", "difference": 2, "divide_by": "angle0", "divisor_min": 0.25}
+        }
+
+    Each sensor's value is computed from its 'input' observation (defaults to the sensor's own name, so
+    undeclared sensors pass through) in this order:
+
+    - 'difference': N takes the N-th order difference over ticks (1: the change since the previous tick,
+      2: the change of that change). The previous values start at 0 and are set back to 0 by :meth:`reset`,
+      e.g. when an episode ends.
+    - 'scale': multiplies by a factor
+    - 'deadband': sets values whose magnitude is below the threshold to 0
+    - 'divide_by': divides by another observation, raised to at least 'divisor_min' if it is given
+
+    The transforms of all sensors are compiled into index and parameter arrays once, and applied to all sensors
+    in a few NumPy operations per tick. :meth:`transform_dict` computes pipelines of up to `SCALAR_MAX_SENSORS`
+    sensors with scalar Python math instead, which is faster for a few sensors. It keeps its own previous values,
+    a session uses either :meth:`transform` or :meth:`transform_dict`.
+
+    :param feature_params: The 'sensor_features' settings: sensor names to transform settings
+    :type feature_params: dict
+    :param sensor_name_map: The session's sensor names to ids
+    :type sensor_name_map: dict
+    :raises ValueError: If a transform refers to an unknown sensor or has invalid settings, listing every problem found
+    """
+    def __init__(self, feature_params, sensor_name_map):
+        self.sensor_layout = ArrayLayout(sensor_name_map)
+        errors = []
+        for sensor_name, feature in feature_params.items():
+            if sensor_name not in sensor_name_map:
+                errors.append("unknown sensor '" + str(sensor_name) + "'")
+                continue
+            if not hasattr(feature, 'keys'):
+                errors.append(sensor_name + ": transform settings must be an object")
+                continue
+            for key in feature.keys():
+                if key not in FEATURE_SETTINGS:
+                    errors.append(sensor_name + ": unknown setting '" + str(key) + "'")
+            difference = safe_dict_get(feature, 'difference', 0)
+            if not isinstance(difference, int) or isinstance(difference, bool) or difference < 0:
+                errors.append(sensor_name + ": 'difference' must be an integer >= 0")
+            for key in ['input', 'divide_by']:
+                if key in feature and not isinstance(feature[key], str):
+                    errors.append(sensor_name + ": '" + key + "' must be an observation name")
+            for key in ['scale', 'deadband', 'divisor_min']:
+                value = safe_dict_get(feature, key, 0)
+                if not isinstance(value, (int, float)) or isinstance(value, bool):
+                    errors.append(sensor_name + ": '" + key + "' must be a number")
+        if len(errors) > 0:
+            raise ValueError("Invalid sensor_features:\n- " + "\n- ".join(errors))
+
+        features = [safe_dict_get(feature_params, sensor_name, {}) for sensor_name in self.sensor_layout.names]
+        # observations in order of first use
+        self.input_names = []
+        for feature, sensor_name in zip(features, self.sensor_layout.names):
+            for input_name in [safe_dict_get(feature, 'input', sensor_name), safe_dict_get(feature, 'divide_by', None)]:
+                if input_name is not None and input_name not in self.input_names:
+                    self.input_names.append(input_name)
+        self.input_layout = ArrayLayout({input_name: index for index, input_name in enumerate(self.input_names)})
+        num_inputs = len(self.input_names)
+
+        self._input_indices = np.array([self.input_layout.index(safe_dict_get(feature, 'input', sensor_name))
+            for feature, sensor_name in zip(features, self.sensor_layout.names)], dtype=np.intp)
+        self._orders = np.array([safe_dict_get(feature, 'difference', 0) for feature in features], dtype=np.intp)
+        self.max_order = int(self._orders.max()) if len(features) > 0 else 0
+        self._scales = np.array([safe_dict_get(feature, 'scale', 1.0) for feature in features], dtype=np.float64)
+        self._deadbands = np.array([safe_dict_get(feature, 'deadband', 0.0) for feature in features], dtype=np.float64)
+        # sensors without a divisor divide by a constant 1, the last element of `_divisor_inputs`
+        self._divisor_indices = np.array([self.input_layout.index(feature['divide_by']) if 'divide_by' in feature else num_inputs
+            for feature in features], dtype=np.intp)
+        self._divisor_minima = np.array([safe_dict_get(feature, 'divisor_min', -np.inf) if 'divide_by' in feature else -np.inf
+            for feature in features], dtype=np.float64)
+        self._divisor_inputs = np.ones(num_inputs + 1)
+        self._scaled = bool(np.any(self._scales != 1.0))
+        self._has_deadbands = bool(np.any(self._deadbands > 0.0))
+        self._has_divisors = bool(np.any(self._divisor_indices != num_inputs))
+        # row N holds the N-th order differences of every sensor, row 0 the inputs
+        self._differences = np.zeros((self.max_order + 1, len(features)))
+        # the previous inputs and differences, up to order max_order - 1
+        self._previous = np.zeros((self.max_order, len(features)))
+        # position of each sensor's difference in the flattened `_differences`
+        self._difference_positions = self._orders * len(features) + np.arange(len(features))
+        # per sensor (name, input, previous values by order, scale, deadband, divisor or None, divisor minimum) for
+        # the scalar path of transform_dict(), `None` for larger pipelines
+        self._scalar_features = None
+        if len(features) <= SCALAR_MAX_SENSORS:
+            self._scalar_features = [(sensor_name, safe_dict_get(feature, 'input', sensor_name),
+                [0.0] * safe_dict_get(feature, 'difference', 0), float(safe_dict_get(feature, 'scale', 1.0)),
+                float(safe_dict_get(feature, 'deadband', 0.0)), safe_dict_get(feature, 'divide_by', None),
+                float(safe_dict_get(feature, 'divisor_min', -np.inf)))
+                for feature, sensor_name in zip(features, self.sensor_layout.names)]
+
+    def reset(self):
+        """ Sets the previous values of the differences back to 0, e.g. at the start of an episode """
+        self._previous[:] = 0.0
+        if self._scalar_features is not None:
+            for scalar_feature in self._scalar_features:
+                previous = scalar_feature[2]
+                previous[:] = [0.0] * len(previous)
+
+    def transform(self, inputs, out=None):
+        """ Computes the sensor values of one tick
+
+        :param inputs: Raw observations laid out by `input_layout`
+        :type inputs: np.ndarray
+        :param out: Optional array to write the sensor values into, otherwise a new array is returned
+        :type out: np.ndarray
+        :return: Sensor values laid out by the session's sensor layout
+        :rtype: np.ndarray
+        """
+        inputs = np.asarray(inputs, dtype=np.float64)
+        # indexing with index arrays is faster than np.take(..., out=...) for sensor counts of this size
+        values = inputs[self._input_indices]
+        if self.max_order > 0:
+            differences = self._differences
+            differences[0] = values
+            for order in range(self.max_order):
+                np.subtract(differences[order], self._previous[order], out=differences[order + 1])
+            self._previous[:] = differences[:-1]
+            values = differences.ravel()[self._difference_positions]
+        if self._scaled:
+            np.multiply(values, self._scales, out=values)
+        if self._has_deadbands:
+            values[np.abs(values) < self._deadbands] = 0.0
+        if self._has_divisors:
+            divisor_inputs = self._divisor_inputs
+            divisor_inputs[:-1] = inputs
+            np.divide(values, np.maximum(divisor_inputs[self._divisor_indices], self._divisor_minima), out=values)
+        if out is None:
+            return values
+        out[:] = values
+        return out
+
+    def transform_dict(self, named_inputs):
+        """ Computes the sensor values of one tick from a dictionary of raw observations. Missing observations are 0.
+
+        :rtype: dict
+        """
+        if self._scalar_features is None:
+            return self.sensor_layout.to_dict(self.transform(self.input_layout.to_array(named_inputs)))
+        sensor_values = {}
+        for sensor_name, input_name, previous, scale, deadband, divide_by, divisor_min in self._scalar_features:
+            value = float(named_inputs.get(input_name, 0.0))
+            for order in range(len(previous)):
+                difference = value - previous[order]
+                previous[order] = value
+                value = difference
+            value *= scale
+            if abs(value) < deadband:
+                value = 0.0
+            if divide_by is not None:
+                divisor = max(float(named_inputs.get(divide_by, 0.0)), divisor_min)
+                # dividing by 0 gives inf or nan like transform(), rather than raising
+                value = value / divisor if divisor != 0.0 else float(np.divide(value, divisor))
+            sensor_values[sensor_name] = value
+        return sensor_values
+
+
+def create_feature_pipeline(feature_params, sensor_name_map):
+    """ Creates the feature pipeline from the optional 'sensor_features' entry of a client .params file
+
+    :return: A feature pipeline, or `None` if the session has no sensor features
+    :rtype: FeaturePipeline
+    """
+    if feature_params is None or len(feature_params) == 0:
+        return None
+    return FeaturePipeline(feature_params, sensor_name_map)
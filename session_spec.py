@@ -0,0 +1,240 @@
+import hashlib, json, os, threading
+from types import MappingProxyType
+
+from utils import safe_dict_get, CURRENT_CLIENT_PARAMS_VERSION
+
+
+PARAMS_EXTENSION = '.params'
+
+# optional integer settings: (default, minimum)
+_INTEGER_SETTINGS = {
+    'internal_timescale': (1, 1),
+    'ticks_per_sensor_sample': (1, 1),
+    'center_block_size_extra': (0, 0),
+    'center_block_stride': (1, 1),
+    'random_seed': (42, None),
+    'debug_sample_interval': (1, 1),
+    'action_chunk_size': (1, 1),
+}
+# optional settings sections, configured by json objects
+_SECTION_SETTINGS = ['history', 'trace', 'transport', 'model_upload', 'model_cache', 'render', 'replay', 'sensor_features', 'request_policy', 'compression']
+
+# keys of sensor entries that only the client reads, left out of the /initSession 'sensors' argument
+_CLIENT_SENSOR_KEYS = ['fan_out']
+
+_compiled_specs = {}
+_compiled_specs_lock = threading.Lock()
+
+
+def _freeze(value):
+    """ read-only copy of parsed json: dicts become mapping proxies and lists become tuples """
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(element) for key, element in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(element) for element in value)
+    return value
+
+
+def _thaw(value):
+    """ mutable copy of frozen json: mapping proxies become dicts and tuples become lists """
+    if isinstance(value, MappingProxyType):
+        return {key: _thaw(element) for key, element in value.items()}
+    if isinstance(value, tuple):
+        return [_thaw(element) for element in value]
+    return value
+
+
+def _is_integer(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _expand_names(entries, kind, errors):
+    """ the sensor or motor names of the .params entries in declaration order, validating each entry """
+    if not isinstance(entries, list) or len(entries) == 0:
+        errors.append("'" + kind + "' must be a non-empty list")
+        return []
+    names = []
+    for index, entry in enumerate(entries):
+        entry_name = kind + "[" + str(index) + "]"
+        if not isinstance(entry, dict):
+            errors.append(entry_name + " must be an object")
+            continue
+        name = safe_dict_get(entry, 'name', None)
+        entry_names = name if isinstance(name, list) else [name]
+        if len(entry_names) == 0 or not all(isinstance(element, str) and len(element) > 0 for element in entry_names):
+            errors.append(entry_name + " 'name' must be a name or a non-empty list of names")
+            continue
+        names += entry_names
+    seen_names = set()
+    for name in names:
+        if name in seen_names:
+            errors.append("duplicate " + kind + " name '" + name + "'")
+        seen_names.add(name)
+    return names
+
+
+def _sensor_fan_out(entries, sensor_names, errors):
+    """ the logical names of sensor entries declaring 'fan_out', mapped to the registered names they fan out to """
+    fan_out = {}
+    if not isinstance(entries, list):
+        return fan_out
+    for index, entry in enumerate(entries):
+        if not isinstance(entry, dict) or 'fan_out' not in entry:
+            continue
+        entry_name = "sensors[" + str(index) + "]"
+        logical_name = entry['fan_out']
+        names = safe_dict_get(entry, 'name', None)
+        if not isinstance(logical_name, str) or len(logical_name) == 0:
+            errors.append(entry_name + " 'fan_out' must be a name")
+        elif not isinstance(names, list):
+            errors.append(entry_name + " 'fan_out' needs a list of names")
+        elif logical_name in fan_out or (logical_name in sensor_names and logical_name not in names):
+            errors.append("duplicate sensor name '" + logical_name + "'")
+        else:
+            fan_out[logical_name] = tuple(names)
+    return fan_out
+
+
+class SessionSpec():
+    """ SessionSpec
+
+    A client .params file compiled into an immutable, validated session specification: the parsed
+    settings with their defaults applied, the expanded sensor and motor names, and the /initSession
+    arguments, computed once per file. Specs are cached by the sha256 digest of the file contents
+    (see :func:`load_session_spec`), so sessions started from the same .params file share one spec.
+
+    Attributes:
+
+    - `params`: the parsed settings as a read-only mapping (nested objects are read-only mappings, lists are tuples)
+    - `digest`: the sha256 hex digest of the file contents
+    - `sensor_names`, `motor_names`: the expanded names in declaration order, as tuples
+    - `num_sensors`, `num_motors`, `has_multi_motors`
+    - `sensor_fan_out`: the logical names of sensor entries declaring 'fan_out', mapped to the tuple of registered
+      sensor names each fans out to, as a read-only mapping
+    - `logical_sensor_names`: the sensor names the session's values are keyed by, in declaration order: the registered
+      names, with each fanned out entry replaced by its logical name
+    - `debug_enabled`, `debug_sample_interval`, `debug_sample_period`, `wire_format`, `json_backend`,
+      `action_chunk_size`: the session settings with their defaults applied
+    - `init_params`: the /initSession url arguments, as a read-only mapping
+
+    :param params: The parsed client params
+    :type params: dict
+    :param file_name: The .params file the settings were read from, used in error messages
+    :type file_name: str
+    :param digest: The sha256 hex digest of the file contents. Defaults to the digest of the json encoded params.
+    :type digest: str
+    :raises ValueError: If the settings are invalid, listing every problem found
+    """
+    def __init__(self, params, file_name='<params>', digest=None):
+        errors = []
+        if not isinstance(params, dict):
+            raise ValueError(str(file_name) + ": client params must be a json object")
+        if safe_dict_get(params, 'version', None) != CURRENT_CLIENT_PARAMS_VERSION:
+            errors.append("version " + str(safe_dict_get(params, 'version', None)) + " not supported, expected " +
+                str(CURRENT_CLIENT_PARAMS_VERSION))
+        sensor_names = _expand_names(safe_dict_get(params, 'sensors', None), 'sensors', errors)
+        motor_names = _expand_names(safe_dict_get(params, 'motors', None), 'motors', errors)
+        sensor_fan_out = _sensor_fan_out(safe_dict_get(params, 'sensors', None), sensor_names, errors)
+        settings = {}
+        for key, (default, minimum) in _INTEGER_SETTINGS.items():
+            value = safe_dict_get(params, key, default)
+            if not _is_integer(value) or (minimum is not None and value < minimum):
+                errors.append("'" + key + "' must be an integer" + (" >= " + str(minimum) if minimum is not None else ""))
+            settings[key] = value
+        debug_sample_period = safe_dict_get(params, 'debug_sample_period', 0.0)
+        if not _is_number(debug_sample_period) or debug_sample_period < 0:
+            errors.append("'debug_sample_period' must be a number >= 0")
+        debug_enabled = safe_dict_get(params, 'enable_debug', False)
+        if not isinstance(debug_enabled, bool):
+            errors.append("'enable_debug' must be true or false")
+        for key in ['wire_format', 'json_backend']:
+            if key in params and not isinstance(params[key], str):
+                errors.append("'" + key + "' must be a string")
+        for key in _SECTION_SETTINGS:
+            if safe_dict_get(params, key, None) is not None and not isinstance(params[key], dict):
+                errors.append("'" + key + "' must be an object")
+        phase_timing = safe_dict_get(params, 'phase_timing', None)
+        if phase_timing is not None and not isinstance(phase_timing, (bool, dict)):
+            errors.append("'phase_timing' must be true, false or an object")
+        if len(errors) > 0:
+            raise ValueError("Invalid client params " + str(file_name) + ":\n- " + "\n- ".join(errors))
+
+        set_attribute = super().__setattr__
+        set_attribute('file_name', file_name)
+        set_attribute('digest', digest if digest is not None else hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest())
+        set_attribute('params', _freeze(params))
+        set_attribute('version', params['version'])
+        set_attribute('sensor_names', tuple(sensor_names))
+        set_attribute('motor_names', tuple(motor_names))
+        set_attribute('num_sensors', len(sensor_names))
+        set_attribute('num_motors', len(motor_names))
+        set_attribute('sensor_fan_out', MappingProxyType(sensor_fan_out))
+        logical_names = {names[0]: logical_name for logical_name, names in sensor_fan_out.items()}
+        fanned_out_names = set(name for names in sensor_fan_out.values() for name in names[1:])
+        set_attribute('logical_sensor_names', tuple(safe_dict_get(logical_names, name, name)
+            for name in sensor_names if name not in fanned_out_names))
+        set_attribute('has_multi_motors', any(safe_dict_get(entry, 'type', None) == 'MULTI' for entry in params['motors']))
+        set_attribute('debug_enabled', debug_enabled)
+        set_attribute('debug_sample_interval', settings['debug_sample_interval'])
+        set_attribute('debug_sample_period', debug_sample_period)
+        set_attribute('wire_format', safe_dict_get(params, 'wire_format', 'json'))
+        set_attribute('json_backend', safe_dict_get(params, 'json_backend', 'auto'))
+        set_attribute('action_chunk_size', settings['action_chunk_size'])
+        set_attribute('init_params', MappingProxyType({
+            'version': params['version'],
+            'internal_timescale': settings['internal_timescale'],
+            'ticks_per_sensor_sample': settings['ticks_per_sensor_sample'],
+            'center_block_size_extra': settings['center_block_size_extra'],
+            'center_block_stride': settings['center_block_stride'],
+            'random_seed': settings['random_seed'],
+            'motors': json.dumps(params['motors']),
+            'sensors': json.dumps([{key: value for key, value in entry.items() if key not in _CLIENT_SENSOR_KEYS}
+                for entry in params['sensors']]),
+        }))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("SessionSpec is immutable")
+
+    def get(self, key, default=None):
+        """ Returns a setting of the .params file, or `default` if it isn't set """
+        return safe_dict_get(self.params, key, default)
+
+    def copy_params(self):
+        """ Returns a mutable deep copy of the parsed settings, as parsed from the json file (dicts and lists)
+
+        :rtype: dict
+        """
+        return _thaw(self.params)
+
+
+def load_session_spec(file_name):
+    """ Returns the compiled spec of a client .params file. The file is read on every call, so edits are picked
+    up, but it is only parsed and validated when its contents haven't been compiled before.
+
+    :param file_name: Path of a .params file
+    :type file_name: str
+    :rtype: SessionSpec
+    :raises ValueError: If the file isn't a .params file, or its settings are invalid
+    """
+    if os.path.splitext(file_name)[1] != PARAMS_EXTENSION:
+        raise ValueError("config files must be of type " + PARAMS_EXTENSION + " got " + str(file_name))
+    with open(file_name, 'rb') as params_file:
+        contents = params_file.read()
+    digest = hashlib.sha256(contents).hexdigest()
+    with _compiled_specs_lock:
+        spec = safe_dict_get(_compiled_specs, digest, None)
+    if spec is None:
+        spec = SessionSpec(json.loads(contents), file_name, digest)
+        with _compiled_specs_lock:
+            spec = _compiled_specs.setdefault(digest, spec)
+    return spec
+
+
+def clear_session_spec_cache():
+    """ Drops all compiled specs """
+    with _compiled_specs_lock:
+        _compiled_specs.clear()
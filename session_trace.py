@@ -0,0 +1,335 @@
+import json, os, queue, threading, time
+import numpy as np
+
+from utils import safe_dict_get
+
+
+TRACE_FORMAT_VERSION = 1
+TRACE_INDEX_FILE = 'index.json'
+DEFAULT_SEGMENT_TICKS = 65536
+# number of full segments that may wait for the writer before recording blocks
+MAX_PENDING_SEGMENTS = 4
+
+SENSOR_STREAM = 'sensors'
+MOTOR_STREAM = 'motors'
+DEBUG_STREAM = 'debug'
+# seconds since recording started at which the sensor values of each tick were sent
+TIME_STREAM = 'times'
+TIME_COLUMN = 'time'
+
+_STOP_WRITING = object()
+
+
+class _TraceStream():
+    """ buffers the rows of one stream (sensors, motors or debug) into column-major segments """
+    def __init__(self, name, segment_ticks):
+        self.name = name
+        self.segment_ticks = segment_ticks
+        self.columns = None
+        self.segment_count = 0
+        self._column_slices = None
+        self._buffer = None
+        self._length = 0
+
+    def _layout(self, named_values):
+        # row 0 of every segment holds the tick at which each value was recorded
+        self.columns = []
+        self._column_slices = {}
+        next_row = 1
+        for name, value in named_values.items():
+            width = len(value) if isinstance(value, (list, tuple, np.ndarray)) else 0
+            self.columns.append([name, width])
+            self._column_slices[name] = slice(next_row, next_row + max(width, 1))
+            next_row += max(width, 1)
+        self._num_rows = next_row
+
+    def append(self, tick, named_values):
+        """ records one tick, returns a full segment to write or `None` """
+        if self.columns is None:
+            self._layout(named_values)
+        if self._buffer is None:
+            self._buffer = np.full((self._num_rows, self.segment_ticks), np.nan)
+            self._length = 0
+        column = self._buffer[:, self._length]
+        column[0] = tick
+        for name, value in named_values.items():
+            value_slice = self._column_slices.get(name)
+            if value_slice is not None:
+                column[value_slice] = value
+        self._length += 1
+        if self._length == self.segment_ticks:
+            return self.take_segment()
+        return None
+
+    def append_row(self, tick, values, column_names):
+        """ records one tick of scalar values laid out in `column_names` order, returns a full segment to write or `None` """
+        if self.columns is None:
+            self.columns = [[name, 0] for name in column_names]
+            self._column_slices = {name: slice(row, row + 1) for row, name in enumerate(column_names, 1)}
+            self._num_rows = len(column_names) + 1
+        if self._buffer is None:
+            self._buffer = np.full((self._num_rows, self.segment_ticks), np.nan)
+            self._length = 0
+        self._buffer[0, self._length] = tick
+        self._buffer[1:, self._length] = values
+        self._length += 1
+        if self._length == self.segment_ticks:
+            return self.take_segment()
+        return None
+
+    def append_array(self, tick, values, layout):
+        """ records one tick of values laid out by an :class:`array_layout.ArrayLayout`, returns a full segment to write or `None` """
+        if self.columns is None:
+            self._layout(layout.template())
+        if self._buffer is None:
+            self._buffer = np.full((self._num_rows, self.segment_ticks), np.nan)
+            self._length = 0
+        self._buffer[0, self._length] = tick
+        self._buffer[1:, self._length] = values
+        self._length += 1
+        if self._length == self.segment_ticks:
+            return self.take_segment()
+        return None
+
+    def take_segment(self):
+        """ hands over the buffered segment (possibly partial), or `None` if empty """
+        if self._buffer is None or self._length == 0:
+            return None
+        segment = self._buffer[:, :self._length]
+        self._buffer = None
+        self._length = 0
+        return segment
+
+
+class TraceRecorder():
+    """ TraceRecorder
+
+    Streams the sensor, motor and debug values of every tick to disk, so that a full session trace
+    can be kept without holding it in memory. The time at which each tick's sensor values were sent is
+    recorded as well, so that a trace can be replayed at its recorded timing (see :mod:`replay`). Each stream is buffered into column-major segments of
+    `segment_ticks` ticks which are written by a background thread as `.npy` files, alongside a small
+    `index.json` listing the columns and finished segments. Use :class:`TraceReader` to open a
+    finished or in-progress trace.
+
+    If the writer falls behind by more than a few segments, recording blocks until it catches up,
+    so client memory stays bounded regardless of run length. If writing fails (e.g. the disk is full),
+    the next call to a `record_*()` method or `close()` raises the error.
+
+    :param directory: Directory to write the trace to. Created if needed, must not hold a trace already.
+    :type directory: str
+    :param segment_ticks: Number of ticks per segment file. Defaults to 65536.
+    :type segment_ticks: int
+    """
+    def __init__(self, directory, segment_ticks=DEFAULT_SEGMENT_TICKS):
+        assert(segment_ticks > 0)
+        self.directory = directory
+        self.segment_ticks = segment_ticks
+        if os.path.exists(os.path.join(directory, TRACE_INDEX_FILE)):
+            raise ValueError("Trace directory " + directory + " already holds a trace")
+        os.makedirs(directory, exist_ok=True)
+        self.start_time = time.perf_counter()
+        self._streams = {
+            stream_name: _TraceStream(stream_name, segment_ticks)
+            for stream_name in [SENSOR_STREAM, MOTOR_STREAM, DEBUG_STREAM, TIME_STREAM]}
+        self._index = {'version': TRACE_FORMAT_VERSION, 'streams': {}}
+        self._pending_segments = queue.Queue(maxsize=MAX_PENDING_SEGMENTS)
+        # the error that stopped the writer, if any
+        self._error = None
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
+    def _record(self, stream_name, tick, named_values):
+        self._queue_segment(stream_name, self._streams[stream_name].append(tick, named_values))
+
+    def _queue_segment(self, stream_name, segment):
+        if segment is not None:
+            self._put_pending((stream_name, segment))
+
+    def _put_pending(self, pending):
+        """ hands a segment (or the stop request) to the writer, raises the writer's error if it stopped """
+        while self._error is None:
+            try:
+                self._pending_segments.put(pending, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+        raise RuntimeError("Writing trace " + self.directory + " failed") from self._error
+
+    def record_sensors(self, tick, named_sensor_dict):
+        """ Records the sensor values sent to the server at the given tick """
+        self._record(SENSOR_STREAM, tick, named_sensor_dict)
+        self._queue_segment(TIME_STREAM, self._streams[TIME_STREAM].append_row(tick, time.perf_counter() - self.start_time, [TIME_COLUMN]))
+
+    def record_motors(self, tick, named_motor_dict):
+        """ Records the motor values received from the server at the given tick """
+        self._record(MOTOR_STREAM, tick, named_motor_dict)
+
+    def record_sensor_array(self, tick, sensor_values, layout):
+        """ Records the sensor values sent to the server at the given tick, laid out by an :class:`array_layout.ArrayLayout` """
+        self._queue_segment(SENSOR_STREAM, self._streams[SENSOR_STREAM].append_array(tick, sensor_values, layout))
+        self._queue_segment(TIME_STREAM, self._streams[TIME_STREAM].append_row(tick, time.perf_counter() - self.start_time, [TIME_COLUMN]))
+
+    def record_motor_array(self, tick, motor_values, layout):
+        """ Records the motor values received from the server at the given tick, laid out by an :class:`array_layout.ArrayLayout` """
+        self._queue_segment(MOTOR_STREAM, self._streams[MOTOR_STREAM].append_array(tick, motor_values, layout))
+
+    def record_debug_data(self, tick, debug_values, column_names):
+        """ Records the debug data received from the server at the given tick, as a row of scalar values
+        named by `column_names` (see :meth:`history.DebugDataStore.get_column_names`) """
+        self._queue_segment(DEBUG_STREAM, self._streams[DEBUG_STREAM].append_row(tick, debug_values, column_names))
+
+    def close(self):
+        """ Writes the remaining partial segments and waits for the writer to finish """
+        if self._writer is None:
+            return
+        writer = self._writer
+        self._writer = None
+        try:
+            for stream_name, stream in self._streams.items():
+                self._queue_segment(stream_name, stream.take_segment())
+            self._put_pending(_STOP_WRITING)
+        finally:
+            writer.join()
+        if self._error is not None:
+            raise RuntimeError("Writing trace " + self.directory + " failed") from self._error
+
+    def _write_loop(self):
+        try:
+            while True:
+                pending = self._pending_segments.get()
+                if pending is _STOP_WRITING:
+                    break
+                stream_name, segment = pending
+                self._write_segment(self._streams[stream_name], segment)
+        except Exception as e:
+            self._error = e
+
+    def _write_segment(self, stream, segment):
+        file_name = stream.name + '_' + str(stream.segment_count).zfill(6) + '.npy'
+        temp_path = os.path.join(self.directory, file_name + '.tmp')
+        with open(temp_path, 'wb') as segment_file:
+            np.save(segment_file, np.ascontiguousarray(segment))
+        os.replace(temp_path, os.path.join(self.directory, file_name))
+        stream.segment_count += 1
+        stream_index = self._index['streams'].setdefault(stream.name, {'columns': stream.columns, 'segments': []})
+        stream_index['segments'].append({'file': file_name, 'ticks': int(segment.shape[1])})
+        # readers only see segments that are listed in a fully written index
+        temp_index_path = os.path.join(self.directory, TRACE_INDEX_FILE + '.tmp')
+        with open(temp_index_path, 'w') as index_file:
+            json.dump(self._index, index_file)
+        os.replace(temp_index_path, os.path.join(self.directory, TRACE_INDEX_FILE))
+
+
+class TraceReader():
+    """ TraceReader
+
+    Opens a trace written by :class:`TraceRecorder`. Segment files are memory-mapped when accessed,
+    so opening a trace is cheap and only the columns that are read are paged in. For an in-progress
+    trace, call `refresh()` to pick up segments written since the reader was opened.
+
+    :param directory: The trace directory
+    :type directory: str
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self._segment_cache = {}
+        self.refresh()
+
+    def refresh(self):
+        """ Re-reads the trace index """
+        index_path = os.path.join(self.directory, TRACE_INDEX_FILE)
+        if os.path.exists(index_path):
+            with open(index_path) as index_file:
+                self._index = json.load(index_file)
+        else:
+            self._index = {'version': TRACE_FORMAT_VERSION, 'streams': {}}
+        if self._index['version'] != TRACE_FORMAT_VERSION:
+            raise ValueError("Unsupported trace version " + str(self._index['version']))
+
+    def _stream_index(self, stream_name):
+        return safe_dict_get(self._index['streams'], stream_name, {'columns': [], 'segments': []})
+
+    def get_names(self, stream_name=SENSOR_STREAM):
+        """ Returns the recorded names of a stream ('sensors', 'motors', 'debug' or 'times')
+
+        :rtype: list
+        """
+        return [name for name, _ in self._stream_index(stream_name)['columns']]
+
+    def get_num_ticks(self, stream_name=SENSOR_STREAM):
+        """ Returns the number of recorded ticks in the finished segments of a stream
+
+        :rtype: int
+        """
+        return sum(segment['ticks'] for segment in self._stream_index(stream_name)['segments'])
+
+    def iter_segments(self, stream_name=SENSOR_STREAM):
+        """ Yields the memory-mapped segments of a stream. Each segment is a (rows x ticks) array
+        whose row 0 holds the recorded ticks, followed by one row per value column. """
+        for segment in self._stream_index(stream_name)['segments']:
+            path = os.path.join(self.directory, segment['file'])
+            if path not in self._segment_cache:
+                self._segment_cache[path] = np.load(path, mmap_mode='r')
+            yield self._segment_cache[path]
+
+    def _row_slice(self, stream_name, name):
+        next_row = 1
+        for column_name, width in self._stream_index(stream_name)['columns']:
+            if column_name == name:
+                return slice(next_row, next_row + max(width, 1)), width
+            next_row += max(width, 1)
+        raise KeyError(name)
+
+    def iter_history(self, name, stream_name=SENSOR_STREAM):
+        """ Yields the values of a name segment by segment, as memory-mapped views without copying """
+        row_slice, width = self._row_slice(stream_name, name)
+        for segment in self.iter_segments(stream_name):
+            yield segment[row_slice].T if width > 0 else segment[row_slice.start]
+
+    def get_history(self, name, stream_name=SENSOR_STREAM):
+        """ Returns all recorded values of a name, reading only that name's rows from disk
+
+        :param name: A sensor or motor name, or a flattened debug name such as 'global_stability_rate'
+            or 'block_stability_rates/<block name>'
+        :type name: str
+        :param stream_name: 'sensors', 'motors', 'debug' or 'times'
+        :type stream_name: str
+        :return: A 1D array of values, 2D (ticks x elements) for list values
+        :rtype: np.ndarray
+        """
+        segments = list(self.iter_history(name, stream_name))
+        if len(segments) == 0:
+            return np.empty(0)
+        return np.concatenate(segments)
+
+    def get_ticks(self, stream_name=SENSOR_STREAM):
+        """ Returns the ticks at which the rows of a stream were recorded
+
+        :rtype: np.ndarray
+        """
+        segments = [segment[0] for segment in self.iter_segments(stream_name)]
+        if len(segments) == 0:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(segments).astype(np.int64)
+
+
+def create_trace_recorder(trace_params, session_id):
+    """ Creates a trace recorder from the optional 'trace' entry of a client .params file, e.g.
+    `{"directory": "./traces", "segment_ticks": 65536}`. Each session writes to its own
+    'session_<id>' subdirectory, or 'session_<id>_<n>' if an earlier run already used that name
+    (e.g. a session id the server reused after a restart).
+
+    :return: A trace recorder, or `None` if tracing isn't enabled
+    :rtype: TraceRecorder
+    """
+    if trace_params is None:
+        return None
+    directory = os.path.join(trace_params['directory'], 'session_' + str(session_id))
+    run_directory = directory
+    run = 1
+    while os.path.exists(run_directory) and len(os.listdir(run_directory)) > 0:
+        run_directory = directory + '_' + str(run)
+        run += 1
+    if run_directory != directory:
+        print("Trace directory", directory, "is already in use, recording to", run_directory)
+    return TraceRecorder(run_directory, safe_dict_get(trace_params, 'segment_ticks', DEFAULT_SEGMENT_TICKS))
@@ -0,0 +1,15 @@
+import os, sys
+
+import pytest
+
+# the client modules are flat modules at the repository root
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+CARTPOLE_PARAMS = os.path.join(REPO_ROOT, 'examples', 'cartpole', 'example_cartpole.params')
+
+
+@pytest.fixture
+def cartpole_params():
+    return CARTPOLE_PARAMS
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from array_layout import ArrayLayout
+from history import DebugDataStore, HistoryStore, create_history_stores
+
+
+NAME_MAP = {'b': 1, 'a': 0}
+
+
+def _fill(store, num_ticks):
+    for tick in range(num_ticks):
+        store.append({'a': float(tick), 'b': [10.0 * tick, 10.0 * tick + 1]})
+
+
+def test_growing_store_keeps_everything():
+    store = HistoryStore(NAME_MAP, initial_capacity=4)
+    _fill(store, 10)
+    assert len(store) == 10
+    np.testing.assert_array_equal(store.get_history('a'), np.arange(10))
+    assert store.get_history('b').shape == (10, 2)
+    assert store[3] == {'a': 3.0, 'b': [30.0, 31.0]}
+    assert store.get_history('missing') is None
+
+
+@pytest.mark.parametrize('num_ticks', [3, 5, 6, 12, 13])
+def test_ring_buffer_keeps_the_last_ticks_in_order(num_ticks):
+    store = HistoryStore(NAME_MAP, max_length=5)
+    _fill(store, num_ticks)
+    kept = np.arange(max(num_ticks - 5, 0), num_ticks)
+    assert len(store) == len(kept)
+    np.testing.assert_array_equal(store.get_ticks(), kept)
+    np.testing.assert_array_equal(store.get_history('a'), kept)
+    np.testing.assert_array_equal(store.get_history('b')[:, 1], 10.0 * kept + 1)
+    assert [row['a'] for row in store] == kept.tolist()
+    assert store[-1] == {'a': float(num_ticks - 1), 'b': [10.0 * (num_ticks - 1), 10.0 * (num_ticks - 1) + 1]}
+
+
+def test_history_views_are_read_only():
+    store = HistoryStore(NAME_MAP, max_length=5)
+    _fill(store, 7)
+    with pytest.raises(ValueError):
+        store.get_history('a')[0] = 1.0
+
+
+def test_interval_records_every_kth_tick():
+    store = HistoryStore(NAME_MAP, max_length=3, interval=4)
+    _fill(store, 20)
+    np.testing.assert_array_equal(store.get_ticks(), [8, 12, 16])
+    np.testing.assert_array_equal(store.get_history('a'), [8.0, 12.0, 16.0])
+
+
+def test_append_array_matches_append():
+    layout = ArrayLayout(NAME_MAP, {'b': 2})
+    dict_store = HistoryStore(NAME_MAP, max_length=4)
+    array_store = HistoryStore(NAME_MAP, max_length=4)
+    for tick in range(9):
+        values = {'a': 0.5 * tick, 'b': [float(tick), -float(tick)]}
+        dict_store.append(values)
+        array_store.append_array(layout.to_array(values), layout)
+    np.testing.assert_array_equal(array_store.get_ticks(), dict_store.get_ticks())
+    assert list(array_store) == list(dict_store)
+
+
+def test_debug_data_ring_buffer():
+    store = DebugDataStore({'first': 0, 'second': 1}, max_length=3)
+    for tick in range(7):
+        store.append(tick, {
+            'global_stability_rate': 0.1 * tick, 'global_energy_estimate': float(tick),
+            'block_stability_rates': {'1': float(tick), '0': -float(tick)},
+            'block_energy_estimates': {'0': 1.0, '1': 2.0},
+            'block_stable_times': {'0': 0.0, '1': 0.0}})
+    np.testing.assert_array_equal(store.get_ticks(), [4, 5, 6])
+    np.testing.assert_array_equal(store.get_global_history('global_energy_estimate'), [4.0, 5.0, 6.0])
+    np.testing.assert_array_equal(store.get_block_history('block_stability_rates'), [[-4.0, 4.0], [-5.0, 5.0], [-6.0, 6.0]])
+    assert store[-1]['block_stability_rates'] == {'first': -6.0, 'second': 6.0}
+    assert store.get_column_names()[:3] == ['global_stability_rate', 'global_energy_estimate', 'block_stability_rates/first']
+
+
+def test_create_history_stores():
+    sensor_history, motor_history, debug_history = create_history_stores({'max_length': 2, 'interval': 3}, {'s': 0}, {'m': 0})
+    assert sensor_history.max_length == 2 and sensor_history.interval == 3
+    assert motor_history.max_length == 2 and debug_history.max_length == 2
+    sensor_history, _, _ = create_history_stores(None, {'s': 0}, {'m': 0})
+    assert sensor_history.max_length is None and sensor_history.interval == 1
@@ -0,0 +1,80 @@
+import json
+
+import numpy as np
+import pytest
+
+from compression import get_codec
+from model_cache import get_model_digest
+from model_format import (MODEL_ALIGNMENT, MODEL_CONTENT_TYPE, SUPPORTED_COMPRESSIONS, compress_chunks, create_model_upload,
+    iter_model_chunks, load_model_data, read_model, save_model_data, write_model_file)
+
+
+def _model_data():
+    random = np.random.RandomState(0)
+    return {
+        'weights': [random.normal(size=(3, 5)).astype(np.float32), random.normal(size=17), np.arange(12, dtype=np.int64).reshape(2, 3, 2),
+                    np.asfortranarray(random.normal(size=(4, 6))), np.arange(6, dtype='>f8')],
+        'values': random.normal(size=7)}
+
+
+def _assert_same_model(loaded, model_data):
+    assert len(loaded['weights']) == len(model_data['weights'])
+    for loaded_array, array in zip(loaded['weights'] + [loaded['values']], model_data['weights'] + [model_data['values']]):
+        assert loaded_array.shape == array.shape
+        assert loaded_array.dtype == array.dtype.newbyteorder('<')
+        np.testing.assert_array_equal(loaded_array, array)
+
+
+def test_save_and_mmap_round_trip(tmp_path):
+    model_data = _model_data()
+    path = str(tmp_path / 'model.tfmodel')
+    save_model_data(model_data, path)
+    loaded = load_model_data(path)
+    _assert_same_model(loaded, model_data)
+    # arrays are aligned, read-only views of the mapped file
+    for array in loaded['weights'] + [loaded['values']]:
+        assert not array.flags.writeable
+        assert array.ctypes.data % MODEL_ALIGNMENT == 0
+    assert get_model_digest(loaded) == get_model_digest(model_data)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 1 << 20])
+def test_chunked_stream_reads_back(chunk_size):
+    model_data = _model_data()
+    chunks = list(iter_model_chunks(model_data, chunk_size))
+    assert max(len(chunk) for chunk in chunks[1:] if not isinstance(chunk, bytes)) <= chunk_size
+    _assert_same_model(read_model(b''.join(bytes(chunk) for chunk in chunks)), model_data)
+
+
+@pytest.mark.parametrize('compression', SUPPORTED_COMPRESSIONS[1:])
+def test_compressed_stream_reads_back(compression):
+    model_data = _model_data()
+    compressed = b''.join(compress_chunks(iter_model_chunks(model_data, 64), compression))
+    _assert_same_model(read_model(get_codec(compression).decompress(compressed)), model_data)
+
+
+def test_invalid_models_are_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        read_model(b'XXXX' + bytes(8))
+    path = str(tmp_path / 'model.tfmodel')
+    with pytest.raises(ValueError):
+        write_model_file([b'not a model at all'], path)
+    # a failed write leaves neither the model nor the temporary file behind
+    assert list(tmp_path.iterdir()) == []
+    with pytest.raises(ValueError):
+        compress_chunks([b''], 'lzma')
+
+
+def test_model_uploads():
+    model_data = _model_data()
+    body, headers = create_model_upload(model_data, {'format': 'json'})
+    assert headers is None
+    assert np.allclose(json.loads(body)['values'], model_data['values'])
+    body, headers = create_model_upload(model_data)
+    assert headers == {'Content-Type': MODEL_CONTENT_TYPE}
+    _assert_same_model(read_model(b''.join(bytes(chunk) for chunk in body)), model_data)
+    body, headers = create_model_upload(model_data, {'compression': 'deflate'})
+    assert headers['Content-Encoding'] == 'deflate'
+    _assert_same_model(read_model(get_codec('deflate').decompress(b''.join(body))), model_data)
+    with pytest.raises(ValueError):
+        create_model_upload(model_data, {'format': 'pickle'})
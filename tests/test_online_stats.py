@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+from array_layout import ArrayLayout
+from online_stats import OnlineStatistics
+
+
+def _random_values(num_ticks, seed=0):
+    random = np.random.RandomState(seed)
+    return random.normal(3.0, 2.0, num_ticks), random.uniform(-1.0, 1.0, (num_ticks, 2))
+
+
+@pytest.mark.parametrize('block_size', [1, 7, 256, 5000])
+def test_merged_blocks_match_numpy(block_size):
+    scalar_values, list_values = _random_values(1000)
+    statistics = OnlineStatistics({'s': 0, 'm': 1}, block_size=block_size)
+    for scalar, values in zip(scalar_values, list_values):
+        statistics.update({'s': scalar, 'm': values.tolist()})
+    results = statistics.get_statistics()
+    assert list(results) == ['s', 'm[0]', 'm[1]']
+    for channel_name, values in [('s', scalar_values), ('m[0]', list_values[:, 0]), ('m[1]', list_values[:, 1])]:
+        channel = results[channel_name]
+        assert channel['count'] == len(values)
+        assert channel['min'] == values.min() and channel['max'] == values.max()
+        assert channel['mean'] == pytest.approx(values.mean(), rel=1e-12)
+        assert channel['variance'] == pytest.approx(values.var(ddof=1), rel=1e-10)
+
+
+def test_statistics_can_be_queried_while_values_arrive():
+    scalar_values, _ = _random_values(600)
+    statistics = OnlineStatistics({'s': 0}, block_size=64)
+    for tick, scalar in enumerate(scalar_values):
+        statistics.update({'s': scalar})
+        if tick in (0, 100, 299):
+            channel = statistics.get_statistics()['s']
+            assert channel['count'] == tick + 1
+            assert channel['mean'] == pytest.approx(scalar_values[:tick + 1].mean(), rel=1e-12)
+    assert statistics.get_statistics()['s']['variance'] == pytest.approx(scalar_values.var(ddof=1), rel=1e-10)
+
+
+def test_missing_values_are_skipped():
+    statistics = OnlineStatistics({'a': 0, 'b': 1}, block_size=4)
+    for tick in range(10):
+        statistics.update({'a': float(tick), 'b': float(tick)} if tick % 2 == 0 else {'a': float(tick)})
+    results = statistics.get_statistics()
+    assert results['a']['count'] == 10 and results['b']['count'] == 5
+    assert results['b']['mean'] == pytest.approx(4.0)
+    assert results['b']['variance'] == pytest.approx(np.var([0, 2, 4, 6, 8], ddof=1))
+
+
+def test_quantiles_are_exact_below_the_sketch_size():
+    values = np.arange(101, dtype=np.float64)
+    np.random.RandomState(1).shuffle(values)
+    statistics = OnlineStatistics({'s': 0}, block_size=16, sketch_size=256)
+    for value in values:
+        statistics.update({'s': value})
+    channel = statistics.get_statistics()['s']
+    assert channel['p50'] == 50.0
+    assert channel['p95'] == 95.0
+
+
+def test_quantiles_stay_within_the_rank_error():
+    scalar_values, _ = _random_values(20000)
+    statistics = OnlineStatistics({'s': 0}, sketch_size=128)
+    for scalar in scalar_values:
+        statistics.update({'s': scalar})
+    channel = statistics.get_statistics()['s']
+    for key, quantile in [('p50', 0.5), ('p95', 0.95)]:
+        rank = np.mean(scalar_values <= channel[key])
+        assert abs(rank - quantile) < 0.03
+
+
+def test_update_array_matches_update():
+    layout = ArrayLayout({'s': 0, 'm': 1}, {'m': 2})
+    scalar_values, list_values = _random_values(300)
+    dict_statistics = OnlineStatistics({'s': 0, 'm': 1}, block_size=32)
+    array_statistics = OnlineStatistics({'s': 0, 'm': 1}, block_size=32)
+    for scalar, values in zip(scalar_values, list_values):
+        named_values = {'s': scalar, 'm': values.tolist()}
+        dict_statistics.update(named_values)
+        array_statistics.update_array(layout.to_array(named_values), layout)
+    assert array_statistics.get_statistics() == dict_statistics.get_statistics()
+
+
+def test_no_values():
+    statistics = OnlineStatistics({'s': 0})
+    assert statistics.get_statistics() == {}
@@ -0,0 +1,193 @@
+import contextlib, io, math, threading, time
+
+import pytest
+import requests
+
+from benchmarks.local_server import LocalThoughtForgeServer
+from request_policy import RequestPolicy, create_request_policy
+from thoughtforge_client import BaseThoughtForgeClientSession
+
+
+class _Response():
+    """ the parts of requests.Response the policy uses """
+    def __init__(self, status_code=200):
+        self.status_code = status_code
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class _TickSession(BaseThoughtForgeClientSession):
+    """ a session without an environment that stops after `num_ticks` updates """
+    def __init__(self, file_name, num_ticks, **session_kwargs):
+        self.num_ticks = num_ticks
+        self.ticks = 0
+        super().__init__(file_name, **session_kwargs)
+
+    def update(self, motor_action_dict):
+        self.ticks += 1
+        if self.ticks >= self.num_ticks:
+            self.stop_sim()
+        return {name: math.sin(0.01 * self.ticks + index) for index, name in enumerate(self.sensor_name_map)}
+
+
+def _run_session(params_file, server, num_ticks, policy):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return _TickSession(params_file, num_ticks, host=server.host, port=server.port, protocol='http', api_key='test',
+            request_policy=policy)
+
+
+def _retry_policy(**policy_args):
+    return RequestPolicy(deadline=5.0, max_retries=2, retry_backoff=0.001, **policy_args)
+
+
+def test_request_without_policy_section():
+    assert create_request_policy(None) is None
+    policy = create_request_policy({'deadline': 1.5, 'hedge_after': 0.01})
+    assert policy.deadline == 1.5 and policy.hedge_after == 0.01 and policy.repeats_requests
+
+
+def test_non_idempotent_request_is_sent_once():
+    policy = _retry_policy()
+    attempts = []
+    def send(timeout):
+        attempts.append(timeout)
+        return _Response(503)
+    response = policy.request(send, idempotent=False)
+    assert response.status_code == 503
+    assert len(attempts) == 1
+    assert policy.counters['retries'] == 0 and policy.counters['failures'] == 1
+
+
+def test_idempotent_request_is_retried_until_it_succeeds():
+    policy = _retry_policy()
+    responses = [_Response(503), _Response(502), _Response(200)]
+    sent = []
+    def send(timeout):
+        sent.append(responses[len(sent)])
+        return sent[-1]
+    assert policy.request(send, idempotent=True) is responses[2]
+    assert policy.counters['retries'] == 2 and policy.counters['failures'] == 0
+    # the responses of failed attempts return their connections
+    assert responses[0].closed and responses[1].closed
+
+
+def test_retries_are_bounded_and_raise_the_last_error():
+    policy = _retry_policy()
+    attempts = []
+    def send(timeout):
+        attempts.append(timeout)
+        raise requests.exceptions.ConnectionError("refused")
+    with pytest.raises(requests.exceptions.ConnectionError):
+        policy.request(send, idempotent=True)
+    assert len(attempts) == 3
+    assert policy.counters['retries'] == 2 and policy.counters['failures'] == 1
+
+
+def test_attempts_get_the_time_left_until_the_deadline():
+    policy = RequestPolicy(deadline=0.2, max_retries=100, retry_backoff=0.02, max_backoff=0.02)
+    timeouts = []
+    def send(timeout):
+        timeouts.append(timeout)
+        raise requests.exceptions.Timeout("stalled")
+    start = time.perf_counter()
+    with pytest.raises(requests.exceptions.Timeout):
+        policy.request(send, idempotent=True)
+    assert time.perf_counter() - start < 0.5
+    assert 1 < len(timeouts) < 100
+    assert all(0 < timeout <= 0.2 for timeout in timeouts)
+    assert timeouts == sorted(timeouts, reverse=True)
+    assert policy.counters['timeouts'] == len(timeouts)
+
+
+def test_hedge_wins_and_the_late_response_is_closed():
+    policy = RequestPolicy(deadline=5.0, max_retries=0, hedge_after=0.01)
+    release_first = threading.Event()
+    first_finished = threading.Event()
+    responses = [_Response(), _Response()]
+    calls = []
+    def send(timeout):
+        index = len(calls)
+        calls.append(index)
+        if index == 0:
+            release_first.wait(5.0)
+            first_finished.set()
+        return responses[index]
+    assert policy.request(send, idempotent=True) is responses[1]
+    assert policy.counters['hedges'] == 1 and policy.counters['hedge_wins'] == 1
+    assert not responses[1].closed
+    release_first.set()
+    first_finished.wait(5.0)
+    # the losing attempt's response is closed from its done callback once it arrives
+    deadline = time.perf_counter() + 5.0
+    while not responses[0].closed and time.perf_counter() < deadline:
+        time.sleep(0.001)
+    assert responses[0].closed
+
+
+def test_fast_response_is_not_hedged():
+    policy = RequestPolicy(deadline=5.0, hedge_after=1.0)
+    assert policy.request(lambda timeout: _Response(), idempotent=True).status_code == 200
+    assert policy.counters['hedges'] == 0
+
+
+def test_non_idempotent_request_is_not_hedged():
+    policy = RequestPolicy(deadline=5.0, max_retries=0, hedge_after=0.001)
+    calls = []
+    def send(timeout):
+        calls.append(threading.current_thread())
+        time.sleep(0.02)
+        return _Response()
+    policy.request(send, idempotent=False)
+    assert calls == [threading.current_thread()]
+    assert policy.counters['hedges'] == 0
+
+
+def test_updates_are_not_retried_without_idempotent_updates(cartpole_params):
+    with LocalThoughtForgeServer(idempotent_updates=False, error_rate=1.0) as server:
+        policy = _retry_policy()
+        with pytest.raises(RuntimeError):
+            _run_session(cartpole_params, server, 10, policy)
+        assert server.request_counts['/updateSim'] == 1
+        assert server.request_counts['/initSession'] == 1
+    assert policy.counters['retries'] == 0
+
+
+def test_updates_are_retried_once_idempotent_updates_are_negotiated(cartpole_params):
+    with LocalThoughtForgeServer(error_rate=1.0) as server:
+        policy = _retry_policy()
+        with pytest.raises(RuntimeError):
+            _run_session(cartpole_params, server, 10, policy)
+        assert server.request_counts['/updateSim'] == 3
+        assert server.request_counts['/initSession'] == 1
+    assert policy.counters['retries'] == 2
+
+
+def test_dropped_updates_are_replayed_not_repeated(cartpole_params):
+    num_ticks = 50
+    with LocalThoughtForgeServer(drop_rate=0.2) as server:
+        policy = _retry_policy(attempt_timeout=1.0)
+        session = _run_session(cartpole_params, server, num_ticks, policy)
+        assert server.fault_counts['drop'] > 0
+        # every dropped request was answered again from the server's replay cache, the session advanced once per tick
+        assert server.replayed_updates == server.fault_counts['drop']
+        assert server.request_counts['/updateSim'] - server.replayed_updates == num_ticks
+        assert server.request_counts['/initSession'] == 1
+    assert session.ticks == num_ticks
+    assert policy.counters['retries'] == server.fault_counts['drop']
+
+
+def test_init_session_is_not_repeated_under_stalls(cartpole_params):
+    with LocalThoughtForgeServer(stall_rate=0.3, stall_time=0.2) as server:
+        policy = RequestPolicy(deadline=5.0, max_retries=2, retry_backoff=0.001, hedge_after=0.02)
+        session = _run_session(cartpole_params, server, 20, policy)
+        assert server.request_counts['/initSession'] == 1
+        assert server.request_counts['/shutdownSession'] == 1
+        assert server.fault_counts['stall'] > 0
+        # each hedge repeats a request the server already computed, it is answered from the replay cache
+        assert policy.counters['hedges'] > 0
+        assert server.replayed_updates == policy.counters['hedges']
+        assert server.request_counts['/updateSim'] - server.replayed_updates == session.ticks
+    assert 0 < policy.counters['hedge_wins'] <= policy.counters['hedges']
+    assert policy.counters['failures'] == 0
@@ -0,0 +1,91 @@
+import json
+
+import pytest
+
+from session_spec import SessionSpec, clear_session_spec_cache, load_session_spec
+
+
+def _params(**settings):
+    params = {
+        'version': 0,
+        'motors': [{'name': 'motor', 'category': 'DEFAULT'}],
+        'sensors': [{'name': 'pos', 'category': 'DEFAULT'},
+                    {'name': ['angle1', 'angle2'], 'fan_out': 'angle', 'category': 'DEFAULT'}],
+    }
+    params.update(settings)
+    return params
+
+
+def test_every_validation_error_is_listed():
+    params = _params(version=99, internal_timescale=0, enable_debug='yes', history=[1], random_seed=True)
+    params['motors'] = [{'name': 'motor'}, {'name': 'motor'}]
+    params['sensors'].append({'name': []})
+    with pytest.raises(ValueError) as error_info:
+        SessionSpec(params, 'broken.params')
+    message = str(error_info.value)
+    assert message.startswith("Invalid client params broken.params:\n- ")
+    for error in ["version 99 not supported", "duplicate motors name 'motor'", "sensors[2] 'name' must be a name or a non-empty list",
+                  "'internal_timescale' must be an integer >= 1", "'random_seed' must be an integer",
+                  "'enable_debug' must be true or false", "'history' must be an object"]:
+        assert error in message
+    assert message.count("\n- ") == 7
+
+
+def test_invalid_fan_out_entries():
+    params = _params()
+    params['sensors'] += [{'name': 'single', 'fan_out': 'single_fan'}, {'name': ['x', 'y'], 'fan_out': 'pos'}]
+    with pytest.raises(ValueError) as error_info:
+        SessionSpec(params)
+    assert "sensors[2] 'fan_out' needs a list of names" in str(error_info.value)
+    assert "duplicate sensor name 'pos'" in str(error_info.value)
+
+
+def test_params_must_be_an_object():
+    with pytest.raises(ValueError):
+        SessionSpec([], 'list.params')
+
+
+def test_names_and_fan_out():
+    spec = SessionSpec(_params())
+    assert spec.sensor_names == ('pos', 'angle1', 'angle2')
+    assert spec.logical_sensor_names == ('pos', 'angle')
+    assert dict(spec.sensor_fan_out) == {'angle': ('angle1', 'angle2')}
+    assert spec.num_sensors == 3 and spec.num_motors == 1 and not spec.has_multi_motors
+
+
+def test_init_params_leave_out_client_only_keys():
+    spec = SessionSpec(_params(internal_timescale=100))
+    sensors = json.loads(spec.init_params['sensors'])
+    assert all('fan_out' not in entry for entry in sensors)
+    assert sensors[1] == {'name': ['angle1', 'angle2'], 'category': 'DEFAULT'}
+    assert spec.init_params['internal_timescale'] == 100
+    assert spec.init_params['random_seed'] == 42
+    # the spec's own settings keep the key
+    assert spec.params['sensors'][1]['fan_out'] == 'angle'
+
+
+def test_spec_is_immutable_and_copies_are_mutable():
+    spec = SessionSpec(_params(history={'max_length': 10}))
+    with pytest.raises(AttributeError):
+        spec.wire_format = 'binary'
+    with pytest.raises(TypeError):
+        spec.params['history']['max_length'] = 5
+    params = spec.copy_params()
+    params['history']['max_length'] = 5
+    params['sensors'][0]['name'] = 'renamed'
+    assert params == dict(_params(history={'max_length': 5}), sensors=[{'name': 'renamed', 'category': 'DEFAULT'}, _params()['sensors'][1]])
+    assert spec.get('history')['max_length'] == 10
+    assert spec.params['sensors'][0]['name'] == 'pos'
+
+
+def test_load_session_spec_is_cached_by_contents(tmp_path):
+    clear_session_spec_cache()
+    params_file = tmp_path / 'session.params'
+    params_file.write_text(json.dumps(_params()))
+    spec = load_session_spec(str(params_file))
+    assert load_session_spec(str(params_file)) is spec
+    params_file.write_text(json.dumps(_params(action_chunk_size=4)))
+    changed_spec = load_session_spec(str(params_file))
+    assert changed_spec is not spec and changed_spec.action_chunk_size == 4
+    with pytest.raises(ValueError):
+        load_session_spec(str(tmp_path / 'session.json'))
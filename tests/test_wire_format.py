@@ -0,0 +1,112 @@
+import json
+
+import numpy as np
+import pytest
+
+from wire_format import (BINARY_CONTENT_TYPE, WIRE_FORMAT_BINARY32, BinaryWireCodec, JsonWireCodec, create_wire_codec,
+    decode_motor_frame, decode_sensor_frame, encode_motor_frame, encode_sensor_frame)
+
+
+class _Response():
+    """ the parts of requests.Response the codecs use """
+    def __init__(self, content, content_type='application/json'):
+        self.content = content
+        self.headers = {'Content-Type': content_type}
+
+
+@pytest.mark.parametrize('dtype', ['<f8', '<f4'])
+def test_sensor_frame_round_trip(dtype):
+    sensor_values = np.array([0.5, -1.25, 3.0, 0.0])
+    decoded = decode_sensor_frame(encode_sensor_frame(sensor_values, dtype))
+    assert decoded.dtype == np.dtype(dtype)
+    np.testing.assert_array_equal(decoded, sensor_values)
+
+
+@pytest.mark.parametrize('dtype', ['<f8', '<f4'])
+def test_motor_frame_round_trip_with_multi_values(dtype):
+    motor_values = [0.25, [1.0, -2.0, 0.5], -0.75, [4.0]]
+    session_log = [{'t': 3, 'message': 'hello'}]
+    debugging_data = {'loss': [0.5]}
+    decoded_values, decoded_log, decoded_debug = decode_motor_frame(encode_motor_frame(motor_values, session_log, debugging_data, dtype))
+    assert decoded_values == motor_values
+    assert decoded_log == session_log
+    assert decoded_debug == debugging_data
+
+
+def test_motor_frame_without_tail_has_no_debugging_data():
+    frame = encode_motor_frame([1.0, 2.0])
+    assert decode_motor_frame(frame) == ([1.0, 2.0], [], None)
+
+
+def test_frames_are_checked():
+    with pytest.raises(ValueError):
+        decode_motor_frame(encode_sensor_frame([1.0]))
+    with pytest.raises(ValueError):
+        decode_sensor_frame(encode_motor_frame([1.0]))
+    with pytest.raises(ValueError):
+        encode_sensor_frame([1.0], dtype='<i4')
+
+
+def test_json_update_response_is_ordered_by_motor_id():
+    codec = JsonWireCodec([7, 2, 5], json_backend='json')
+    response = _Response(json.dumps({
+        'motor_dict': {'5': 0.5, '2': [1.0, 2.0], '99': 9.0},
+        'session_log': json.dumps([{'t': 1}]),
+        'debugging_data': json.dumps({'a': 1})}).encode())
+    motor_values, session_log, debugging_data = codec.decode_update_response(response)
+    # unknown ids are ignored and motors missing from the response are zeroed
+    assert motor_values == [[1.0, 2.0], 0.5, 0.0]
+    assert session_log == [{'t': 1}]
+    assert debugging_data == {'a': 1}
+    assert codec.decode_update_response(response, debug_data_requested=False)[2] is None
+
+
+def test_json_update_response_returns_a_fresh_list():
+    codec = JsonWireCodec([1, 2], json_backend='json')
+    response = _Response(json.dumps({'motor_dict': {'1': 1.0, '2': 2.0}, 'session_log': '[]', 'debugging_data': '{}'}).encode())
+    first, _, _ = codec.decode_update_response(response)
+    first[0] = 42.0
+    second, session_log, _ = codec.decode_update_response(response)
+    assert second == [1.0, 2.0]
+    assert second is not first
+    assert session_log == []
+
+
+def test_json_request_fills_in_sensor_copies():
+    codec = JsonWireCodec([1], json_backend='json', sensor_ids=[10, 11], sensor_copies={11: [12, 13]})
+    update_params, body, headers = codec.encode_update_request(3, {10: 0.5, 11: -1.0}, [1], False)
+    assert body is None and headers is None
+    assert json.loads(update_params['sensor_dict']) == {'10': 0.5, '11': -1.0, '12': -1.0, '13': -1.0}
+    update_params, _, _ = codec.encode_update_request_array(3, np.array([0.5, -1.0]), [1], False)
+    assert json.loads(update_params['sensor_dict']) == {'10': 0.5, '11': -1.0, '12': -1.0, '13': -1.0}
+
+
+@pytest.mark.parametrize('wire_format', ['binary', 'binary32'])
+def test_binary_codec_round_trip(wire_format):
+    codec = create_wire_codec(wire_format, [4, 1, 2], [9, 3], json_backend='json', sensor_copies={2: [5]})
+    assert isinstance(codec, BinaryWireCodec)
+    dtype = '<f4' if wire_format == WIRE_FORMAT_BINARY32 else '<f8'
+    _, body, headers = codec.encode_update_request(0, {1: 0.5, 2: -0.25, 4: 2.0}, [3, 9], False)
+    assert headers['Content-Type'] == BINARY_CONTENT_TYPE
+    # values are ordered by sensor id, the copy of sensor 2 is sent as sensor 5
+    np.testing.assert_array_equal(decode_sensor_frame(body), [0.5, -0.25, 2.0, -0.25])
+    response = _Response(encode_motor_frame([0.5, [1.0, 2.0]], [], {'x': 1}, dtype), BINARY_CONTENT_TYPE)
+    assert codec.decode_update_response(response) == ([0.5, [1.0, 2.0]], [], {'x': 1})
+    assert codec.decode_update_response(response, debug_data_requested=False)[2] is None
+
+
+def test_binary_codec_decodes_json_responses():
+    codec = create_wire_codec('binary', [1], [3, 9], json_backend='json')
+    response = _Response(json.dumps({'motor_dict': {'9': 1.5}, 'session_log': '[]', 'debugging_data': '{}'}).encode())
+    assert codec.decode_update_response(response) == ([0.0, 1.5], [], {})
+
+
+def test_binary_action_chunk_response_is_split_per_tick():
+    codec = create_wire_codec('binary', [1], [3, 9], json_backend='json')
+    response = _Response(encode_motor_frame([1.0, 2.0, 3.0, 4.0, 5.0, 6.0]), BINARY_CONTENT_TYPE)
+    assert codec.decode_action_chunk_response(response) == ([[1.0, 2.0], [3.0, 4.0], [5.0, 6.0]], [], None)
+
+
+def test_unsupported_wire_format():
+    with pytest.raises(ValueError):
+        create_wire_codec('xml', [1], [1])
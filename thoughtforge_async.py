@@ -0,0 +1,150 @@
+import asyncio, functools, threading, time
+from concurrent.futures import ThreadPoolExecutor
+
+from phase_timing import PHASE_ROUND_TRIP, PHASE_UPDATE
+from thoughtforge_client import BaseThoughtForgeClientSession
+
+
+ASYNC_MAX_WORKERS = 64
+
+_shared_executor = None
+_shared_executor_lock = threading.Lock()
+
+
+def get_shared_executor():
+    """ Returns the thread pool used by async sessions for blocking server requests, unless a
+    session was given its own executor. Sized so that dozens of sessions can have a request in
+    flight at the same time.
+
+    :rtype: concurrent.futures.ThreadPoolExecutor
+    """
+    global _shared_executor
+    with _shared_executor_lock:
+        if _shared_executor is None:
+            _shared_executor = ThreadPoolExecutor(max_workers=ASYNC_MAX_WORKERS, thread_name_prefix='thoughtforge')
+        return _shared_executor
+
+
+class AsyncThoughtForgeClientSession(BaseThoughtForgeClientSession):
+    """ AsyncThoughtForgeClientSession
+
+    An asyncio variant of :class:`thoughtforge_client.BaseThoughtForgeClientSession`. Creating the
+    session does not contact the server; the session is driven by awaiting `initialize()`, `step()`
+    and `close()`, or simply `run()`. Server requests are made on a thread pool so that one event
+    loop can drive many sessions at once, while the `update()`, `sim_started_notification()`,
+    `sim_ended_notification()` and `debug_data_received_notification()` hooks are called on the
+    event loop thread exactly as the blocking session calls them.
+
+    Existing sessions can be run asynchronously by mixing this class in front of them::
+
+        class AsyncCartpoleSession(AsyncThoughtForgeClientSession, ExampleCartpoleSession):
+            pass
+
+        async def main():
+            sessions = [AsyncCartpoleSession('./examples/cartpole/example_cartpole.params') for _ in range(8)]
+            await asyncio.gather(*[session.run() for session in sessions])
+
+        asyncio.run(main())
+
+    Takes the same parameters as :class:`thoughtforge_client.BaseThoughtForgeClientSession`, plus:
+
+    The constructor chains to the mixed-in session's `__init__()` (keyword arguments it doesn't take itself are
+    passed on), but only sets up the session: nothing is sent to the server until `initialize()` or `run()`.
+
+    :param executor: Optional executor for blocking server requests. Defaults to `None`, which uses
+        a thread pool shared by all async sessions (see :func:`get_shared_executor`).
+    :type executor: concurrent.futures.Executor
+
+    Async sessions exchange one motor step per request, the 'action_chunk_size' client param is ignored.
+    """
+    supports_action_chunks = False
+    runs_on_construction = False
+
+    def __init__(self, file_name, host=None, port=None, protocol='https', api_key=None, model_data=None, transport=None,
+                 render_policy=None, request_policy=None, executor=None, **session_kwargs):
+        self._named_sensor_dict = None
+        self._executor = executor if executor is not None else get_shared_executor()
+        super().__init__(file_name, host=host, port=port, protocol=protocol, api_key=api_key, model_data=model_data,
+            transport=transport, render_policy=render_policy, request_policy=request_policy, **session_kwargs)
+
+    async def _run_blocking(self, function, *args, **kwargs):
+        """ runs a blocking call on the session's executor """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(function, *args, **kwargs))
+
+    def is_running(self):
+        """ returns whether the session has been initialized and the sim has not been stopped
+
+        :rtype: bool
+        """
+        return self._named_sensor_dict is not None and not self._stop_requested
+
+    async def initialize(self):
+        """ Pings the server, initializes the remote session and starts the sim.
+
+        :return: `True` if the session was initialized successfully
+        :rtype: bool
+        """
+        await self._run_blocking(self._ping_server)
+        await self._run_blocking(self._initialize_session)
+        if self.session_id is None or self.session_id < 0:
+            return False
+        self._named_sensor_dict = self._begin_sim()
+        return True
+
+    async def request_update(self, named_sensor_dict):
+        """ Sends sensor values to the server and awaits the motor response, without calling `update()`
+
+        :param named_sensor_dict: A dictionary of sensor names to sensor values
+        :type named_sensor_dict: dict
+        :return: (dictionary of motor names to motor values, session log list, debugging data dict or `None` if it wasn't requested)
+        :rtype: tuple
+        """
+        update_params, update_body, update_headers = self._build_update_request(named_sensor_dict)
+        phase_start = time.perf_counter() if self.phase_timer is not None else None
+        response = await self._run_blocking(self._post_update, update_params, update_body, update_headers)
+        if phase_start is not None:
+            self.phase_timer.stop(PHASE_ROUND_TRIP, phase_start)
+        return self._process_update_response(response)
+
+    async def step(self):
+        """ Advances the sim by one tick: exchanges sensor and motor values with the server and calls `update()` """
+        next_motor_dict, session_log, debugging_data = await self.request_update(self._named_sensor_dict)
+        phase_start = time.perf_counter() if self.phase_timer is not None else None
+        self._named_sensor_dict = self.update(next_motor_dict)
+        if phase_start is not None:
+            self.phase_timer.stop(PHASE_UPDATE, phase_start)
+        self._complete_tick(session_log, debugging_data)
+
+    async def close(self):
+        """ Shuts down the remote session, reports the session summary and releases the transport """
+        try:
+            if await self._run_blocking(self._shutdown_remote_session):
+                self._end_sim()
+        finally:
+            self._named_sensor_dict = None
+            self._release_transport()
+
+    async def run(self, max_ticks=None):
+        """ Initializes the session if needed, steps the sim until `stop_sim()` is called (or `max_ticks`
+        ticks have run) and closes the session.
+
+        :param max_ticks: Optional limit on the number of ticks to run. Defaults to `None` (no limit).
+        :type max_ticks: int
+        """
+        try:
+            if self._named_sensor_dict is None and not await self.initialize():
+                return
+            ticks_run = 0
+            while not self._stop_requested and (max_ticks is None or ticks_run < max_ticks):
+                await self.step()
+                ticks_run += 1
+        finally:
+            await self.close()
+
+    async def __aenter__(self):
+        await self.initialize()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
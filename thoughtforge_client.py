@@ -1,11 +1,37 @@
 
-import json, os, requests, traceback
+import json, os, threading, time, traceback
 import numpy as np
-from dotenv import load_dotenv
-from typing import List
-from urllib.parse import urlencode, urlparse, urlunparse
 
-from utils import safe_dict_get, load_client_params, CURRENT_CLIENT_PARAMS_VERSION
+from array_layout import ArrayLayout
+from compression import create_compression_policy, COMPRESSION_HEADER, COMPRESSION_THRESHOLD_HEADER
+from history import create_history_stores
+from model_cache import create_model_payload_cache, get_model_digest, MODEL_DIGEST_CAPABILITY, MODEL_DIGEST_HEADER, MODEL_REQUIRED_STATUS
+from model_format import create_model_upload, get_model_size, load_model_data, write_model_file, DEFAULT_CHUNK_SIZE, MODEL_UPLOAD_BINARY, MODEL_UPLOAD_JSON
+from online_stats import OnlineStatistics
+from phase_timing import create_phase_timer, PHASE_DECODE, PHASE_ENCODE, PHASE_LOGS_AND_DEBUG, PHASE_RENDER, PHASE_ROUND_TRIP, PHASE_UPDATE
+from rendering import create_render_policy
+from request_policy import create_request_policy, IDEMPOTENT_UPDATES_HEADER, REQUEST_SEQUENCE_ARG
+from sensor_features import create_feature_pipeline
+from session_spec import load_session_spec
+from session_trace import create_trace_recorder
+from transport import get_shared_transport
+from utils import safe_dict_get
+from wire_format import create_wire_codec, ACTION_CHUNK_HEADER, SENSOR_FAN_OUT_HEADER, SUPPORTED_WIRE_FORMATS, WIRE_FORMAT_HEADER, WIRE_FORMAT_JSON
+
+
+_environment_loaded = False
+_environment_lock = threading.Lock()
+
+
+def _load_environment():
+    """ loads the .env file into the environment once per process. python-dotenv is imported here, so that
+    importing the client doesn't pay for it. """
+    global _environment_loaded
+    with _environment_lock:
+        if not _environment_loaded:
+            from dotenv import load_dotenv
+            load_dotenv()
+            _environment_loaded = True
 
 
 class BaseThoughtForgeClientSession():
@@ -17,66 +43,57 @@ class BaseThoughtForgeClientSession():
 
     .. seealso:: Please see the ./examples/cartpole/ directory for an example usage of this class.
 
-    :param file_name: The parameter file for specifying sensors, motors and model configuration
+    :param file_name: The parameter file for specifying sensors, motors and model configuration. It is compiled
+        into `self.session_spec` (see :class:`session_spec.SessionSpec`), `self.client_params` holds its settings.
     :type file_name: str
     :param host: Host address for the destination ThoughtForge server. Defaults to `None`. If left unset, will be populated from the environment variable 'THOUGHTFORGE_HOST'
     :type host: str
     :param port: Host port for the destination ThoughtForge server. Defaults to `None`. If left unset, will be populated from the environment variable 'THOUGHTFORGE_PORT'
     :type port: int
-    :param model_data: Optional parameter for supplying saved model data at initialization of the sim.
+    :param model_data: Optional parameter for supplying saved model data at initialization of the sim, e.g. from 
+        :meth:`load_model`. The model is uploaded in a streamed binary format, configured from the optional 
+        'model_upload' entry of the client .params file.
     :type model_data: dict
+    :param transport: Optional transport to use for all server requests. Defaults to `None`. If left unset, 
+        a pooled keep-alive transport shared with other sessions using the same server and api key is used,
+        configured from the optional 'transport' entry of the client .params file.
+    :type transport: transport.ThoughtForgeTransport
+    :param render_policy: Optional policy deciding when the environment is rendered. Defaults to `None`. If left unset,
+        the policy is configured from the optional 'render' entry of the client .params file, and otherwise 
+        `render()` is called every tick.
+    :type render_policy: rendering.RenderPolicy
+    :param request_policy: Optional deadline, retry and hedging policy for the session's server requests. Defaults to
+        `None`. If left unset, the policy is configured from the optional 'request_policy' entry of the client .params
+        file, and otherwise requests wait as long as the transport's timeouts allow and aren't retried.
+    :type request_policy: request_policy.RequestPolicy
+
+    With a 'compression' entry in the client .params file (see :class:`compression.CompressionPolicy`), model uploads and
+    other request bodies above a size threshold are compressed, and so are the server's large /updateSim responses.
+
+    With "action_chunk_size": N in the client .params file, each /updateSim request receives the motor values of up
+    to N ticks (if the server supports it), which are applied with one update() call per tick, and the resulting 
+    sensor states are sent together with the next request.
+
+    Sensor entries with several names that always carry the same value can declare a logical name, e.g.
+    `{"name": ["angle0_sensor1", "angle0_sensor2"], "fan_out": "angle0", ...}`. The session then knows the entry as
+    the single sensor 'angle0' (in `sensor_name_map`, layouts, histories and the values update() returns), and its
+    value is sent once per tick if the server replicates it to the other names, or copied to each name otherwise.
+    `registered_sensor_name_map` holds all names registered with the server.
 
     """
-    def __init__(self, file_name, host=None, port=None, protocol='https', api_key=None, model_data=None):
+    # whether the session loop can apply action chunks, see 'action_chunk_size'
+    supports_action_chunks = True
+    # whether the constructor runs the session to its end, subclasses driving the session themselves only set it up
+    runs_on_construction = True
+
+    def __init__(self, file_name, host=None, port=None, protocol='https', api_key=None, model_data=None, transport=None, render_policy=None,
+                 request_policy=None):
+        if not self.runs_on_construction:
+            self._setup_session(file_name, host, port, protocol, api_key, model_data, transport, render_policy, request_policy)
+            return
         try:
-            self.session_id = None
-            
-            load_dotenv()
-            if api_key is None:
-                api_key = os.getenv("THOUGHTFORGE_API_KEY")
-            if host is None:
-                host = os.getenv("THOUGHTFORGE_HOST")
-            if port is None:
-                port = os.getenv("THOUGHTFORGE_PORT")
-            env_protocol = os.getenv("THOUGHTFORGE_PROTOCOL")
-            if env_protocol is not None:
-                protocol = env_protocol
-
-            self.client_params = load_client_params(file_name)
-
-            # check version and api key
-            if ('version' not in self.client_params) or self.client_params['version'] != CURRENT_CLIENT_PARAMS_VERSION:
-                print(self.client_params)
-                print("Version not supported.")
-                assert(False)
-            if not api_key:
-                print("ThoughtForge API Key required.")
-                assert(False)
-
-            self.sim_t = 0
-            self.sensor_name_map = {}
-            self.motor_name_map = {}
-            self._stop_requested = False
-            self.all_session_logs = []
-            self.sensor_value_history = []
-            self.motor_value_history = []
-            self.debug_data_history = []
-
-            self.host = host
-            self.port = port
-            self.protocol = protocol
-            self.api_key = api_key
-            self.model_data = model_data
-
-            server_status_url = self._build_url('/')
-            headers = {"x-thoughtforge-key": self.api_key}
-            response = requests.get(server_status_url, headers=headers)
-            response_text = response.text
-            if response.ok:
-                print("Connected:", response_text)
-            else:
-                print("Server ping failure:", response_text)
-
+            self._setup_session(file_name, host, port, protocol, api_key, model_data, transport, render_policy, request_policy)
+            self._ping_server()
             self._initialize_session()
             if self.session_id is not None and self.session_id >= 0:
                 self._start_sim()
@@ -90,43 +107,117 @@ class BaseThoughtForgeClientSession():
             raise
         finally:
             self._close_session()
+            self._release_transport()
+
+    def _setup_session(self, file_name, host, port, protocol, api_key, model_data, transport, render_policy, request_policy=None):
+        """ Loads client params, resolves server settings and acquires the transport. Does not 
+        contact the server. """
+        self.session_id = None
+        self.transport = None
+        
+        _load_environment()
+        if api_key is None:
+            api_key = os.getenv("THOUGHTFORGE_API_KEY")
+        if host is None:
+            host = os.getenv("THOUGHTFORGE_HOST")
+        if port is None:
+            port = os.getenv("THOUGHTFORGE_PORT")
+        env_protocol = os.getenv("THOUGHTFORGE_PROTOCOL")
+        if env_protocol is not None:
+            protocol = env_protocol
+
+        # the .params file is compiled and validated once per distinct file contents, see session_spec.py
+        self.session_spec = load_session_spec(file_name)
+        # a session's own copy of the settings, which subclasses may read and modify like the parsed json
+        self.client_params = self.session_spec.copy_params()
+
+        # check api key
+        if not api_key:
+            print("ThoughtForge API Key required.")
+            assert(False)
+
+        self.sim_t = 0
+        self.print_summary = True
+        self.sensor_name_map = {}
+        self.registered_sensor_name_map = {}
+        self.sensor_fan_out_accepted = False
+        self.idempotent_updates_accepted = False
+        self._update_sequence = 0
+        self.motor_name_map = {}
+        self.block_name_map = {}
+        self._stop_requested = False
+        self.all_session_logs = []
+        self.sensor_value_history, self.motor_value_history, self.debug_data_history = create_history_stores(None, {}, {})
+        self.trace_recorder = None
+        self.phase_timer = None
+        self.sensor_statistics = OnlineStatistics({})
+        self.motor_statistics = OnlineStatistics({})
+        self.debug_enabled = False
+        self._debug_data_requested = False
+        self.action_chunk_size = 1
+        self.sensor_layout = None
+        self.motor_layout = None
+        self.feature_pipeline = None
+        self.sensor_input_layout = None
+
+        self.host = host
+        self.port = port
+        self.protocol = protocol
+        self.api_key = api_key
+        self.model_data = model_data
+        self.model_payload_cache = create_model_payload_cache(safe_dict_get(self.client_params, 'model_cache', None))
+        if render_policy is None:
+            render_policy = create_render_policy(safe_dict_get(self.client_params, 'render', None))
+        self.render_policy = render_policy
+        if request_policy is None:
+            request_policy = create_request_policy(safe_dict_get(self.client_params, 'request_policy', None))
+        self.request_policy = request_policy
+        self.compression = create_compression_policy(safe_dict_get(self.client_params, 'compression', None))
+
+        if transport is None:
+            transport_params = safe_dict_get(self.client_params, 'transport', None)
+            transport = get_shared_transport(self.protocol, self.host, self.port, self.api_key, transport_params)
+        else:
+            transport.acquire()
+        self.transport = transport
+
+    def _ping_server(self):
+        """ Checks that the ThoughtForge server is reachable """
+        # servers that accept compressed request bodies answer the compression header
+        headers = {COMPRESSION_HEADER: self.compression.codec.name} if self.compression is not None else None
+        if self.request_policy is not None:
+            response = self.request_policy.get(self.transport, '/', headers=headers)
+        else:
+            response = self.transport.get('/', headers=headers)
+        response_text = response.text
+        if response.ok:
+            if self.compression is not None:
+                self.compression.requests_accepted = response.headers.get(COMPRESSION_HEADER) == self.compression.codec.name
+            print("Connected:", response_text)
+        else:
+            print("Server ping failure:", response_text)
+
+    def _release_transport(self):
+        """ Releases the session's hold on its transport """
+        if self.transport is not None:
+            self.transport.release()
+            self.transport = None
 
     def _build_url(self, path, args_dict=None):
         """ Helper function for generating request URLS """ 
-        # Returns a list in the structure of urlparse.ParseResult
-        assert(self.protocol in ['http', 'https'])
-        scheme = self.protocol
-        netloc = self.host + ':' + str(self.port)
-        path = path
-        params = urlencode(args_dict) if args_dict else '' 
-        query = ''
-        fragments = ''
-        return urlunparse([scheme, netloc, path, params, query, fragments])
+        return self.transport.build_url(path, args_dict)
 
     def _validate_sensors_motors(self):
         """ this function is called after receiving a successful response 
         during server initialzation to ensure all motors and sensors were
         successfully registered """
         validation_successful = True
-        # for validation, check that we have the expected number of sensors
-        total_sensors = 0
-        for entry in self.client_params['sensors']:
-            if isinstance(entry['name'], List):
-                total_sensors += len(entry['name'])
-            else:
-                total_sensors += 1
-        if len(self.sensor_name_map) != total_sensors:
-            print("Some sensors failed registration. Found", len(self.sensor_name_map), "expected", total_sensors)
+        # for validation, check that we have the expected number of sensors and motors
+        if len(self.registered_sensor_name_map) != self.session_spec.num_sensors:
+            print("Some sensors failed registration. Found", len(self.registered_sensor_name_map), "expected", self.session_spec.num_sensors)
             validation_successful = False
-        # for validation, check that we have the expected number of motors
-        total_motors = 0
-        for entry in self.client_params['motors']:
-            if isinstance(entry['name'], List):
-                total_motors += len(entry['name'])
-            else:
-                total_motors += 1
-        if len(self.motor_name_map) != total_motors:
-            print("Some motors failed registration. Found", len(self.sensor_name_map), "expected", total_sensors)
+        if len(self.motor_name_map) != self.session_spec.num_motors:
+            print("Some motors failed registration. Found", len(self.motor_name_map), "expected", self.session_spec.num_motors)
             validation_successful = False
         return validation_successful 
 
@@ -136,41 +227,65 @@ class BaseThoughtForgeClientSession():
         if self.session_id != None:
             self._close_session()
         
-        # if initialized with model_data, include in the post request
-        model_data_to_send = None
-        if self.model_data is not None:
-            converted_model_data = {}
-            weight_array_list = self.model_data['weights']
-            weight_list_list = [weightarray.tolist() for weightarray in weight_array_list]
-            converted_model_data['weights'] = weight_list_list
-            converted_model_data['values'] = self.model_data['values'].tolist()
-            model_data_to_send = json.dumps(converted_model_data).encode()
-
-        self.debug_enabled = safe_dict_get(self.client_params, 'enable_debug', False)
-        initSession_params = {
-            'version': self.client_params['version'],
-            'internal_timescale': safe_dict_get(self.client_params, 'internal_timescale', 1), 
-            'ticks_per_sensor_sample': safe_dict_get(self.client_params, 'ticks_per_sensor_sample', 1),
-            'center_block_size_extra': safe_dict_get(self.client_params, 'center_block_size_extra', 0),
-            'center_block_stride': safe_dict_get(self.client_params, 'center_block_stride', 1),
-            'random_seed': safe_dict_get(self.client_params, 'random_seed', 42),
-            'motors' : json.dumps(self.client_params['motors']),
-            'sensors' : json.dumps(self.client_params['sensors']),
-            }
-        init_url = self._build_url('/initSession', initSession_params)
-        headers = {"x-thoughtforge-key": self.api_key}
-        response = requests.post(init_url, headers=headers, data=model_data_to_send)
+        self.debug_enabled = self.session_spec.debug_enabled
+        # debug data can be sampled every N ticks and/or at most once per period (in seconds)
+        self.debug_sample_interval = self.session_spec.debug_sample_interval
+        self.debug_sample_period = self.session_spec.debug_sample_period
+        # optionally request a binary /updateSim wire format, the server reports which format it accepted
+        requested_wire_format = self.session_spec.wire_format
+        if requested_wire_format not in SUPPORTED_WIRE_FORMATS:
+            print("Unsupported wire format", requested_wire_format, "falling back to", WIRE_FORMAT_JSON)
+            requested_wire_format = WIRE_FORMAT_JSON
+        # headers asking for optional protocol features, each reported by the server if it supports it
+        init_headers = {}
+        if requested_wire_format != WIRE_FORMAT_JSON:
+            init_headers[WIRE_FORMAT_HEADER] = requested_wire_format
+        # optionally request action chunks: up to N motor steps per /updateSim request, applied with one update() call each
+        requested_action_chunk_size = self.session_spec.action_chunk_size
+        if requested_action_chunk_size > 1 and not self.supports_action_chunks:
+            print("Action chunks are not supported by", type(self).__name__ + ", using one motor step per request.")
+            requested_action_chunk_size = 1
+        if requested_action_chunk_size > 1:
+            init_headers[ACTION_CHUNK_HEADER] = str(requested_action_chunk_size)
+        # sensor entries declaring 'fan_out' send one value, if the server replicates it to the entry's other names
+        if len(self.session_spec.sensor_fan_out) > 0:
+            init_headers[SENSOR_FAN_OUT_HEADER] = json.dumps([list(names) for names in self.session_spec.sensor_fan_out.values()])
+        # /updateSim requests are only sent more than once if the server deduplicates them by sequence number
+        if self.request_policy is not None and self.request_policy.repeats_requests:
+            init_headers[IDEMPOTENT_UPDATES_HEADER] = '1'
+        # /updateSim responses of at least the threshold size are compressed if the server supports it
+        if self.compression is not None:
+            init_headers[COMPRESSION_HEADER] = self.compression.codec.name
+            init_headers[COMPRESSION_THRESHOLD_HEADER] = str(self.compression.threshold)
+        initSession_params = dict(self.session_spec.init_params)
+        response = self._post_init_session(initSession_params, init_headers if len(init_headers) > 0 else None)
         initialization_failed = False
         if response.ok:
             response_dict = response.json()
             self.session_id = response_dict['session_id']
             self.motor_name_map = json.loads(response_dict['motor_ids'])
-            self.sensor_name_map = json.loads(response_dict['sensor_ids'])
+            self.registered_sensor_name_map = json.loads(response_dict['sensor_ids'])
             self.block_name_map = json.loads(response_dict['block_ids'])
             session_log = json.loads(safe_dict_get(response_dict, 'session_log', []))
             self._process_session_logs(session_log)
+            wire_format = safe_dict_get(response_dict, 'wire_format', WIRE_FORMAT_JSON)
+            if wire_format not in SUPPORTED_WIRE_FORMATS:
+                wire_format = WIRE_FORMAT_JSON
+            # servers that don't replicate fanned out sensors don't report it, their copies are filled in by the client
+            self.sensor_fan_out_accepted = bool(safe_dict_get(response_dict, 'sensor_fan_out', False))
+            self.idempotent_updates_accepted = bool(safe_dict_get(response_dict, 'idempotent_updates', False))
+            if self.compression is not None:
+                self.compression.responses_accepted = safe_dict_get(response_dict, 'compression', None) == self.compression.codec.name
+            self._update_sequence = 0
+            self.sensor_name_map, sensor_copies = self._fan_out_sensors(self.registered_sensor_name_map)
+            self.wire_codec = create_wire_codec(wire_format, self.sensor_name_map.values(), self.motor_name_map.values(),
+                self.session_spec.json_backend, sensor_copies if not self.sensor_fan_out_accepted else None)
+            # servers that don't support action chunks don't report a chunk size
+            self.action_chunk_size = min(int(safe_dict_get(response_dict, 'action_chunk_size', 1)), requested_action_chunk_size)
             if self.session_id < 0 or not self._validate_sensors_motors():
                 initialization_failed = True
+            else:
+                self._create_layouts()
         else:
             initialization_failed = True
 
@@ -178,50 +293,399 @@ class BaseThoughtForgeClientSession():
             print("Session inialization failed.")
             self.session_id = -1
         else:
-            print("Session", self.session_id, "has been initialized.")
+            capability_info = ""
+            if len(self.session_spec.sensor_fan_out) > 0:
+                capability_info = ", sensor fan-out: " + ("server" if self.sensor_fan_out_accepted else "client")
+            if self.request_policy is not None and self.request_policy.repeats_requests:
+                capability_info += ", idempotent updates: " + ("yes" if self.idempotent_updates_accepted else "no")
+            if self.compression is not None:
+                capability_info += ", compression: " + (self.compression.codec.name if self.compression.requests_accepted or
+                    self.compression.responses_accepted else "none")
+            print("Session", self.session_id, "has been initialized (wire format: " + self.wire_codec.wire_format + 
+                ", action chunk size: " + str(self.action_chunk_size) + capability_info + ").")
+
+    def _fan_out_sensors(self, registered_sensor_name_map):
+        """ Returns the session's sensor names to ids, where each entry declaring 'fan_out' is one sensor with the id of
+        the entry's first name, and a dictionary of those ids to the ids of the entry's other names """
+        sensor_name_map = dict(registered_sensor_name_map)
+        sensor_copies = {}
+        for logical_name, names in self.session_spec.sensor_fan_out.items():
+            if not all(name in registered_sensor_name_map for name in names):
+                # reported by the registration check
+                continue
+            for name in names:
+                del sensor_name_map[name]
+            sensor_id = registered_sensor_name_map[names[0]]
+            sensor_name_map[logical_name] = sensor_id
+            sensor_copies[sensor_id] = [registered_sensor_name_map[name] for name in names[1:]]
+        return sensor_name_map, sensor_copies
+
+    def _create_layouts(self):
+        """ Computes the array layouts of sensor and motor values, see :meth:`update_array`. The widths of MULTI
+        motors are only known once motor values are received, their layout is created from the first response. """
+        self.sensor_layout = ArrayLayout(self.sensor_name_map)
+        self.motor_layout = ArrayLayout(self.motor_name_map) if not self.session_spec.has_multi_motors else None
+
+    def _post_init_session(self, initSession_params, init_headers):
+        """ Posts the /initSession request, including model_data if the session was given any. Model data 
+        is streamed in the binary model format unless the 'model_upload' client param selects json. Binary 
+        uploads first send only the model's digest, and the model itself is only uploaded if the server doesn't 
+        already have it. If the server doesn't acknowledge a binary upload, the session it created is shut down 
+        and the upload is retried as json. """
+        if self.model_data is None:
+            return self._post('/initSession', initSession_params, headers=init_headers)
+        model_upload_params = safe_dict_get(self.client_params, 'model_upload', None)
+        upload_settings = model_upload_params if model_upload_params is not None else {}
+        if safe_dict_get(upload_settings, 'format', MODEL_UPLOAD_BINARY) == MODEL_UPLOAD_JSON:
+            return self._post_json_model(initSession_params, model_upload_params, init_headers)
+        model_upload_params = self._compressed_upload_params(upload_settings)
+
+        headers = dict(init_headers) if init_headers is not None else {}
+        send_digest = safe_dict_get(upload_settings, 'digest_first', True) and \
+            safe_dict_get(self.transport.server_capabilities, MODEL_DIGEST_CAPABILITY, True)
+        digest = None
+        if send_digest or self.model_payload_cache is not None:
+            digest = get_model_digest(self.model_data)
+        if send_digest:
+            headers[MODEL_DIGEST_HEADER] = digest
+            response = self._post('/initSession', initSession_params, headers=headers)
+            if response.ok and safe_dict_get(response.json(), 'model_digest', None) == digest:
+                print("Server already has model", digest + ", upload skipped.")
+                return response
+            if response.status_code != MODEL_REQUIRED_STATUS:
+                # the server ignored the digest, upload without one from now on
+                self.transport.server_capabilities[MODEL_DIGEST_CAPABILITY] = False
+                del headers[MODEL_DIGEST_HEADER]
+                self._shutdown_unused_session(response)
+
+        model_body, model_headers = create_model_upload(self.model_data, model_upload_params, self.model_payload_cache, digest)
+        headers.update(model_headers)
+        if self.compression is not None and headers.get('Content-Encoding') == self.compression.codec.name:
+            model_body = self.compression.count_chunks(model_body, get_model_size(self.model_data))
+        response = self._post('/initSession', initSession_params, data=model_body, headers=headers)
+        if response.ok and safe_dict_get(response.json(), 'model_format', None) == MODEL_UPLOAD_BINARY:
+            return response
+        print("Binary model upload not accepted by the server, falling back to json.")
+        self._shutdown_unused_session(response)
+        json_upload_params = dict(upload_settings)
+        json_upload_params['format'] = MODEL_UPLOAD_JSON
+        return self._post_json_model(initSession_params, json_upload_params, init_headers)
+
+    def _post_json_model(self, initSession_params, upload_params, init_headers):
+        """ Posts the /initSession request with the model uploaded as json, compressed if it is large enough """
+        model_body, _ = create_model_upload(self.model_data, upload_params)
+        if self.compression is not None:
+            model_body, init_headers = self.compression.compress_body(model_body, init_headers)
+        return self._post('/initSession', initSession_params, data=model_body, headers=init_headers)
+
+    def _compressed_upload_params(self, upload_settings):
+        """ The 'model_upload' settings of a binary upload, compressed with the session's codec if the server accepts 
+        compressed requests, the model is large enough and the settings don't choose a compression themselves """
+        if self.compression is None or 'compression' in upload_settings or \
+                not self.compression.compresses(get_model_size(self.model_data)):
+            return upload_settings
+        upload_params = dict(upload_settings)
+        upload_params['compression'] = self.compression.codec.name
+        upload_params['compression_level'] = self.compression.codec.level
+        return upload_params
+
+    def _shutdown_unused_session(self, init_response):
+        """ Shuts down a session that the server created from an /initSession request that is being retried """
+        if init_response.ok:
+            self._post('/shutdownSession', {'session_id': init_response.json()['session_id']})
 
     def _start_sim(self):
         """ Starts simulation of the agent and environment and triggers subsequent calls to update() """
+        named_sensor_dict = self._begin_sim()
+        if self.action_chunk_size > 1:
+            self._run_action_chunks(named_sensor_dict)
+            return
+        if self._uses_array_api:
+            self._run_array_sim(named_sensor_dict)
+            return
+        while not self._stop_requested:
+            update_params, update_body, update_headers = self._build_update_request(named_sensor_dict)
+            phase_start = time.perf_counter() if self.phase_timer is not None else None
+            response = self._post_update(update_params, update_body, update_headers)
+            if phase_start is not None:
+                self.phase_timer.stop(PHASE_ROUND_TRIP, phase_start)
+            next_motor_dict, session_log, debugging_data = self._process_update_response(response)
+            # send motor data into client to update the environment
+            phase_start = time.perf_counter() if self.phase_timer is not None else None
+            named_sensor_dict = self.update(next_motor_dict)
+            if phase_start is not None:
+                self.phase_timer.stop(PHASE_UPDATE, phase_start)
+            self._complete_tick(session_log, debugging_data)
+
+    def _run_array_sim(self, named_sensor_dict):
+        """ The sim loop for sessions implementing update_array(): sensor and motor values are exchanged as arrays
+        laid out by `sensor_layout` and `motor_layout`, without building dictionaries every tick """
+        sensor_values = self.sensor_input_layout.to_array(named_sensor_dict)
+        while not self._stop_requested:
+            update_params, update_body, update_headers = self._build_update_request_array(sensor_values)
+            phase_start = time.perf_counter() if self.phase_timer is not None else None
+            response = self._post_update(update_params, update_body, update_headers)
+            if phase_start is not None:
+                self.phase_timer.stop(PHASE_ROUND_TRIP, phase_start)
+            motor_values, session_log, debugging_data = self._process_update_response_array(response)
+            phase_start = time.perf_counter() if self.phase_timer is not None else None
+            sensor_values = self.update_array(motor_values)
+            if phase_start is not None:
+                self.phase_timer.stop(PHASE_UPDATE, phase_start)
+            self._complete_tick(session_log, debugging_data)
+
+    def _run_action_chunks(self, named_sensor_dict):
+        """ The sim loop with action chunks: every /updateSim request sends the sensor states of all ticks since 
+        the previous request and receives the motor values of the next `action_chunk_size` ticks, which are applied
+        with one update() call per tick. Every tick is still recorded individually. """
+        named_sensor_dicts = [self._apply_sensor_features(named_sensor_dict)]
+        while not self._stop_requested:
+            # the latest sensor state is the current tick's, it hasn't been recorded yet
+            self._record_sensors(named_sensor_dicts[-1])
+            update_params, update_body, update_headers = self._build_action_chunk_request(named_sensor_dicts)
+            phase_start = time.perf_counter() if self.phase_timer is not None else None
+            response = self._post_update(update_params, update_body, update_headers)
+            if phase_start is not None:
+                self.phase_timer.stop(PHASE_ROUND_TRIP, phase_start)
+            next_motor_dicts, session_log, debugging_data = self._process_action_chunk_response(response)
+            if len(next_motor_dicts) == 0:
+                print("Session update returned no motor values, stopping.")
+                self.stop_sim()
+                break
+            named_sensor_dicts = []
+            for step, next_motor_dict in enumerate(next_motor_dicts):
+                if step > 0:
+                    self._record_sensors(named_sensor_dicts[-1])
+                self._record_motors(next_motor_dict)
+                phase_start = time.perf_counter() if self.phase_timer is not None else None
+                named_sensor_dicts.append(self._apply_sensor_features(self.update(next_motor_dict)))
+                if phase_start is not None:
+                    self.phase_timer.stop(PHASE_UPDATE, phase_start)
+                self._complete_tick(session_log, debugging_data)
+                # session logs and debugging data come once per chunk, with its first tick
+                session_log, debugging_data = [], None
+                self._debug_data_requested = False
+                if self._stop_requested:
+                    break
+
+    def _post(self, path, args_dict, data=None, headers=None):
+        """ Posts a request that changes the server's sessions, within the deadline of the session's request policy
+        if it has one. Such requests are sent once, they aren't retried or hedged. """
+        if self.request_policy is None:
+            return self.transport.post(path, args_dict, data=data, headers=headers)
+        return self.request_policy.post(self.transport, path, args_dict, data=data, headers=headers, idempotent=False)
+
+    def _post_update(self, update_params, update_body, update_headers):
+        """ Posts an /updateSim request, through the session's request policy if it has one. Requests are numbered
+        if the server deduplicates them, which makes them safe to retry and hedge. """
+        if self.compression is not None:
+            update_body, update_headers = self.compression.compress_body(update_body, update_headers)
+        if self.request_policy is None:
+            return self.transport.post('/updateSim', update_params, data=update_body, headers=update_headers)
+        if self.idempotent_updates_accepted:
+            update_params[REQUEST_SEQUENCE_ARG] = self._update_sequence
+            self._update_sequence += 1
+        return self.request_policy.post(self.transport, '/updateSim', update_params, data=update_body, headers=update_headers,
+            idempotent=self.idempotent_updates_accepted)
+
+    def _check_update_response(self, response):
+        """ Raises an error for a failed /updateSim response, and decompresses the body of a successful one """
+        if not response.ok:
+            raise RuntimeError("Session update failed. Server returned " + str(response) + ": " + response.text[:200])
+        if self.compression is not None:
+            self.compression.decompress_response(response)
+
+    def _create_trace_recorder(self):
+        """ Creates the session's trace recorder from the optional 'trace' client param, `None` if it isn't traced """
+        return create_trace_recorder(safe_dict_get(self.client_params, 'trace', None), self.session_id)
+
+    def _begin_sim(self):
+        """ Notifies the client that the sim is starting and returns the initial sensor state """
+        # sensor values are computed from the observations returned by update() if the session declares sensor features
+        self.feature_pipeline = create_feature_pipeline(self.session_spec.get('sensor_features'), self.sensor_name_map)
+        self.sensor_input_layout = self.feature_pipeline.input_layout if self.feature_pipeline is not None else self.sensor_layout
         initial_sensor_dict = self.sim_started_notification()
+        if isinstance(initial_sensor_dict, np.ndarray):
+            initial_sensor_dict = self.sensor_input_layout.to_dict(initial_sensor_dict)
         if initial_sensor_dict is None:
             initial_sensor_dict = {
                 sensor_name: 0.0
-                for sensor_name in self.sensor_name_map.keys()}
-                
-        named_sensor_dict = initial_sensor_dict
-        motor_ids = list(self.motor_name_map.values())
+                for sensor_name in self.sensor_input_layout.names}
+        self._motor_ids = list(self.motor_name_map.values())
+        # motor names in the id order that the wire codec returns motor values in
+        self._motor_names_by_id = sorted(self.motor_name_map.keys(), key=lambda name: self.motor_name_map[name])
+        self.sensor_value_history, self.motor_value_history, self.debug_data_history = create_history_stores(
+            safe_dict_get(self.client_params, 'history', None), self.sensor_name_map, self.motor_name_map, self.block_name_map)
+        self._debug_column_names = self.debug_data_history.get_column_names()
+        self._last_debug_sample_time = None
+        # sessions implementing update_array() exchange arrays instead of dictionaries with the sim loop
+        self._uses_array_api = type(self).update_array is not BaseThoughtForgeClientSession.update_array
+        self._motor_array = None
+        # named debug data dictionaries are only built for sessions that implement the notification
+        self._notify_debug_data = type(self).debug_data_received_notification is not BaseThoughtForgeClientSession.debug_data_received_notification
+        self.trace_recorder = self._create_trace_recorder()
+        self.phase_timer = create_phase_timer(safe_dict_get(self.client_params, 'phase_timing', None))
+        self.sensor_statistics = OnlineStatistics(self.sensor_name_map)
+        self.motor_statistics = OnlineStatistics(self.motor_name_map)
+        self.render_policy.start(self)
         print("Session", self.session_id, "starting simulation....")
-        while not self._stop_requested:
-            self.sensor_value_history.append(named_sensor_dict)
-            sensor_dict = {self.sensor_name_map[key]:val for key, val in named_sensor_dict.items()}
-            # sent sensor data to the server
-            update_params = {
-                'session_id': self.session_id,
-                'sensor_dict': json.dumps(sensor_dict), 
-                'motor_ids_requested': json.dumps(motor_ids),
-                'collect_debug_data': self.debug_enabled
-            }
-            update_url = self._build_url('/updateSim', update_params)
-            headers = {"x-thoughtforge-key": self.api_key}
-            response = requests.post(update_url, headers=headers)
-            if not response.ok:
-                print("Session update failed. Server returned", response)
-            response_dict = response.json()
-            # retrieve motor responses from the server
-            motor_dict = response_dict['motor_dict']
-            int_key_response_dict = {int(key):val for key, val in motor_dict.items()}
-            next_motor_dict = {motor_name: safe_dict_get(int_key_response_dict, motor_id, 0.0) for motor_name, motor_id in self.motor_name_map.items()}
-            self.motor_value_history.append(next_motor_dict)
-            # send motor data into client to update the environment
-            named_sensor_dict = self.update(next_motor_dict)
+        return initial_sensor_dict
 
-            # process session logs and debugging data from server
-            session_log = json.loads(safe_dict_get(response_dict, 'session_log', []))
-            self._process_session_logs(session_log)
-            debugging_data = json.loads(response_dict['debugging_data'])
-            self._process_debugging_data(debugging_data)
-            # update simulation time
-            self.sim_t += 1
+    def _build_update_request(self, named_sensor_dict):
+        """ Records the sensor state and encodes it into an /updateSim request
+
+        :return: (url arguments, request body, request headers)
+        :rtype: tuple
+        """
+        phase_start = time.perf_counter() if self.phase_timer is not None else None
+        named_sensor_dict = self._apply_sensor_features(named_sensor_dict)
+        self._record_sensors(named_sensor_dict)
+        sensor_dict = {self.sensor_name_map[key]:val for key, val in named_sensor_dict.items()}
+        self._debug_data_requested = self._should_request_debug_data()
+        update_request = self.wire_codec.encode_update_request(self.session_id, sensor_dict, self._motor_ids, self._debug_data_requested)
+        if phase_start is not None:
+            self.phase_timer.stop(PHASE_ENCODE, phase_start)
+        return update_request
+
+    def _build_update_request_array(self, sensor_values):
+        """ Records sensor values laid out by `sensor_layout` and encodes them into an /updateSim request
+
+        :return: (url arguments, request body, request headers)
+        :rtype: tuple
+        """
+        phase_start = time.perf_counter() if self.phase_timer is not None else None
+        sensor_values = np.asarray(sensor_values, dtype=np.float64)
+        if sensor_values.shape != (self.sensor_input_layout.size,):
+            raise ValueError("update_array() must return " + str(self.sensor_input_layout.size) + " values, got shape " + str(sensor_values.shape))
+        if self.feature_pipeline is not None:
+            sensor_values = self.feature_pipeline.transform(sensor_values)
+        self.sensor_value_history.append_array(sensor_values, self.sensor_layout)
+        self.sensor_statistics.update_array(sensor_values, self.sensor_layout)
+        if self.trace_recorder is not None:
+            self.trace_recorder.record_sensor_array(self.sim_t, sensor_values, self.sensor_layout)
+        self._debug_data_requested = self._should_request_debug_data()
+        update_request = self.wire_codec.encode_update_request_array(self.session_id, sensor_values, self._motor_ids, self._debug_data_requested)
+        if phase_start is not None:
+            self.phase_timer.stop(PHASE_ENCODE, phase_start)
+        return update_request
+
+    def _build_action_chunk_request(self, named_sensor_dicts):
+        """ Encodes the sensor states of every tick since the last request into an /updateSim request for the 
+        next action chunk. The sensor states have already been recorded.
+
+        :return: (url arguments, request body, request headers)
+        :rtype: tuple
+        """
+        phase_start = time.perf_counter() if self.phase_timer is not None else None
+        sensor_name_map = self.sensor_name_map
+        sensor_dicts = [{sensor_name_map[key]:val for key, val in named_sensor_dict.items()} for named_sensor_dict in named_sensor_dicts]
+        self._debug_data_requested = self._should_request_debug_data()
+        update_request = self.wire_codec.encode_action_chunk_request(self.session_id, sensor_dicts, self._motor_ids,
+            self._debug_data_requested, self.action_chunk_size)
+        if phase_start is not None:
+            self.phase_timer.stop(PHASE_ENCODE, phase_start)
+        return update_request
+
+    def _apply_sensor_features(self, named_sensor_dict):
+        """ Computes the sensor values from the observations returned by update(), see 'sensor_features' """
+        if self.feature_pipeline is None:
+            return named_sensor_dict
+        return self.feature_pipeline.transform_dict(named_sensor_dict)
+
+    def _record_sensors(self, named_sensor_dict):
+        """ Records the sensor state of the current tick in the history, statistics and trace """
+        self.sensor_value_history.append(named_sensor_dict)
+        self.sensor_statistics.update(named_sensor_dict)
+        if self.trace_recorder is not None:
+            self.trace_recorder.record_sensors(self.sim_t, named_sensor_dict)
+
+    def _record_motors(self, next_motor_dict):
+        """ Records the motor values of the current tick in the history, statistics and trace """
+        self.motor_value_history.append(next_motor_dict)
+        self.motor_statistics.update(next_motor_dict)
+        if self.trace_recorder is not None:
+            self.trace_recorder.record_motors(self.sim_t, next_motor_dict)
+
+    def _should_request_debug_data(self):
+        """ Decides whether to ask the server for debug data this tick, according to the 'debug_sample_interval'
+        and 'debug_sample_period' client params """
+        if not self.debug_enabled or self.sim_t % self.debug_sample_interval != 0:
+            return False
+        if self.debug_sample_period > 0:
+            now = time.perf_counter()
+            if self._last_debug_sample_time is not None and now - self._last_debug_sample_time < self.debug_sample_period:
+                return False
+            self._last_debug_sample_time = now
+        return True
+
+    def _process_update_response(self, response):
+        """ Decodes an /updateSim response into named motor values
+
+        :return: (dictionary of motor names to motor values, session log list, debugging data dict or `None` if it wasn't requested)
+        :rtype: tuple
+        """
+        phase_start = time.perf_counter() if self.phase_timer is not None else None
+        self._check_update_response(response)
+        # retrieve motor responses from the server
+        motor_values, session_log, debugging_data = self.wire_codec.decode_update_response(response, self._debug_data_requested)
+        next_motor_dict = dict(zip(self._motor_names_by_id, motor_values))
+        self._record_motors(next_motor_dict)
+        if phase_start is not None:
+            self.phase_timer.stop(PHASE_DECODE, phase_start)
+        return next_motor_dict, session_log, debugging_data
+
+    def _process_update_response_array(self, response):
+        """ Decodes an /updateSim response into motor values laid out by `motor_layout`
+
+        :return: (motor value array, session log list, debugging data dict or `None` if it wasn't requested). The motor
+            value array is reused by the next tick.
+        :rtype: tuple
+        """
+        phase_start = time.perf_counter() if self.phase_timer is not None else None
+        self._check_update_response(response)
+        motor_values, session_log, debugging_data = self.wire_codec.decode_update_response(response, self._debug_data_requested)
+        if self.motor_layout is None:
+            self.motor_layout = ArrayLayout.from_values(self.motor_name_map, motor_values)
+        if self._motor_array is None:
+            self._motor_array = self.motor_layout.empty()
+        self.motor_layout.fill(self._motor_array, motor_values)
+        self.motor_value_history.append_array(self._motor_array, self.motor_layout)
+        self.motor_statistics.update_array(self._motor_array, self.motor_layout)
+        if self.trace_recorder is not None:
+            self.trace_recorder.record_motor_array(self.sim_t, self._motor_array, self.motor_layout)
+        if phase_start is not None:
+            self.phase_timer.stop(PHASE_DECODE, phase_start)
+        return self._motor_array, session_log, debugging_data
+
+    def _process_action_chunk_response(self, response):
+        """ Decodes an /updateSim response to an action chunk request into named motor values, which are 
+        recorded as each tick is applied
+
+        :return: (list of dictionaries of motor names to motor values, one per tick, session log list, 
+            debugging data dict or `None` if it wasn't requested)
+        :rtype: tuple
+        """
+        phase_start = time.perf_counter() if self.phase_timer is not None else None
+        self._check_update_response(response)
+        motor_steps, session_log, debugging_data = self.wire_codec.decode_action_chunk_response(response, self._debug_data_requested)
+        motor_names_by_id = self._motor_names_by_id
+        next_motor_dicts = [dict(zip(motor_names_by_id, motor_values)) for motor_values in motor_steps]
+        if phase_start is not None:
+            self.phase_timer.stop(PHASE_DECODE, phase_start)
+        return next_motor_dicts, session_log, debugging_data
+
+    def _complete_tick(self, session_log, debugging_data):
+        """ Renders if required, processes session logs and debugging data from the server and advances sim time """
+        phase_start = time.perf_counter() if self.phase_timer is not None else None
+        self.render_policy.on_tick(self)
+        if phase_start is not None:
+            phase_start = self.phase_timer.stop(PHASE_RENDER, phase_start)
+        self._process_session_logs(session_log)
+        self._process_debugging_data(debugging_data)
+        if phase_start is not None:
+            self.phase_timer.stop(PHASE_LOGS_AND_DEBUG, phase_start)
+        # update simulation time
+        self.sim_t += 1
     
     def _process_session_logs(self, session_logs):
         """ Processes session logs as they are received from the server. """ 
@@ -232,68 +696,70 @@ class BaseThoughtForgeClientSession():
             self.all_session_logs.extend(session_logs)
 
     def _process_debugging_data(self, debugging_data):
-        """ Processes debugging data as it is received by the server. If client has enabled debugging,
-        this function calls the debug_data_received_notification() callback. """ 
-        if self.debug_enabled:
-            global_stability = debugging_data['global_stability_rate']
-            global_energy_estimate = debugging_data['global_energy_estimate']
-            unmapped_block_stability = debugging_data['block_stability_rates']
-            unmapped_block_energy = debugging_data['block_energy_estimates']
-            unmapped_block_times = debugging_data['block_stable_times']
-            # convert numeric block id to string for easy lookup (debugging data keys are strings from json decode)
-            named_block_stability_rates = {
-                name: unmapped_block_stability[str(block_id)]
-                for name, block_id in self.block_name_map.items()}
-            named_block_energy_estimates = {
-                name: unmapped_block_energy[str(block_id)]
-                for name, block_id in self.block_name_map.items()}
-            named_block_stable_times = {
-                name: unmapped_block_times[str(block_id)]
-                for name, block_id in self.block_name_map.items()}
-
-            debug_data_dict = {
-                'global_stability_rate': global_stability,
-                'global_energy_estimate': global_energy_estimate,
-                'block_stability_rates' : named_block_stability_rates,
-                'block_energy_estimates' : named_block_energy_estimates,
-                'block_stable_times' : named_block_stable_times
-            }
-            self.debug_data_history.append(debug_data_dict)
-            self.debug_data_received_notification(debug_data_dict)
+        """ Processes debugging data as it is received by the server. If debug data was requested for this tick,
+        it is recorded in `debug_data_history` and passed to the debug_data_received_notification() callback. Ticks
+        whose response carries no debugging data are skipped. """ 
+        if self._debug_data_requested and debugging_data:
+            debug_row = self.debug_data_history.append(self.sim_t, debugging_data)
+            if self.trace_recorder is not None:
+                self.trace_recorder.record_debug_data(self.sim_t, debug_row[1:], self._debug_column_names)
+            if self._notify_debug_data:
+                self.debug_data_received_notification(self.debug_data_history[-1])
 
     def _end_sim(self):
         """ Reports session information and clears out session-specific state """
+        self.render_policy.stop(self)
+        if self.trace_recorder is not None:
+            try:
+                self.trace_recorder.close()
+                print("Session", self.session_id, "trace written to", self.trace_recorder.directory)
+            except RuntimeError:
+                # the session still ends, the trace segments written so far remain readable
+                print(traceback.format_exc())
+        self.sim_ended_notification()
+        if self.print_summary:
+            self._print_session_summary()
 
-        def _get_history_by_name(list_of_named_dicts, name):
-            if len(list_of_named_dicts) > 0 and name in list_of_named_dicts[0]:
-                value_history = [entry_dict[name] for entry_dict in list_of_named_dicts]
-                return value_history
-            else:
-                print("Unable to find any values for name", name)
-                return []
-
+        # cleanup session state
         self.sim_ended_notification()
+        self.sim_t = 0
+        self.session_id = None
+        self.sensor_name_map = {}
+        self.registered_sensor_name_map = {}
+        self.sensor_fan_out_accepted = False
+        self.idempotent_updates_accepted = False
+        self.motor_name_map = {}
+        self.block_name_map = {}
+        self._stop_requested = False
+        self._debug_data_requested = False
+        self.all_session_logs = []
+        self.sensor_value_history, self.motor_value_history, self.debug_data_history = create_history_stores(None, {}, {})
+        self.trace_recorder = None
+        self.phase_timer = None
+        self.sensor_statistics = OnlineStatistics({})
+        self.motor_statistics = OnlineStatistics({})
+        self.sensor_layout = None
+        self.motor_layout = None
+        self.feature_pipeline = None
+        self.sensor_input_layout = None
+
+    def _print_session_summary(self):
+        """ Prints min/max/median/p95/mean of every motor and sensor, and the last debug state """
+
+        def _print_channel_statistics(label, statistics):
+            for channel_name, channel_statistics in statistics.items():
+                if channel_statistics['count'] == 0:
+                    print("Unable to find any values for name", channel_name)
+                    continue
+                print("- " + label + " '" + channel_name + "'\tmin:", channel_statistics['min'], "\tmax:", channel_statistics['max'],
+                    "\tmedian:", channel_statistics['p50'], "\tp95:", channel_statistics['p95'], "\tmean:", channel_statistics['mean'])
 
         print("-----------------------------------------------------------------------")
         print("Session", self.session_id, "Summary (sim time:", self.sim_t, "updates)")
-        for motor_name in self.motor_name_map.keys():
-            motor_history = _get_history_by_name(self.motor_value_history, motor_name)
-            # note: example motor_history to debug further
-            motor_min = np.min(motor_history)
-            motor_max = np.max(motor_history)
-            motor_median = np.median(motor_history)
-            motor_mean = np.mean(motor_history)
-            print("- Motor '" + motor_name + "'\tmin:", motor_min, "\tmax:", motor_max, "\tmedian:", motor_median, "\tmean:", motor_mean)
-        for sensor_name in self.sensor_name_map.keys():
-            sensor_history = _get_history_by_name(self.sensor_value_history, sensor_name)
-            # note: example sensor_history to debug further
-            sensor_min = np.min(sensor_history)
-            sensor_max = np.max(sensor_history)
-            sensor_median = np.median(sensor_history)
-            sensor_mean = np.mean(sensor_history)
-            print("- Sensor '" +  sensor_name + "'\tmin:", sensor_min, "\tmax:", sensor_max, "\tmedian:", sensor_median, "\tmean:", sensor_mean)
-
-        if self.debug_enabled:
+        _print_channel_statistics("Motor", self.get_motor_statistics())
+        _print_channel_statistics("Sensor", self.get_sensor_statistics())
+
+        if self.debug_enabled and len(self.debug_data_history) > 0:
             final_state = self.debug_data_history[-1]
             # note: example debug_data_history to debug further
             print("Last debug state received:")
@@ -301,28 +767,26 @@ class BaseThoughtForgeClientSession():
                 print("-", key, ":", val)
         else:
             print("Note: Stability/Energy history values not available unless 'enable_debug' is set to true in client .params settings. ")
+        if self.phase_timer is not None:
+            self.phase_timer.print_summary()
+        if self.request_policy is not None:
+            counters = self.request_policy.counters
+            print("Requests:", counters['requests'], "\tretries:", counters['retries'], "\thedges:", counters['hedges'],
+                "(" + str(counters['hedge_wins']), "won)\ttimeouts:", counters['timeouts'], "\tfailures:", counters['failures'])
+        if self.compression is not None:
+            self.compression.print_summary()
         print("-----------------------------------------------------------------------")
-        
-        # cleanup session state
-        self.sim_ended_notification()
-        self.sim_t = 0
-        self.session_id = None
-        self.sensor_name_map = {}
-        self.motor_name_map = {}
-        self._stop_requested = False
-        self.all_session_logs = []
-        self.sensor_value_history = []
-        self.motor_value_history = []
-        self.debug_data_history = []
 
     def _close_session(self):
         """ Closes the remote ThoughtForge session """ 
-        # shut down session
+        if self._shutdown_remote_session():
+            self._end_sim()
+
+    def _shutdown_remote_session(self):
+        """ Shuts down the session on the server. Returns `True` if there was an active session to shut down. """
         if self.session_id is not None and self.session_id >= 0:
             shutdownSession_params = {'session_id': self.session_id}
-            shutdown_url = self._build_url('/shutdownSession', shutdownSession_params)
-            headers = {"x-thoughtforge-key": self.api_key}
-            response = requests.post(shutdown_url, headers=headers)
+            response = self._post('/shutdownSession', shutdownSession_params)
             if response.ok:
                 print("Session", self.session_id, "has been shut down.")
                 response_dict = response.json()
@@ -330,7 +794,8 @@ class BaseThoughtForgeClientSession():
                 self._process_session_logs(session_log)
             else:
                 print("Session shutdown failed. Server returned", response)
-            self._end_sim()
+            return True
+        return False
 
     def get_num_motors(self):
         """ returns the number of motors that have been added to the session model 
@@ -348,6 +813,77 @@ class BaseThoughtForgeClientSession():
         """
         return len(self.sensor_name_map)
 
+    def get_sensor_statistics(self):
+        """ returns running summary statistics of every sensor value sent to the server so far.
+        Can be called at any time during the sim.
+
+        :return: A dictionary of sensor names to dictionaries with 'count', 'min', 'max', 'mean', 'variance', 
+            and approximate 'p50' (median) and 'p95'
+        :rtype: dict
+        """
+        return self.sensor_statistics.get_statistics()
+
+    def get_motor_statistics(self):
+        """ returns running summary statistics of every motor value received from the server so far.
+        Can be called at any time during the sim.
+
+        :return: A dictionary of motor names to dictionaries with 'count', 'min', 'max', 'mean', 'variance', 
+            and approximate 'p50' (median) and 'p95'
+        :rtype: dict
+        """
+        return self.motor_statistics.get_statistics()
+
+    def get_phase_timing(self):
+        """ returns latency histograms of the phases of each tick (request encoding, server round trip, response
+        decoding, update(), rendering, log and debug processing) if 'phase_timing' is enabled in the client .params
+        file. Can be called at any time during the sim.
+
+        :return: A dictionary of phase names to dictionaries with 'count', 'total', 'mean', 'max', 'p50', 'p90' and 
+            'p99' in seconds and the histogram bucket 'counts' (see :class:`phase_timing.PhaseTimer`), or an empty 
+            dictionary if phase timing isn't enabled
+        :rtype: dict
+        """
+        if self.phase_timer is None:
+            return {}
+        return self.phase_timer.get_histograms()
+
+    def save_model(self, path):
+        """ Downloads the current model state (weights and values) of the running session from the server
+        and saves it to disk in a versioned, memory-mappable format, see :meth:`load_model`. The model is 
+        streamed to disk without being held in memory. Call this while the sim is running, e.g. from `update()`.
+
+        :param path: Destination file path, conventionally ending in '.tfmodel'
+        :type path: str
+        :return: `True` if the model was saved
+        :rtype: bool
+        """
+        if self.session_id is None or self.session_id < 0:
+            print("Unable to save model, no active session.")
+            return False
+        response = self.transport.get('/getModel', {'session_id': self.session_id}, stream=True)
+        try:
+            if not response.ok:
+                print("Model download failed. Server returned", response)
+                return False
+            write_model_file(response.iter_content(chunk_size=DEFAULT_CHUNK_SIZE), path)
+        finally:
+            response.close()
+        print("Session", self.session_id, "model saved to", path)
+        return True
+
+    @staticmethod
+    def load_model(path):
+        """ Loads a model saved with :meth:`save_model` (or :func:`model_format.save_model_data`) by memory-mapping
+        it, so loading is near-instant regardless of model size. The result can be passed directly as `model_data`
+        when creating a session.
+
+        :param path: Model file path
+        :type path: str
+        :return: A dictionary with a list of read-only 'weights' arrays and a read-only 'values' array
+        :rtype: dict
+        """
+        return load_model_data(path)
+
     def stop_sim(self):
         """ This function requests stopping of the simulation.  
         Client applications can call this to request shutdown of the simulation loop 
@@ -370,12 +906,24 @@ class BaseThoughtForgeClientSession():
         needs or to report on results """
         pass
 
+    def get_score(self):
+        """ This function can optionally be implemented by users to score the session, e.g. the mean episode score
+        of the environment (higher is better). It is called at the end of the session, before
+        sim_ended_notification(), and used to rank configurations by :mod:`parameter_sweep`.
+
+        :return: The session's score, or `None` if it isn't scored
+        :rtype: float
+        """
+        return None
+
     def debug_data_received_notification(self, debug_data_dict):
         """ 
         This function is called automatically when debug data is being collected.
         Implement this function in a user client session to perform custom runtime debugging.
         
-        .. note:: Debug mode can be enabled in a client params file by setting **"enable_debug": true**
+        .. note:: Debug mode can be enabled in a client params file by setting **"enable_debug": true**. 
+            Debug data can be sampled less often with **"debug_sample_interval": N** (every N ticks) and/or 
+            **"debug_sample_period": seconds** (at most once per period).
         
         .. note:: Here are examples of things to look at:
         ::
@@ -391,6 +939,40 @@ class BaseThoughtForgeClientSession():
         """ 
         pass
 
+    def render(self):
+        """ 
+        This function can optionally be implemented by users to render the environment. It is called
+        on the control loop as decided by the session's render policy (every tick by default).
+
+        .. note:: Rendering can be disabled or limited in a client params file, for example **"render": {"mode": "off"}** 
+            or **"render": {"mode": "every_n_ticks", "interval": 10}**
+        """
+        pass
+
+    def get_render_snapshot(self):
+        """ 
+        This function can optionally be implemented by users for background rendering (**"render": {"mode": "background", "fps": 30}**).
+        It is called on the control loop and should quickly copy whatever state is needed to draw a frame.
+
+        :return: a snapshot of the environment state to pass to `render_snapshot()`
+        """
+        pass
+
+    def render_snapshot(self, snapshot):
+        """ 
+        This function can optionally be implemented by users for background rendering. It is called on the 
+        render worker thread with a snapshot from `get_render_snapshot()`, and must not touch state that the 
+        control loop is modifying.
+
+        :param snapshot: a snapshot returned by `get_render_snapshot()`
+        """
+        pass
+
+    def close_render(self):
+        """ This function can optionally be implemented by users to release background rendering resources. 
+        It is called on the render worker thread when background rendering stops. """
+        pass
+
     def update(self, motor_action_dict):
         """ 
         Implement this function in client code to update environment state and return sensor data. 
@@ -399,9 +981,41 @@ class BaseThoughtForgeClientSession():
         point of entry for users to define the interaction between the thoughtforge model and
         the specific simulation environment.
         
+        Sessions can implement :meth:`update_array` instead, in which case this function adapts it to dictionaries
+        (e.g. for asynchronous sessions and action chunks).
+
+        If the client .params file declares 'sensor_features' (see :class:`sensor_features.FeaturePipeline`), the
+        returned dictionary holds the raw observations the sensor values are computed from.
+
         :param motor_action_dict: A dictionary of motor names to motor values generated by the model
         :type motor_action_dict: dict
         :return: A dictionary of sensor names to sensor values to send to the model
         :rtype: dict
         """
+        if type(self).update_array is BaseThoughtForgeClientSession.update_array:
+            raise NotImplementedError
+        if self.motor_layout is None:
+            self.motor_layout = ArrayLayout.from_values(self.motor_name_map,
+                [safe_dict_get(motor_action_dict, name, 0.0) for name in self._motor_names_by_id])
+        return self.sensor_input_layout.to_dict(self.update_array(self.motor_layout.to_array(motor_action_dict)))
+
+    def update_array(self, motor_values):
+        """
+        Optionally implement this function instead of :meth:`update` to exchange sensor and motor values with the 
+        sim loop as NumPy arrays, which avoids building and hashing dictionaries of names every tick. 
+
+        Values are laid out by `self.sensor_layout` and `self.motor_layout` (see :class:`array_layout.ArrayLayout`), 
+        ordered by sensor and motor id. Look up the positions of the values you use once, e.g. in 
+        sim_started_notification() with `self.sensor_layout.index('angle_sensor')`. The motor layout of sessions 
+        with MULTI motors, whose values take one element per list entry, is created from the first server response 
+        and is available from the first update_array() call. sim_started_notification() may return the initial 
+        sensor state as an array too.
+
+        :param motor_values: Motor values laid out by `self.motor_layout`. The array is reused by the next tick, copy
+            it to keep the values.
+        :type motor_values: np.ndarray
+        :return: Sensor values laid out by `self.sensor_layout`, or raw observations laid out by 
+            `self.feature_pipeline.input_layout` if the session declares 'sensor_features'
+        :rtype: np.ndarray
+        """
         raise NotImplementedError
\ No newline at end of file
@@ -0,0 +1,191 @@
+import threading
+from urllib.parse import urlencode, urlunparse
+
+from utils import safe_dict_get
+
+
+DEFAULT_POOL_CONNECTIONS = 1
+DEFAULT_POOL_MAXSIZE = 10
+DEFAULT_CONNECT_TIMEOUT = 10.0
+
+
+class ThoughtForgeTransport():
+    """ ThoughtForgeTransport
+
+    Owns the HTTP connection(s) used by a client session to talk to a ThoughtForge server.
+    Every request goes through one keep-alive connection pool so that the TCP connection (and
+    TLS handshake for `https`) is reused between ticks instead of being re-established on every
+    `/updateSim` call.
+
+    Transports are safe to share between several sessions and threads in the same process, see
+    :func:`get_shared_transport`. :class:`requests.Session` isn't documented as thread-safe, so each
+    thread issues its requests through a session of its own, all mounted on the same pool.
+
+    :param protocol: 'http' or 'https'
+    :type protocol: str
+    :param host: Host address for the destination ThoughtForge server
+    :type host: str
+    :param port: Host port for the destination ThoughtForge server
+    :type port: int
+    :param api_key: ThoughtForge API key, sent as the `x-thoughtforge-key` header on every request
+    :type api_key: str
+    :param pool_connections: Number of distinct connection pools to cache. Defaults to 1.
+    :type pool_connections: int
+    :param pool_maxsize: Maximum number of pooled connections kept alive to the server. Defaults to 10.
+    :type pool_maxsize: int
+    :param keep_alive: Keep connections open between requests. Defaults to `True`.
+    :type keep_alive: bool
+    :param connect_timeout: Seconds to wait for a connection to be established. Defaults to 10.
+    :type connect_timeout: float
+    :param read_timeout: Seconds to wait for the server to respond. Defaults to `None` (wait forever).
+    :type read_timeout: float
+    """
+    def __init__(self, protocol, host, port, api_key,
+                 pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=DEFAULT_POOL_MAXSIZE,
+                 keep_alive=True, connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=None):
+        assert(protocol in ['http', 'https'])
+        self.protocol = protocol
+        self.host = host
+        self.port = port
+        self.api_key = api_key
+        self.keep_alive = keep_alive
+        self.timeout = (connect_timeout, read_timeout)
+
+        self._ref_count = 0
+        self._registry_key = None
+        # the requests session of each thread, and all of them so that they can be closed
+        self._thread_sessions = threading.local()
+        self._http_sessions = []
+        self._http_sessions_lock = threading.Lock()
+        # optional protocol features learned from the server's responses, kept for the lifetime of the process
+        with _server_capabilities_lock:
+            self.server_capabilities = _server_capabilities.setdefault((protocol, host, str(port)), {})
+
+        # requests is imported with the first transport rather than with the client, it takes longer to import than the client itself
+        import requests
+        from requests.adapters import HTTPAdapter
+        self._requests = requests
+        # the adapter's connection pool is thread-safe and shared by the sessions of all threads
+        self._adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self._headers = {"x-thoughtforge-key": self.api_key}
+        if not keep_alive:
+            self._headers["Connection"] = "close"
+
+    def _http_session(self):
+        """ the calling thread's requests session, created on its first request """
+        http_session = getattr(self._thread_sessions, 'http_session', None)
+        if http_session is None:
+            http_session = self._requests.Session()
+            http_session.mount('http://', self._adapter)
+            http_session.mount('https://', self._adapter)
+            http_session.headers.update(self._headers)
+            self._thread_sessions.http_session = http_session
+            with self._http_sessions_lock:
+                self._http_sessions.append(http_session)
+        return http_session
+
+    def build_url(self, path, args_dict=None):
+        """ Helper function for generating request URLS """
+        scheme = self.protocol
+        netloc = self.host + ':' + str(self.port)
+        params = urlencode(args_dict) if args_dict else ''
+        query = ''
+        fragments = ''
+        return urlunparse([scheme, netloc, path, params, query, fragments])
+
+    def get(self, path, args_dict=None, headers=None, stream=False, timeout=None):
+        """ Issues a GET request to the server over the pooled connection
+
+        :param stream: Don't read the response body until it is accessed, e.g. with `iter_content()`.
+            Streamed responses must be closed to return the connection to the pool. Defaults to `False`.
+        :type stream: bool
+        :param timeout: Optional seconds this request may wait for the connection and for the server's response,
+            see :meth:`request_timeout`. Defaults to `None` (the transport's timeouts).
+        :type timeout: float
+        :return: The server response
+        :rtype: requests.Response
+        """
+        return self._http_session().get(self.build_url(path, args_dict), headers=headers, timeout=self.request_timeout(timeout), stream=stream)
+
+    def post(self, path, args_dict=None, data=None, headers=None, timeout=None):
+        """ Issues a POST request to the server over the pooled connection
+
+        :param timeout: Optional seconds this request may wait, see :meth:`get`
+        :type timeout: float
+        :return: The server response
+        :rtype: requests.Response
+        """
+        return self._http_session().post(self.build_url(path, args_dict), headers=headers, data=data, timeout=self.request_timeout(timeout))
+
+    def request_timeout(self, timeout=None):
+        """ Returns the (connect, read) timeouts of a request that may wait `timeout` seconds: the transport's
+        timeouts, shortened to `timeout` """
+        if timeout is None:
+            return self.timeout
+        connect_timeout, read_timeout = self.timeout
+        return (min(connect_timeout, timeout) if connect_timeout is not None else timeout,
+            min(read_timeout, timeout) if read_timeout is not None else timeout)
+
+    def acquire(self):
+        """ Registers a new user of this transport. Each call must be matched with a call to `release()` """
+        with _shared_transports_lock:
+            self._ref_count += 1
+        return self
+
+    def release(self):
+        """ Unregisters a user of this transport. The underlying connections are closed once the
+        last user has released the transport. """
+        with _shared_transports_lock:
+            self._ref_count -= 1
+            if self._ref_count > 0:
+                return
+            self._unregister()
+        self._close_connections()
+
+    def close(self):
+        """ Closes all pooled connections and removes the transport from the shared registry """
+        with _shared_transports_lock:
+            self._unregister()
+        self._close_connections()
+
+    def _close_connections(self):
+        with self._http_sessions_lock:
+            http_sessions, self._http_sessions = self._http_sessions, []
+        for http_session in http_sessions:
+            http_session.close()
+        self._adapter.close()
+
+    def _unregister(self):
+        """ removes the transport from the shared registry, caller must hold the registry lock """
+        if self._registry_key is not None and _shared_transports.get(self._registry_key) is self:
+            del _shared_transports[self._registry_key]
+
+
+_shared_transports = {}
+_shared_transports_lock = threading.Lock()
+# server address -> capabilities dict, see ThoughtForgeTransport.server_capabilities
+_server_capabilities = {}
+_server_capabilities_lock = threading.Lock()
+
+
+def get_shared_transport(protocol, host, port, api_key, transport_params=None):
+    """ Returns a transport for the given server and api key, shared between all sessions in this
+    process that connect with the same settings. The returned transport has already been acquired
+    and should be released with `transport.release()` when the caller is done with it.
+
+    :param transport_params: Optional keyword arguments for :class:`ThoughtForgeTransport`
+        (pool_connections, pool_maxsize, keep_alive, connect_timeout, read_timeout)
+    :type transport_params: dict
+    :return: A shared transport
+    :rtype: ThoughtForgeTransport
+    """
+    transport_params = transport_params if transport_params is not None else {}
+    key = (protocol, host, str(port), api_key, tuple(sorted(transport_params.items())))
+    with _shared_transports_lock:
+        transport = safe_dict_get(_shared_transports, key, None)
+        if transport is None:
+            transport = ThoughtForgeTransport(protocol, host, port, api_key, **transport_params)
+            transport._registry_key = key
+            _shared_transports[key] = transport
+        transport._ref_count += 1
+        return transport
@@ -12,21 +12,17 @@ def safe_dict_get(dict, keyName, default):
     return dict[keyName] if keyName in dict.keys() else default
 
 def _load_enforced_type(file_name, enforced_type, use_named_tuple=False):
-    print('load', file_name, enforced_type)
     def mapJSONToObject(dict):
         return namedtuple('X', dict.keys())(*dict.values())
-    config = {}
     file_extension = os.path.splitext(file_name)[1]
-    if(file_extension == enforced_type):
-      with open(file_name) as f:
-          if(use_named_tuple):
-              config = json.load(f, object_hook=mapJSONToObject)
-          else:
-              config = json.load(f) #, object_hook=mapJSONToObject
-    else:
-      raise 'config files must be of type' + enforced_type + ' got ' + file_name
-    return config  
+    if file_extension != enforced_type:
+        raise ValueError('config files must be of type ' + enforced_type + ' got ' + str(file_name))
+    with open(file_name) as f:
+        if(use_named_tuple):
+            return json.load(f, object_hook=mapJSONToObject)
+        return json.load(f)
 
 def load_client_params(file_name):
-    """ return json client configuration from the given filename """
+    """ return json client configuration from the given filename. Sessions use the compiled and cached 
+    :func:`session_spec.load_session_spec` instead. """
     return _load_enforced_type(file_name, '.params')
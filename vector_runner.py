@@ -0,0 +1,186 @@
+import asyncio, time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+from phase_timing import PhaseTimer, PHASE_UPDATE
+from thoughtforge_async import AsyncThoughtForgeClientSession
+from transport import get_shared_transport, DEFAULT_POOL_MAXSIZE
+from utils import safe_dict_get
+
+
+class VectorizedSessionRunner():
+    """ VectorizedSessionRunner
+
+    Runs N copies of a session in lockstep from a single process. Every session builds its own
+    environment (in `sim_started_notification()`) and its own server session. On each tick the N
+    `/updateSim` requests are issued concurrently, then all environments are stepped, then the next
+    tick starts. Sessions that call `stop_sim()` drop out while the others keep running.
+
+    Environment stepping is batched when the session class implements an `update_batch` classmethod::
+
+        @classmethod
+        def update_batch(cls, sessions, motor_dicts):
+            # step all environments at once, return one sensor dict per session
+            return [session.update(motor_dict) for session, motor_dict in zip(sessions, motor_dicts)]
+
+    Otherwise each session's `update()` is called in turn. The gym example sessions don't implement
+    it, :class:`process_env.ProcessEnvironmentSession` does (it steps its workers in parallel).
+
+    Per-session end-of-sim summaries are not printed; aggregate and per-session statistics are
+    available from `get_statistics()` and printed by `print_statistics()` after the run.
+
+    :param session_class: A :class:`thoughtforge_client.BaseThoughtForgeClientSession` subclass, e.g. `ExampleCartpoleSession`
+    :type session_class: type
+    :param num_sessions: Number of environments and server sessions to run
+    :type num_sessions: int
+    :param file_name: The parameter file for specifying sensors, motors and model configuration
+    :type file_name: str
+    :param session_kwargs: Additional keyword arguments for the session constructor (host, port, api_key, ...)
+    """
+    def __init__(self, session_class, num_sessions, file_name, **session_kwargs):
+        assert(num_sessions > 0)
+        if not issubclass(session_class, AsyncThoughtForgeClientSession):
+            session_class = type('Async' + session_class.__name__, (AsyncThoughtForgeClientSession, session_class), {})
+        self.session_class = session_class
+        self.num_sessions = num_sessions
+        self.file_name = file_name
+        self.session_kwargs = session_kwargs
+        self.sessions = []
+        self.elapsed_time = 0.0
+        self.phase_timer = None
+        self._session_ticks = []
+        self._request_times = []
+        self._executor = None
+
+    def _create_sessions(self):
+        """ creates all sessions, sharing one transport sized for N concurrent requests """
+        self._executor = ThreadPoolExecutor(max_workers=self.num_sessions, thread_name_prefix='thoughtforge-vector')
+        self.sessions = [self.session_class(self.file_name, executor=self._executor, **self.session_kwargs) for _ in range(self.num_sessions)]
+        if 'transport' not in self.session_kwargs:
+            first_session = self.sessions[0]
+            transport_params = dict(safe_dict_get(first_session.client_params, 'transport', {}))
+            transport_params['pool_maxsize'] = max(self.num_sessions, safe_dict_get(transport_params, 'pool_maxsize', DEFAULT_POOL_MAXSIZE))
+            transport = get_shared_transport(first_session.protocol, first_session.host, first_session.port, first_session.api_key, transport_params)
+            for session in self.sessions:
+                session._release_transport()
+                session.transport = transport.acquire()
+            transport.release()
+        for session in self.sessions:
+            session.print_summary = False
+        self._session_ticks = [0] * self.num_sessions
+        self._request_times = [[] for _ in range(self.num_sessions)]
+
+    async def _timed_request(self, index):
+        session = self.sessions[index]
+        start = time.perf_counter()
+        result = await session.request_update(session._named_sensor_dict)
+        self._request_times[index].append(time.perf_counter() - start)
+        return result
+
+    def _step_environments(self, indices, motor_dicts):
+        """ steps the environments of the given sessions, batched if the session class supports it """
+        sessions = [self.sessions[index] for index in indices]
+        update_batch = getattr(self.session_class, 'update_batch', None)
+        if update_batch is not None:
+            start = time.perf_counter()
+            named_sensor_dicts = update_batch(sessions, motor_dicts)
+            # a batched step is attributed to its sessions in equal shares
+            batch_share = (time.perf_counter() - start) / len(sessions)
+            for session in sessions:
+                if session.phase_timer is not None:
+                    session.phase_timer.record(PHASE_UPDATE, batch_share)
+            return named_sensor_dicts
+        named_sensor_dicts = []
+        for session, motor_dict in zip(sessions, motor_dicts):
+            phase_start = time.perf_counter() if session.phase_timer is not None else None
+            named_sensor_dicts.append(session.update(motor_dict))
+            if phase_start is not None:
+                session.phase_timer.stop(PHASE_UPDATE, phase_start)
+        return named_sensor_dicts
+
+    async def run_async(self, max_ticks=None):
+        """ Runs all sessions in lockstep until every session has stopped, or `max_ticks` ticks have run
+
+        :param max_ticks: Optional limit on the number of ticks to run. Defaults to `None` (no limit).
+        :type max_ticks: int
+        """
+        self._create_sessions()
+        start = time.perf_counter()
+        try:
+            initialized = await asyncio.gather(*[session.initialize() for session in self.sessions])
+            tick = 0
+            while max_ticks is None or tick < max_ticks:
+                indices = [index for index, session in enumerate(self.sessions) if initialized[index] and session.is_running()]
+                if len(indices) == 0:
+                    break
+                results = await asyncio.gather(*[self._timed_request(index) for index in indices])
+                named_sensor_dicts = self._step_environments(indices, [result[0] for result in results])
+                for index, named_sensor_dict, result in zip(indices, named_sensor_dicts, results):
+                    session = self.sessions[index]
+                    session._named_sensor_dict = named_sensor_dict
+                    session._complete_tick(result[1], result[2])
+                    self._session_ticks[index] += 1
+                tick += 1
+        finally:
+            self.elapsed_time = time.perf_counter() - start
+            self._merge_phase_timers()
+            await asyncio.gather(*[session.close() for session in self.sessions], return_exceptions=True)
+            self._executor.shutdown(wait=False)
+
+    def _merge_phase_timers(self):
+        """ merges the phase timing of all sessions before they are closed """
+        self.phase_timer = None
+        for session in self.sessions:
+            if session.phase_timer is None:
+                continue
+            if self.phase_timer is None:
+                timer = session.phase_timer
+                self.phase_timer = PhaseTimer(timer.phases, timer.min_time, timer.max_time, timer.buckets_per_decade)
+            self.phase_timer.merge(session.phase_timer)
+
+    def run(self, max_ticks=None):
+        """ Blocking wrapper around `run_async()` """
+        asyncio.run(self.run_async(max_ticks))
+        self.print_statistics()
+
+    def get_statistics(self):
+        """ Returns aggregate and per-session statistics of the last run
+
+        :return: A dictionary with 'total_ticks', 'elapsed_time', 'ticks_per_sec', a 'sessions' list of
+            per-session 'ticks', 'ticks_per_sec' and request latency 'latency_mean', 'latency_p50' and 'latency_p99' in seconds,
+            and the 'phase_timing' histograms of all sessions if 'phase_timing' is enabled in the client .params file
+        :rtype: dict
+        """
+        elapsed_time = self.elapsed_time if self.elapsed_time > 0 else float('nan')
+        session_stats = []
+        for ticks, request_times in zip(self._session_ticks, self._request_times):
+            latency_stats = {'latency_mean': float('nan'), 'latency_p50': float('nan'), 'latency_p99': float('nan')}
+            if len(request_times) > 0:
+                latency_stats = {
+                    'latency_mean': float(np.mean(request_times)),
+                    'latency_p50': float(np.percentile(request_times, 50)),
+                    'latency_p99': float(np.percentile(request_times, 99))}
+            session_stats.append(dict(ticks=ticks, ticks_per_sec=ticks / elapsed_time, **latency_stats))
+        total_ticks = sum(self._session_ticks)
+        return {
+            'total_ticks': total_ticks,
+            'elapsed_time': self.elapsed_time,
+            'ticks_per_sec': total_ticks / elapsed_time,
+            'sessions': session_stats,
+            'phase_timing': self.phase_timer.get_histograms() if self.phase_timer is not None else {}}
+
+    def print_statistics(self):
+        """ Prints aggregate and per-session statistics of the last run """
+        stats = self.get_statistics()
+        print("-----------------------------------------------------------------------")
+        print("Vectorized run summary:", self.num_sessions, "sessions,", stats['total_ticks'], "total updates in", round(stats['elapsed_time'], 3), "s")
+        print("- Aggregate ticks/sec:", round(stats['ticks_per_sec'], 2))
+        for index, session_stats in enumerate(stats['sessions']):
+            print("- Session", index, "\tticks:", session_stats['ticks'],
+                "\tticks/sec:", round(session_stats['ticks_per_sec'], 2),
+                "\tlatency mean:", round(session_stats['latency_mean'] * 1000, 3), "ms",
+                "\tp50:", round(session_stats['latency_p50'] * 1000, 3), "ms",
+                "\tp99:", round(session_stats['latency_p99'] * 1000, 3), "ms")
+        if self.phase_timer is not None:
+            self.phase_timer.print_summary()
+        print("-----------------------------------------------------------------------")
@@ -0,0 +1,399 @@
+import json, struct
+import numpy as np
+
+from utils import safe_dict_get
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+WIRE_FORMAT_JSON = 'json'
+WIRE_FORMAT_BINARY = 'binary'
+WIRE_FORMAT_BINARY32 = 'binary32'
+SUPPORTED_WIRE_FORMATS = [WIRE_FORMAT_JSON, WIRE_FORMAT_BINARY, WIRE_FORMAT_BINARY32]
+
+# header sent to /initSession to request a wire format, the server echoes the accepted format
+# back as 'wire_format' in the response. Servers that don't know the header keep using json.
+WIRE_FORMAT_HEADER = 'x-thoughtforge-wire-format'
+BINARY_CONTENT_TYPE = 'application/x-thoughtforge-frame'
+# header sent to /initSession to request action chunks of up to N motor steps per /updateSim request,
+# the server echoes the accepted chunk size back as 'action_chunk_size'. Without it a session uses one step.
+ACTION_CHUNK_HEADER = 'x-thoughtforge-action-chunk-size'
+# header sent to /initSession when sensor entries declare 'fan_out', asking the server to replicate the value sent for
+# the first name of each such entry to its other names. Its value is the json list of the names of each such entry,
+# the 'fan_out' keys themselves aren't sent. The server reports 'sensor_fan_out': true if it replicates the values,
+# otherwise the client sends every name's value.
+SENSOR_FAN_OUT_HEADER = 'x-thoughtforge-sensor-fan-out'
+
+SENSOR_FRAME_MAGIC = b'TFS1'
+MOTOR_FRAME_MAGIC = b'TFM1'
+# magic, dtype code, value count
+FRAME_HEADER = struct.Struct('<4sB3xI')
+JSON_TAIL_HEADER = struct.Struct('<I')
+
+JSON_BACKEND_AUTO = 'auto'
+# json parsers that accept bytes and return the same objects as json.loads
+JSON_BACKENDS = {'json': json.loads}
+if orjson is not None:
+    JSON_BACKENDS['orjson'] = orjson.loads
+# an empty json encoded session log, as sent on most ticks
+_EMPTY_SESSION_LOG = '[]'
+
+_DTYPE_CODES = {1: np.dtype('<f4'), 2: np.dtype('<f8')}
+_DTYPE_CODE_BY_FORMAT = {WIRE_FORMAT_BINARY: 2, WIRE_FORMAT_BINARY32: 1}
+
+
+def get_json_loads(json_backend=JSON_BACKEND_AUTO):
+    """ Returns the json parser used to decode responses. 'auto' picks the fastest installed backend
+    (orjson if available, else the standard library json module).
+
+    :param json_backend: 'auto', 'orjson' or 'json'
+    :type json_backend: str
+    :rtype: function
+    """
+    if json_backend == JSON_BACKEND_AUTO:
+        return JSON_BACKENDS['orjson'] if 'orjson' in JSON_BACKENDS else JSON_BACKENDS['json']
+    if json_backend not in JSON_BACKENDS:
+        raise ValueError("JSON backend " + str(json_backend) + " is not installed")
+    return JSON_BACKENDS[json_backend]
+
+
+def _dtype_code(dtype):
+    for code, code_dtype in _DTYPE_CODES.items():
+        if code_dtype == np.dtype(dtype).newbyteorder('<'):
+            return code
+    raise ValueError("Unsupported wire dtype " + str(dtype))
+
+
+def encode_sensor_frame(sensor_values, dtype='<f8'):
+    """ Packs id-ordered sensor values into a binary sensor frame
+
+    :param sensor_values: Sensor values ordered by ascending sensor id
+    :type sensor_values: list or np.ndarray
+    :return: the encoded frame
+    :rtype: bytes
+    """
+    values = np.asarray(sensor_values, dtype=np.dtype(dtype).newbyteorder('<'))
+    return FRAME_HEADER.pack(SENSOR_FRAME_MAGIC, _dtype_code(values.dtype), len(values)) + values.tobytes()
+
+
+def decode_sensor_frame(frame):
+    """ Unpacks a binary sensor frame
+
+    :return: Sensor values ordered by ascending sensor id
+    :rtype: np.ndarray
+    """
+    magic, dtype_code, count = FRAME_HEADER.unpack_from(frame)
+    if magic != SENSOR_FRAME_MAGIC:
+        raise ValueError("Not a ThoughtForge sensor frame")
+    return np.frombuffer(frame, dtype=_DTYPE_CODES[dtype_code], count=count, offset=FRAME_HEADER.size)
+
+
+def encode_motor_frame(motor_values, session_log=None, debugging_data=None, dtype='<f8'):
+    """ Packs id-ordered motor values, followed by a small json tail for session logs and debugging
+    data, into a binary motor frame. A motor value may be a scalar or a list (for MULTI motors).
+
+    :param motor_values: Motor values ordered by ascending motor id
+    :type motor_values: list
+    :return: the encoded frame
+    :rtype: bytes
+    """
+    wire_dtype = np.dtype(dtype).newbyteorder('<')
+    # a count of 0 marks a scalar motor value, otherwise the number of values in the list
+    counts = np.array([len(value) if isinstance(value, (list, tuple, np.ndarray)) else 0 for value in motor_values], dtype='<i4')
+    flat_values = []
+    for value in motor_values:
+        if isinstance(value, (list, tuple, np.ndarray)):
+            flat_values.extend(value)
+        else:
+            flat_values.append(value)
+    # an empty tail is sent when there are no session logs or debugging data
+    tail = b''
+    if session_log or debugging_data:
+        tail = json.dumps({
+            'session_log': session_log if session_log is not None else [],
+            'debugging_data': debugging_data if debugging_data is not None else {}}).encode()
+    return b''.join([
+        FRAME_HEADER.pack(MOTOR_FRAME_MAGIC, _dtype_code(wire_dtype), len(motor_values)),
+        counts.tobytes(),
+        np.asarray(flat_values, dtype=wire_dtype).tobytes(),
+        JSON_TAIL_HEADER.pack(len(tail)),
+        tail])
+
+
+def decode_motor_frame(frame, json_loads=json.loads):
+    """ Unpacks a binary motor frame
+
+    :param json_loads: json parser for the tail. Defaults to the standard library parser.
+    :type json_loads: function
+    :return: (motor values ordered by ascending motor id, session log list, debugging data dict or `None` if the
+        frame has no json tail)
+    :rtype: tuple
+    """
+    magic, dtype_code, count = FRAME_HEADER.unpack_from(frame)
+    if magic != MOTOR_FRAME_MAGIC:
+        raise ValueError("Not a ThoughtForge motor frame")
+    dtype = _DTYPE_CODES[dtype_code]
+    # frames are small, struct is cheaper than numpy here
+    offset = FRAME_HEADER.size
+    counts = struct.unpack_from('<' + str(count) + 'i', frame, offset)
+    offset += 4 * count
+    num_values = sum(max(value_count, 1) for value_count in counts)
+    flat_values = struct.unpack_from('<' + str(num_values) + dtype.char, frame, offset)
+    offset += num_values * dtype.itemsize
+    motor_values = []
+    value_index = 0
+    for value_count in counts:
+        if value_count == 0:
+            motor_values.append(flat_values[value_index])
+            value_index += 1
+        else:
+            motor_values.append(list(flat_values[value_index:value_index + value_count]))
+            value_index += value_count
+    tail_length, = JSON_TAIL_HEADER.unpack_from(frame, offset)
+    if tail_length == 0:
+        return motor_values, [], None
+    offset += JSON_TAIL_HEADER.size
+    tail = json_loads(bytes(frame[offset:offset + tail_length]))
+    return motor_values, tail['session_log'], tail['debugging_data']
+
+
+class JsonWireCodec():
+    """ JsonWireCodec
+
+    The original `/updateSim` encoding: sensor and motor ids are json encoded into the request url,
+    and the response is a json document with json encoded session logs and debugging data.
+
+    Responses are decoded in a single pass: the body is parsed once with the fastest installed json
+    backend, the nested session log is only parsed when it isn't empty, debugging data is only parsed
+    when it was requested, and motor values are written straight into an id-ordered list.
+
+    :param motor_ids: All registered motor ids
+    :type motor_ids: list
+    :param json_backend: json parser used for responses, 'auto', 'orjson' or 'json'. Defaults to 'auto'.
+    :type json_backend: str
+    :param sensor_ids: The ids the session's sensor values are keyed by, needed to encode sensor arrays. Defaults to `None`.
+    :type sensor_ids: list
+    :param sensor_copies: Optional dictionary of sensor ids to the ids of other registered sensors that carry the same
+        value (see 'fan_out' sensor entries), which the codec fills in before sending. Defaults to `None`.
+    :type sensor_copies: dict
+    """
+    wire_format = WIRE_FORMAT_JSON
+
+    def __init__(self, motor_ids, json_backend=JSON_BACKEND_AUTO, sensor_ids=None, sensor_copies=None):
+        self.sensor_ids = sorted(sensor_ids) if sensor_ids is not None else None
+        self.sensor_copies = dict(sensor_copies) if sensor_copies else None
+        # the ids of the values sent, and the position of each in the session's id-ordered sensor values
+        self.wire_sensor_ids = self.sensor_ids
+        self._wire_sensor_positions = None
+        if self.sensor_copies is not None and self.sensor_ids is not None:
+            source_ids = {sensor_id: sensor_id for sensor_id in self.sensor_ids}
+            for sensor_id, copy_ids in self.sensor_copies.items():
+                source_ids.update((copy_id, sensor_id) for copy_id in copy_ids)
+            self.wire_sensor_ids = sorted(source_ids.keys())
+            positions = {sensor_id: position for position, sensor_id in enumerate(self.sensor_ids)}
+            self._wire_sensor_positions = np.array([positions[source_ids[sensor_id]] for sensor_id in self.wire_sensor_ids], dtype=np.intp)
+        self.motor_ids = sorted(motor_ids)
+        self.json_loads = get_json_loads(json_backend)
+        # response keys are json strings, map them to list positions without int() conversions
+        self._motor_slots = {str(motor_id): slot for slot, motor_id in enumerate(self.motor_ids)}
+
+    def _expand_sensor_dict(self, sensor_dict):
+        """ the sensor dictionary with the values of `sensor_copies` filled in """
+        if self.sensor_copies is None:
+            return sensor_dict
+        expanded_dict = dict(sensor_dict)
+        for sensor_id, copy_ids in self.sensor_copies.items():
+            if sensor_id in sensor_dict:
+                value = sensor_dict[sensor_id]
+                for copy_id in copy_ids:
+                    expanded_dict[copy_id] = value
+        return expanded_dict
+
+    def _expand_sensor_values(self, sensor_values):
+        """ id-ordered sensor values laid out by `wire_sensor_ids` """
+        if self._wire_sensor_positions is None:
+            return sensor_values
+        return np.asarray(sensor_values)[self._wire_sensor_positions]
+
+    def encode_update_request(self, session_id, sensor_dict, motor_ids, collect_debug_data):
+        """ Builds an /updateSim request
+
+        :param sensor_dict: A dictionary of sensor ids to sensor values
+        :type sensor_dict: dict
+        :return: (url arguments, request body, request headers)
+        :rtype: tuple
+        """
+        update_params = {
+            'session_id': session_id,
+            'sensor_dict': json.dumps(self._expand_sensor_dict(sensor_dict)),
+            'motor_ids_requested': json.dumps(motor_ids),
+            'collect_debug_data': collect_debug_data
+        }
+        return update_params, None, None
+
+    def encode_update_request_array(self, session_id, sensor_values, motor_ids, collect_debug_data):
+        """ Builds an /updateSim request from sensor values ordered by ascending sensor id
+
+        :param sensor_values: One value per sensor, ordered by ascending sensor id
+        :type sensor_values: np.ndarray
+        :return: (url arguments, request body, request headers)
+        :rtype: tuple
+        """
+        update_params = {
+            'session_id': session_id,
+            'sensor_dict': json.dumps(dict(zip(self.wire_sensor_ids, self._expand_sensor_values(sensor_values).tolist()))),
+            'motor_ids_requested': json.dumps(motor_ids),
+            'collect_debug_data': collect_debug_data
+        }
+        return update_params, None, None
+
+    def encode_action_chunk_request(self, session_id, sensor_dicts, motor_ids, collect_debug_data, action_chunk_size):
+        """ Builds an /updateSim request that sends the sensor values of every tick since the last request
+        and asks for the motor values of the next `action_chunk_size` ticks
+
+        :param sensor_dicts: One dictionary of sensor ids to sensor values per tick, oldest first
+        :type sensor_dicts: list
+        :return: (url arguments, request body, request headers)
+        :rtype: tuple
+        """
+        update_params = {
+            'session_id': session_id,
+            'sensor_dicts': json.dumps([self._expand_sensor_dict(sensor_dict) for sensor_dict in sensor_dicts]),
+            'motor_ids_requested': json.dumps(motor_ids),
+            'collect_debug_data': collect_debug_data,
+            'action_chunk_size': action_chunk_size
+        }
+        return update_params, None, None
+
+    def _decode_motor_dict(self, response_motor_dict):
+        """ id-ordered motor values of a json motor dictionary, in a new list """
+        motor_values = [0.0] * len(self.motor_ids)
+        motor_slots = self._motor_slots
+        for key, value in response_motor_dict.items():
+            slot = motor_slots.get(key)
+            if slot is not None:
+                motor_values[slot] = value
+        return motor_values
+
+    def _decode_tail(self, response_dict, debug_data_requested):
+        """ session logs and (if requested) debugging data of a json response """
+        session_log_json = safe_dict_get(response_dict, 'session_log', _EMPTY_SESSION_LOG)
+        session_log = [] if session_log_json == _EMPTY_SESSION_LOG else self.json_loads(session_log_json)
+        debugging_data = self.json_loads(response_dict['debugging_data']) if debug_data_requested else None
+        return session_log, debugging_data
+
+    def decode_action_chunk_response(self, response, debug_data_requested=True):
+        """ Decodes an /updateSim response to an action chunk request
+
+        :return: (list of motor value lists ordered by ascending motor id, one per tick, session log list,
+            debugging data dict or `None`)
+        :rtype: tuple
+        """
+        response_dict = self.json_loads(response.content)
+        motor_steps = [self._decode_motor_dict(response_motor_dict) for response_motor_dict in response_dict['motor_dicts']]
+        session_log, debugging_data = self._decode_tail(response_dict, debug_data_requested)
+        return motor_steps, session_log, debugging_data
+
+    def decode_update_response(self, response, debug_data_requested=True):
+        """ Decodes an /updateSim response
+
+        :param debug_data_requested: Whether the request asked for debugging data. If not, the
+            response's debugging data is not parsed.
+        :type debug_data_requested: bool
+        :return: (motor values ordered by ascending motor id, session log list, debugging data dict or `None`)
+        :rtype: tuple
+        """
+        response_dict = self.json_loads(response.content)
+        motor_values = self._decode_motor_dict(response_dict['motor_dict'])
+        session_log, debugging_data = self._decode_tail(response_dict, debug_data_requested)
+        return motor_values, session_log, debugging_data
+
+
+class BinaryWireCodec(JsonWireCodec):
+    """ BinaryWireCodec
+
+    Sends sensor values as a packed float array in the request body, ordered by ascending sensor id,
+    and receives motor values the same way. Action chunks pack the values of several ticks one after
+    the other into the same frame. Session logs and debugging data are carried in a small
+    json tail after the motor values. Responses that come back as json are still decoded, so a
+    server may answer any individual request in the json format.
+
+    :param sensor_ids: The ids the session's sensor values are keyed by
+    :type sensor_ids: list
+    :param motor_ids: All registered motor ids
+    :type motor_ids: list
+    :param dtype: Float type used on the wire, '<f8' or '<f4'
+    :type dtype: str
+    :param json_backend: json parser used for responses, 'auto', 'orjson' or 'json'. Defaults to 'auto'.
+    :type json_backend: str
+    :param sensor_copies: Optional dictionary of sensor ids to the ids of other registered sensors that carry the same
+        value, see :class:`JsonWireCodec`. Defaults to `None`.
+    :type sensor_copies: dict
+    """
+    def __init__(self, sensor_ids, motor_ids, dtype='<f8', json_backend=JSON_BACKEND_AUTO, sensor_copies=None):
+        super().__init__(motor_ids, json_backend, sensor_ids, sensor_copies)
+        self.dtype = np.dtype(dtype)
+        self.wire_format = WIRE_FORMAT_BINARY32 if self.dtype.itemsize == 4 else WIRE_FORMAT_BINARY
+        self._headers = {'Content-Type': BINARY_CONTENT_TYPE, 'Accept': BINARY_CONTENT_TYPE}
+
+    def encode_update_request(self, session_id, sensor_dict, motor_ids, collect_debug_data):
+        sensor_values = self._expand_sensor_values([safe_dict_get(sensor_dict, sensor_id, 0.0) for sensor_id in self.sensor_ids])
+        update_params = {
+            'session_id': session_id,
+            'collect_debug_data': collect_debug_data
+        }
+        return update_params, encode_sensor_frame(sensor_values, self.dtype), self._headers
+
+    def encode_update_request_array(self, session_id, sensor_values, motor_ids, collect_debug_data):
+        update_params = {
+            'session_id': session_id,
+            'collect_debug_data': collect_debug_data
+        }
+        return update_params, encode_sensor_frame(self._expand_sensor_values(sensor_values), self.dtype), self._headers
+
+    def encode_action_chunk_request(self, session_id, sensor_dicts, motor_ids, collect_debug_data, action_chunk_size):
+        sensor_values = [value for sensor_dict in sensor_dicts
+            for value in self._expand_sensor_values([safe_dict_get(sensor_dict, sensor_id, 0.0) for sensor_id in self.sensor_ids])]
+        update_params = {
+            'session_id': session_id,
+            'collect_debug_data': collect_debug_data,
+            'action_chunk_size': action_chunk_size
+        }
+        return update_params, encode_sensor_frame(sensor_values, self.dtype), self._headers
+
+    def decode_action_chunk_response(self, response, debug_data_requested=True):
+        if not response.headers.get('Content-Type', '').startswith(BINARY_CONTENT_TYPE):
+            return super().decode_action_chunk_response(response, debug_data_requested)
+        motor_values, session_log, debugging_data = decode_motor_frame(response.content, self.json_loads)
+        num_motors = len(self.motor_ids)
+        motor_steps = [motor_values[start:start + num_motors] for start in range(0, len(motor_values), num_motors)] if num_motors > 0 else []
+        return motor_steps, session_log, debugging_data if debug_data_requested else None
+
+    def decode_update_response(self, response, debug_data_requested=True):
+        if not response.headers.get('Content-Type', '').startswith(BINARY_CONTENT_TYPE):
+            return super().decode_update_response(response, debug_data_requested)
+        motor_values, session_log, debugging_data = decode_motor_frame(response.content, self.json_loads)
+        return motor_values, session_log, debugging_data if debug_data_requested else None
+
+
+def create_wire_codec(wire_format, sensor_ids, motor_ids, json_backend=JSON_BACKEND_AUTO, sensor_copies=None):
+    """ Creates the codec for a negotiated wire format
+
+    :param wire_format: One of 'json', 'binary' or 'binary32'
+    :type wire_format: str
+    :param json_backend: json parser used for responses, 'auto', 'orjson' or 'json'. Defaults to 'auto'.
+    :type json_backend: str
+    :param sensor_copies: Optional dictionary of sensor ids to the ids of other registered sensors that carry the same
+        value, filled in by the codec. Defaults to `None`.
+    :type sensor_copies: dict
+    :return: a wire codec
+    :rtype: JsonWireCodec
+    """
+    if wire_format == WIRE_FORMAT_JSON:
+        return JsonWireCodec(motor_ids, json_backend, sensor_ids, sensor_copies)
+    elif wire_format in _DTYPE_CODE_BY_FORMAT:
+        return BinaryWireCodec(sensor_ids, motor_ids, _DTYPE_CODES[_DTYPE_CODE_BY_FORMAT[wire_format]], json_backend, sensor_copies)
+    raise ValueError("Unsupported wire format " + str(wire_format))